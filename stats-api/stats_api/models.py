@@ -44,3 +44,9 @@ class MonthlySubmissions_(OrmBase):
 class MonthlyDownloads_(OrmBase):
     month: date
     downloads: int
+
+
+class MonthToDateDownloads_(OrmBase):
+    month: date
+    downloads: int
+    latest_hour: datetime
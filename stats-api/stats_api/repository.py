@@ -1,17 +1,31 @@
-from datetime import date, datetime
-from typing import List
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
 from sqlalchemy import func
 
 from stats_api.config.database import db
-from stats_api.models import MonthlyDownloads_, HourlyRequests_, MonthlySubmissions_
+from stats_api.models import (
+    MonthlyDownloads_,
+    MonthToDateDownloads_,
+    HourlyRequests_,
+    MonthlySubmissions_,
+)
 from stats_entities.site_usage import (
     HourlyDownloads,
     MonthlyDownloads,
+    MonthToDateDownloads,
     MonthlySubmissions,
     HourlyRequests,
 )
 
 
+def _recent_months_start() -> datetime:
+    """first hour of the previous month, in utc"""
+    first_of_month = datetime.now(timezone.utc).replace(
+        tzinfo=None, day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+    return (first_of_month - timedelta(days=1)).replace(day=1)
+
+
 class SiteUsageRepository:
     """accepts and returns timezone naive, but utc date/datetime objects"""
 
@@ -43,6 +57,16 @@ class SiteUsageRepository:
 
     @staticmethod
     def get_total_submissions(date: date) -> int:
+        # running total kept by the monthly submissions function, summed if the month doesn't have one yet
+        total = db.session.execute(
+            db.select(MonthlySubmissions.cumulative_count)
+            .where(MonthlySubmissions.month <= date)
+            .order_by(MonthlySubmissions.month.desc())
+            .limit(1)
+        ).scalar()
+        if total is not None:
+            return total
+
         return db.session.execute(
             db.select(func.sum(MonthlySubmissions.count)).where(
                 MonthlySubmissions.month <= date
@@ -57,6 +81,15 @@ class SiteUsageRepository:
 
     @staticmethod
     def get_latest_hour_for_downloads() -> datetime:
+        # hourly_downloads is partitioned by month, so bounding the max to recent months only reads their partitions
+        latest_hour = db.session.execute(
+            db.select(func.max(HourlyDownloads.start_dttm)).where(
+                HourlyDownloads.start_dttm >= _recent_months_start()
+            )
+        ).scalar()
+        if latest_hour is not None:
+            return latest_hour
+
         return db.session.execute(
             db.select(func.max(HourlyDownloads.start_dttm))
         ).scalar()
@@ -71,9 +104,35 @@ class SiteUsageRepository:
             .where(HourlyDownloads.start_dttm <= end_hour)
         ).scalar()
 
+    @staticmethod
+    def get_month_to_date_downloads(
+        month: Optional[date] = None,
+    ) -> Optional[MonthToDateDownloads_]:
+        """running total of the month kept by the aggregator, the latest month if none is given
+        month object should represent the first day of that month
+        """
+        query = db.select(MonthToDateDownloads)
+        if month is not None:
+            query = query.where(MonthToDateDownloads.month == month)
+        result = db.session.execute(
+            query.order_by(MonthToDateDownloads.month.desc()).limit(1)
+        ).scalar()
+
+        return MonthToDateDownloads_.model_validate(result) if result else None
+
     @staticmethod
     def get_total_downloads(month: date) -> int:
         """month object should represent the first day of that month"""
+        # running total kept by the monthly downloads function, summed if the month doesn't have one yet
+        total = db.session.execute(
+            db.select(MonthlyDownloads.cumulative_downloads)
+            .where(MonthlyDownloads.month < month)
+            .order_by(MonthlyDownloads.month.desc())
+            .limit(1)
+        ).scalar()
+        if total is not None:
+            return total
+
         return db.session.execute(
             db.select(func.sum(MonthlyDownloads.downloads)).where(
                 MonthlyDownloads.month < month
@@ -59,14 +59,20 @@ class StatsService:
 
     @staticmethod
     def get_downloads_page_data() -> DownloadsPageData:
-        latest_hour = SiteUsageRepository.get_latest_hour_for_downloads()
+        month_to_date = SiteUsageRepository.get_month_to_date_downloads()
+        if month_to_date is not None:
+            latest_hour = month_to_date.latest_hour
+            total_latest_month = month_to_date.downloads
+        else:
+            # the aggregator hasn't kept a running total yet
+            latest_hour = SiteUsageRepository.get_latest_hour_for_downloads()
+            total_latest_month = SiteUsageRepository.get_total_downloads_for_hour_range(
+                datetime(latest_hour.year, latest_hour.month, 1), latest_hour
+            )
+
         arxiv_latest_hour = latest_hour.replace(tzinfo=timezone.utc).astimezone(
             ZoneInfo(current_app.config["ARXIV_TIMEZONE"])
         )
-
-        total_latest_month = SiteUsageRepository.get_total_downloads_for_hour_range(
-            datetime(latest_hour.year, latest_hour.month, 1), latest_hour
-        )
         total_historical = SiteUsageRepository.get_total_downloads(
             date(latest_hour.year, latest_hour.month, 1)
         )
@@ -93,9 +99,22 @@ class StatsService:
 
     @staticmethod
     def get_monthly_downloads(hour: datetime) -> str:
-        total_latest_month = SiteUsageRepository.get_total_downloads_for_hour_range(
-            datetime(hour.year, hour.month, 1), hour
-        )
+        # the running total is kept in utc, like hourly_downloads
+        utc_hour = hour.astimezone(timezone.utc).replace(tzinfo=None)
+        utc_month = date(utc_hour.year, utc_hour.month, 1)
+        month_to_date = SiteUsageRepository.get_month_to_date_downloads(utc_month)
+        if (
+            month_to_date is not None
+            and month_to_date.latest_hour <= utc_hour
+            and utc_month == date(hour.year, hour.month, 1)
+        ):
+            # no hours after the running total's latest hour have been written in the month, and the month is
+            # the one shown (the last arxiv local hours of a month are already in the next utc month)
+            total_latest_month = month_to_date.downloads
+        else:
+            total_latest_month = SiteUsageRepository.get_total_downloads_for_hour_range(
+                datetime(hour.year, hour.month, 1), hour
+            )
         data = SiteUsageRepository.get_monthly_downloads(date(hour.year, hour.month, 1))
 
         monthly_downloads = StatsService._combine_monthly_downloads(
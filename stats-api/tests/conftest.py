@@ -3,7 +3,9 @@ from stats_api.app import create_app
 from tests.data.site_usage import (
     mock_hourly_requests,
     mock_monthly_submissions,
+    mock_download_dimensions,
     mock_hourly_downloads,
+    mock_month_to_date_downloads,
     mock_monthly_downloads,
 )
 
@@ -20,7 +22,9 @@ def app():
         db.session.add_all(
             mock_hourly_requests
             + mock_monthly_submissions
+            + mock_download_dimensions
             + mock_hourly_downloads
+            + mock_month_to_date_downloads
             + mock_monthly_downloads
         )
         db.session.commit()
@@ -4,6 +4,10 @@ from stats_entities.site_usage import (
     MonthlySubmissions,
     HourlyDownloads,
     MonthlyDownloads,
+    MonthToDateDownloads,
+    DownloadCategory,
+    DownloadCountry,
+    DownloadType,
 )
 
 """
@@ -40,61 +44,80 @@ mock_hourly_requests = [
 ]
 
 mock_monthly_submissions = [
-    MonthlySubmissions(month=date(2024, 12, 1), count=20000),
-    MonthlySubmissions(month=date(2025, 1, 1), count=22000),
-    MonthlySubmissions(month=date(2025, 5, 1), count=25000),
+    MonthlySubmissions(month=date(2024, 12, 1), count=20000, cumulative_count=20000),
+    MonthlySubmissions(month=date(2025, 1, 1), count=22000, cumulative_count=42000),
+    MonthlySubmissions(month=date(2025, 5, 1), count=25000, cumulative_count=67000),
+]
+
+mock_download_dimensions = [
+    DownloadCategory(id=1, category="astro-ph", archive="astro-ph"),
+    DownloadCategory(id=2, category="cs.AI", archive="cs"),
+    DownloadCountry(id=1, name="united states"),
+    DownloadCountry(id=2, name="germany"),
+    DownloadType(id=1, name="html"),
+    DownloadType(id=2, name="pdf"),
 ]
 
 mock_hourly_downloads = [
     HourlyDownloads(
-        country="united states",
-        download_type="html",
-        archive="astro-ph",
-        category="astro-ph",
+        category_id=1,
+        country_id=1,
+        download_type_id=1,
         primary_count=10,
         cross_count=0,
         start_dttm=datetime(2025, 11, 5, 6),
     ),
     HourlyDownloads(
-        country="germany",
-        download_type="pdf",
-        archive="astro-ph",
-        category="astro-ph",
+        category_id=1,
+        country_id=2,
+        download_type_id=2,
         primary_count=2,
         cross_count=2,
         start_dttm=datetime(2025, 11, 5, 7),
     ),
     HourlyDownloads(
-        country="united states",
-        download_type="pdf",
-        archive="cs",
-        category="cs.AI",
+        category_id=2,
+        country_id=1,
+        download_type_id=2,
         primary_count=3,
         cross_count=1,
         start_dttm=datetime(2025, 11, 6, 6),
     ),
     HourlyDownloads(
-        country="germany",
-        download_type="pdf",
-        archive="astro-ph",
-        category="astro-ph",
+        category_id=1,
+        country_id=2,
+        download_type_id=2,
         primary_count=5,
         cross_count=2,
         start_dttm=datetime(2025, 12, 1, 7),
     ),
     HourlyDownloads(
-        country="united states",
-        download_type="pdf",
-        archive="cs",
-        category="cs.AI",
+        category_id=2,
+        country_id=1,
+        download_type_id=2,
         primary_count=5,
         cross_count=1,
         start_dttm=datetime(2025, 12, 2, 6),
     ),
 ]
 
+mock_month_to_date_downloads = [
+    MonthToDateDownloads(
+        month=date(2025, 11, 1), downloads=15, latest_hour=datetime(2025, 11, 30, 23)
+    ),
+    MonthToDateDownloads(
+        month=date(2025, 12, 1), downloads=10, latest_hour=datetime(2025, 12, 2, 6)
+    ),
+]
+
 mock_monthly_downloads = [
-    MonthlyDownloads(month=date(2025, 12, 1), downloads=3500000),
-    MonthlyDownloads(month=date(2025, 11, 1), downloads=3000000),
-    MonthlyDownloads(month=date(2025, 10, 1), downloads=2500000),
+    MonthlyDownloads(
+        month=date(2025, 12, 1), downloads=3500000, cumulative_downloads=9000000
+    ),
+    MonthlyDownloads(
+        month=date(2025, 11, 1), downloads=3000000, cumulative_downloads=5500000
+    ),
+    MonthlyDownloads(
+        month=date(2025, 10, 1), downloads=2500000, cumulative_downloads=2500000
+    ),
 ]
@@ -1,6 +1,12 @@
+import pytest
 from datetime import date, datetime, timezone
+from unittest.mock import patch
 
+from sqlalchemy import update
+
+from stats_api.config.database import db
 from stats_api.repository import SiteUsageRepository
+from stats_entities.site_usage import MonthlyDownloads, MonthlySubmissions
 
 
 def test_get_total_requests(app):
@@ -30,6 +36,25 @@ def test_get_total_submissions(app):
         assert result == 42000
 
 
+@pytest.mark.parametrize("entity", [MonthlySubmissions, MonthlyDownloads])
+def test_get_totals_without_running_totals(app, entity):
+    # months written before the running totals existed are summed instead
+    with app.app_context():
+        db.session.execute(
+            update(entity).values(
+                {
+                    MonthlySubmissions: {"cumulative_count": None},
+                    MonthlyDownloads: {"cumulative_downloads": None},
+                }[entity]
+            )
+        )
+        try:
+            assert SiteUsageRepository.get_total_submissions(date(2025, 1, 1)) == 42000
+            assert SiteUsageRepository.get_total_downloads(date(2025, 12, 1)) == 5500000
+        finally:
+            db.session.rollback()
+
+
 def test_get_monthly_submissions(app):
     with app.app_context():
         result = SiteUsageRepository.get_monthly_submissions()
@@ -44,6 +69,19 @@ def test_get_latest_hour_for_downloads(app):
         assert result == datetime(2025, 12, 2, 6)
 
 
+@pytest.mark.parametrize(
+    "recent_months_start", [datetime(2025, 11, 1), datetime(2026, 1, 1)]
+)
+def test_get_latest_hour_for_downloads_within_recent_months(app, recent_months_start):
+    # the latest hour is found in the recent months, or by falling back to the whole table
+    with app.app_context(), patch(
+        "stats_api.repository._recent_months_start", return_value=recent_months_start
+    ):
+        result = SiteUsageRepository.get_latest_hour_for_downloads()
+
+        assert result == datetime(2025, 12, 2, 6)
+
+
 def test_get_total_downloads_for_hour_range(app):
     with app.app_context():
         result = SiteUsageRepository.get_total_downloads_for_hour_range(
@@ -53,6 +91,25 @@ def test_get_total_downloads_for_hour_range(app):
         assert result == 5
 
 
+@pytest.mark.parametrize(
+    "month, expected",
+    [
+        (None, (date(2025, 12, 1), 10, datetime(2025, 12, 2, 6))),
+        (date(2025, 11, 1), (date(2025, 11, 1), 15, datetime(2025, 11, 30, 23))),
+        (date(2025, 10, 1), None),
+    ],
+)
+def test_get_month_to_date_downloads(app, month, expected):
+    with app.app_context():
+        result = SiteUsageRepository.get_month_to_date_downloads(month)
+
+        if expected is None:
+            assert result is None
+        else:
+            assert result is not None
+            assert (result.month, result.downloads, result.latest_hour) == expected
+
+
 def test_get_total_downloads(app):
     with app.app_context():
         result = SiteUsageRepository.get_total_downloads(date(2025, 11, 1))
@@ -1,8 +1,10 @@
+import pytest
 from unittest.mock import patch
 from datetime import date, datetime
+from zoneinfo import ZoneInfo
 
 from stats_api.service import StatsService
-from stats_api.models import MonthlyDownloads_
+from stats_api.models import MonthlyDownloads_, MonthToDateDownloads_
 
 
 @patch("stats_api.service.SiteUsageRepository")
@@ -20,27 +22,103 @@ def test_get_submissions_page_data(MockSiteUsageRepository, app):
 @patch("stats_api.service.SiteUsageRepository")
 def test_get_downloads_page_data_same_day(MockSiteUsageRepository, app):
     with app.app_context():
-        MockSiteUsageRepository.get_latest_hour_for_downloads.return_value = datetime(
-            2025, 11, 10, 15
+        MockSiteUsageRepository.get_month_to_date_downloads.return_value = (
+            MonthToDateDownloads_(
+                month=date(2025, 11, 1),
+                downloads=20000,
+                latest_hour=datetime(2025, 11, 10, 15),
+            )
         )
+        MockSiteUsageRepository.get_total_downloads.return_value = 100000
 
         result = StatsService.get_downloads_page_data()
 
         assert result.arxiv_latest_month == date(2025, 11, 1)
+        assert result.total_downloads == 120000
+        MockSiteUsageRepository.get_total_downloads_for_hour_range.assert_not_called()
 
 
 @patch("stats_api.service.SiteUsageRepository")
 def test_get_downloads_page_data_crossover(MockSiteUsageRepository, app):
     with app.app_context():
-        MockSiteUsageRepository.get_latest_hour_for_downloads.return_value = datetime(
-            2025, 11, 1, 3
+        MockSiteUsageRepository.get_month_to_date_downloads.return_value = (
+            MonthToDateDownloads_(
+                month=date(2025, 11, 1),
+                downloads=20000,
+                latest_hour=datetime(2025, 11, 1, 3),
+            )
         )
+        MockSiteUsageRepository.get_total_downloads.return_value = 100000
 
         result = StatsService.get_downloads_page_data()
 
         assert result.arxiv_latest_month == date(2025, 10, 1)
 
 
+@patch("stats_api.service.SiteUsageRepository")
+def test_get_downloads_page_data_without_month_to_date(MockSiteUsageRepository, app):
+    with app.app_context():
+        MockSiteUsageRepository.get_month_to_date_downloads.return_value = None
+        MockSiteUsageRepository.get_latest_hour_for_downloads.return_value = datetime(
+            2025, 11, 10, 15
+        )
+        MockSiteUsageRepository.get_total_downloads_for_hour_range.return_value = 20000
+        MockSiteUsageRepository.get_total_downloads.return_value = 100000
+
+        result = StatsService.get_downloads_page_data()
+
+        assert result.arxiv_latest_month == date(2025, 11, 1)
+        assert result.total_downloads == 120000
+        MockSiteUsageRepository.get_total_downloads_for_hour_range.assert_called_once_with(
+            datetime(2025, 11, 1), datetime(2025, 11, 10, 15)
+        )
+
+
+@pytest.mark.parametrize(
+    "hour, latest_hour, reads_hour_range",
+    [
+        # 01:00 in New York is 06:00 utc
+        (datetime(2025, 12, 2, 1), datetime(2025, 12, 2, 6), False),
+        (datetime(2025, 12, 2, 0), datetime(2025, 12, 2, 6), True),
+        # 23:00 on the last day of November in New York is already December in utc
+        (datetime(2025, 11, 30, 23), datetime(2025, 12, 1, 3), True),
+    ],
+)
+@patch("stats_api.service.SiteUsageRepository")
+def test_get_monthly_downloads_month_to_date(
+    MockSiteUsageRepository, app, hour, latest_hour, reads_hour_range
+):
+    # the running total only answers for hours at or after its latest hour
+    with app.app_context():
+        MockSiteUsageRepository.get_month_to_date_downloads.return_value = (
+            MonthToDateDownloads_(
+                month=date(latest_hour.year, latest_hour.month, 1),
+                downloads=20000,
+                latest_hour=latest_hour,
+            )
+        )
+        MockSiteUsageRepository.get_total_downloads_for_hour_range.return_value = 5000
+        MockSiteUsageRepository.get_monthly_downloads.return_value = []
+
+        # the route passes arxiv local hours
+        result = StatsService.get_monthly_downloads(
+            hour.replace(tzinfo=ZoneInfo(app.config["ARXIV_TIMEZONE"]))
+        )
+
+        MockSiteUsageRepository.get_month_to_date_downloads.assert_called_once_with(
+            date(latest_hour.year, latest_hour.month, 1)
+        )
+        assert (
+            result.strip()
+            .splitlines()[-1]
+            .endswith("5000" if reads_hour_range else "20000")
+        )
+        if reads_hour_range:
+            MockSiteUsageRepository.get_total_downloads_for_hour_range.assert_called_once()
+        else:
+            MockSiteUsageRepository.get_total_downloads_for_hour_range.assert_not_called()
+
+
 @patch("stats_api.service.SiteUsageRepository")
 def test_combine_monthly_downloads(MockSiteUsageRepository, app):
     mock_total_downloads = 20000
@@ -0,0 +1,31 @@
+-- Partition "hourly_downloads" by month of start_dttm
+-- written with atlas migrate new, atlas can't express partitions in the schema. later months are split out of
+-- p_future ahead of time by the monthly_downloads function, see stats_entities/partitions.py
+ALTER TABLE `hourly_downloads` PARTITION BY RANGE COLUMNS (`start_dttm`) (
+  PARTITION `p_before_2025` VALUES LESS THAN ('2025-01-01 00:00:00'),
+  PARTITION `p202501` VALUES LESS THAN ('2025-02-01 00:00:00'),
+  PARTITION `p202502` VALUES LESS THAN ('2025-03-01 00:00:00'),
+  PARTITION `p202503` VALUES LESS THAN ('2025-04-01 00:00:00'),
+  PARTITION `p202504` VALUES LESS THAN ('2025-05-01 00:00:00'),
+  PARTITION `p202505` VALUES LESS THAN ('2025-06-01 00:00:00'),
+  PARTITION `p202506` VALUES LESS THAN ('2025-07-01 00:00:00'),
+  PARTITION `p202507` VALUES LESS THAN ('2025-08-01 00:00:00'),
+  PARTITION `p202508` VALUES LESS THAN ('2025-09-01 00:00:00'),
+  PARTITION `p202509` VALUES LESS THAN ('2025-10-01 00:00:00'),
+  PARTITION `p202510` VALUES LESS THAN ('2025-11-01 00:00:00'),
+  PARTITION `p202511` VALUES LESS THAN ('2025-12-01 00:00:00'),
+  PARTITION `p202512` VALUES LESS THAN ('2026-01-01 00:00:00'),
+  PARTITION `p202601` VALUES LESS THAN ('2026-02-01 00:00:00'),
+  PARTITION `p202602` VALUES LESS THAN ('2026-03-01 00:00:00'),
+  PARTITION `p202603` VALUES LESS THAN ('2026-04-01 00:00:00'),
+  PARTITION `p202604` VALUES LESS THAN ('2026-05-01 00:00:00'),
+  PARTITION `p202605` VALUES LESS THAN ('2026-06-01 00:00:00'),
+  PARTITION `p202606` VALUES LESS THAN ('2026-07-01 00:00:00'),
+  PARTITION `p202607` VALUES LESS THAN ('2026-08-01 00:00:00'),
+  PARTITION `p202608` VALUES LESS THAN ('2026-09-01 00:00:00'),
+  PARTITION `p202609` VALUES LESS THAN ('2026-10-01 00:00:00'),
+  PARTITION `p202610` VALUES LESS THAN ('2026-11-01 00:00:00'),
+  PARTITION `p202611` VALUES LESS THAN ('2026-12-01 00:00:00'),
+  PARTITION `p202612` VALUES LESS THAN ('2027-01-01 00:00:00'),
+  PARTITION `p_future` VALUES LESS THAN (MAXVALUE)
+);
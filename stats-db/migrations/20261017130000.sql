@@ -0,0 +1,24 @@
+-- Create "download_category" table
+CREATE TABLE `download_category` (
+  `id` smallint unsigned NOT NULL AUTO_INCREMENT,
+  `category` varchar(32) NOT NULL,
+  `archive` varchar(16) NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE INDEX `category` (`category`)
+) CHARSET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
+-- Create "download_country" table
+CREATE TABLE `download_country` (
+  `id` smallint unsigned NOT NULL AUTO_INCREMENT,
+  `name` varchar(255) NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE INDEX `name` (`name`)
+) CHARSET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
+-- Create "download_type" table
+CREATE TABLE `download_type` (
+  `id` tinyint unsigned NOT NULL AUTO_INCREMENT,
+  `name` varchar(16) NOT NULL,
+  PRIMARY KEY (`id`),
+  UNIQUE INDEX `name` (`name`)
+) CHARSET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
+-- Modify "hourly_downloads" table
+ALTER TABLE `hourly_downloads` ADD COLUMN `category_id` smallint unsigned NULL, ADD COLUMN `country_id` smallint unsigned NULL, ADD COLUMN `download_type_id` tinyint unsigned NULL;
@@ -0,0 +1,2 @@
+-- Modify "hourly_downloads" table
+ALTER TABLE `hourly_downloads` DROP COLUMN `country`, DROP COLUMN `download_type`, DROP COLUMN `archive`, DROP COLUMN `category`, MODIFY COLUMN `category_id` smallint unsigned NOT NULL, MODIFY COLUMN `country_id` smallint unsigned NOT NULL, MODIFY COLUMN `download_type_id` tinyint unsigned NOT NULL, DROP PRIMARY KEY, ADD PRIMARY KEY (`start_dttm`, `category_id`, `country_id`, `download_type_id`);
@@ -0,0 +1,10 @@
+-- Create "daily_downloads" table
+CREATE TABLE `daily_downloads` (
+  `day` date NOT NULL,
+  `category_id` smallint unsigned NOT NULL,
+  `country_id` smallint unsigned NOT NULL,
+  `download_type_id` tinyint unsigned NOT NULL,
+  `primary_count` int NOT NULL,
+  `cross_count` int NOT NULL,
+  PRIMARY KEY (`day`, `category_id`, `country_id`, `download_type_id`)
+) CHARSET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
@@ -0,0 +1,7 @@
+-- Create "month_to_date_downloads" table
+CREATE TABLE `month_to_date_downloads` (
+  `month` date NOT NULL,
+  `downloads` int NOT NULL,
+  `latest_hour` datetime NOT NULL,
+  PRIMARY KEY (`month`)
+) CHARSET utf8mb4 COLLATE utf8mb4_0900_ai_ci;
@@ -0,0 +1,4 @@
+-- Modify "monthly_downloads" table
+ALTER TABLE `monthly_downloads` ADD COLUMN `cumulative_downloads` bigint NULL;
+-- Modify "monthly_submissions" table
+ALTER TABLE `monthly_submissions` ADD COLUMN `cumulative_count` int NULL;
@@ -0,0 +1,96 @@
+"""fills the dimension ids of existing hourly_downloads rows, between migrations 20261017130000 and 20261017140000
+
+    uv run --with pymysql python scripts/encode_hourly_downloads_dimensions.py mysql+pymysql://admin:{password}@{host}:{port}/site_usage
+
+migrations only change the schema, so this copies the country, category, archive and download type strings of
+each row into the download_* tables and sets the row's ids, chunk_hours of rows at a time with a commit per chunk
+only rows without ids are touched, so it can be stopped and run again. the aggregator should be paused while it
+runs, see the stats-db README
+"""
+
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+FILL_DIMENSIONS = [
+    """
+    INSERT IGNORE INTO download_country (name)
+    SELECT DISTINCT country FROM hourly_downloads
+    WHERE start_dttm >= :start AND start_dttm < :end AND country_id IS NULL
+    """,
+    """
+    INSERT IGNORE INTO download_category (category, archive)
+    SELECT category, MAX(archive) FROM hourly_downloads
+    WHERE start_dttm >= :start AND start_dttm < :end AND category_id IS NULL
+    GROUP BY category
+    """,
+    """
+    INSERT IGNORE INTO download_type (name)
+    SELECT DISTINCT download_type FROM hourly_downloads
+    WHERE start_dttm >= :start AND start_dttm < :end AND download_type_id IS NULL
+    """,
+]
+
+SET_IDS = """
+    UPDATE hourly_downloads h
+    JOIN download_country c ON c.name = h.country
+    JOIN download_category cat ON cat.category = h.category
+    JOIN download_type t ON t.name = h.download_type
+    SET h.country_id = c.id, h.category_id = cat.id, h.download_type_id = t.id
+    WHERE h.start_dttm >= :start AND h.start_dttm < :end
+    AND (h.country_id IS NULL OR h.category_id IS NULL OR h.download_type_id IS NULL)
+    """
+
+
+def encode(url: str, chunk_hours: int):
+    engine = create_engine(url)
+
+    with engine.connect() as connection:
+        first, last = connection.execute(
+            text(
+                "SELECT MIN(start_dttm), MAX(start_dttm) FROM hourly_downloads "
+                "WHERE country_id IS NULL OR category_id IS NULL OR download_type_id IS NULL"
+            )
+        ).one()
+        if first is None:
+            logger.info("Every row of hourly_downloads already has dimension ids")
+            return
+
+        logger.info(f"Encoding hourly_downloads from {first} to {last}")
+        start = datetime(first.year, first.month, first.day, first.hour)
+        while start <= last:
+            end = start + timedelta(hours=chunk_hours)
+            chunk_start = time.perf_counter()
+            params = {"start": start, "end": end}
+
+            for statement in FILL_DIMENSIONS:
+                connection.execute(text(statement), params)
+            row_count = connection.execute(text(SET_IDS), params).rowcount
+            connection.commit()
+
+            logger.info(
+                f"{start} to {end}: encoded {row_count} rows in {time.perf_counter() - chunk_start:.2f}s"
+            )
+            start = end
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Fill the dimension ids of existing hourly_downloads rows"
+    )
+    parser.add_argument("url", help="sqlalchemy url of the site_usage database")
+    parser.add_argument(
+        "--chunk-hours", type=int, default=24, help="hours converted per transaction"
+    )
+    args = parser.parse_args()
+
+    encode(args.url, args.chunk_hours)
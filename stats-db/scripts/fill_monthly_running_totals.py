@@ -0,0 +1,56 @@
+"""fills the running totals of monthly_submissions and monthly_downloads after migration 20261017170000
+
+    uv run --with pymysql python scripts/fill_monthly_running_totals.py mysql+pymysql://admin:{password}@{host}:{port}/site_usage
+
+migrations only change the schema, so this sets cumulative_count and cumulative_downloads of every existing month
+from the monthly counts, one transaction per table. the monthly functions keep them up to date afterwards.
+it recomputes every month, so it can be run again at any time
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+FILL_RUNNING_TOTALS = {
+    "monthly_submissions": """
+        UPDATE monthly_submissions m
+        JOIN (SELECT month, SUM(count) OVER (ORDER BY month) AS total FROM monthly_submissions) t
+        ON t.month = m.month
+        SET m.cumulative_count = t.total
+        """,
+    "monthly_downloads": """
+        UPDATE monthly_downloads m
+        JOIN (
+            SELECT month, SUM(COALESCE(downloads, 0)) OVER (ORDER BY month) AS total FROM monthly_downloads
+        ) t
+        ON t.month = m.month
+        SET m.cumulative_downloads = t.total
+        """,
+}
+
+
+def fill(url: str):
+    engine = create_engine(url)
+
+    with engine.connect() as connection:
+        for table, statement in FILL_RUNNING_TOTALS.items():
+            row_count = connection.execute(text(statement)).rowcount
+            connection.commit()
+            logger.info(f"Filled the running totals of {row_count} rows of {table}")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(
+        description="Fill the running totals of monthly_submissions and monthly_downloads"
+    )
+    parser.add_argument("url", help="sqlalchemy url of the site_usage database")
+    args = parser.parse_args()
+
+    fill(args.url)
@@ -0,0 +1,69 @@
+"""monthly range partitions of site_usage.hourly_downloads
+
+hourly_downloads is partitioned by RANGE COLUMNS(start_dttm), see stats-db/migrations/20261017120000.sql
+each month has a partition named p<yyyymm>, anything older than the first month is in p_before_2025
+and anything past the last month is in p_future until that month's partition is split out of it
+queries with range or equality conditions on start_dttm are pruned to the partitions of those months
+"""
+
+from datetime import date
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+
+HOURLY_DOWNLOADS_FUTURE_PARTITION = "p_future"
+
+HOURLY_DOWNLOADS_PARTITIONS_QUERY = text("""
+    SELECT partition_name FROM information_schema.partitions
+    WHERE table_schema = DATABASE() AND table_name = 'hourly_downloads' AND partition_name IS NOT NULL
+    """)
+
+
+def month_partition_name(month: date) -> str:
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _partition_month(name: str) -> Optional[date]:
+    if len(name) != 7 or not name[1:].isdigit():
+        return None
+    return date(int(name[1:5]), int(name[5:7]), 1)
+
+
+def add_month_partitions_statement(
+    existing_partitions: Iterable[str], through_month: date
+) -> Optional[str]:
+    """splits partitions for every month after the last monthly partition up to through_month out of p_future
+    returns None if they all exist, or if hourly_downloads isn't partitioned by month
+    """
+    months = [
+        month
+        for month in map(_partition_month, existing_partitions)
+        if month is not None
+    ]
+    if not months:
+        return None
+
+    new_months: List[date] = []
+    month = _next_month(max(months))
+    while month <= through_month.replace(day=1):
+        new_months.append(month)
+        month = _next_month(month)
+    if not new_months:
+        return None
+
+    partitions = [
+        f"PARTITION `{month_partition_name(month)}` VALUES LESS THAN ('{_next_month(month)} 00:00:00')"
+        for month in new_months
+    ]
+    partitions.append(
+        f"PARTITION `{HOURLY_DOWNLOADS_FUTURE_PARTITION}` VALUES LESS THAN (MAXVALUE)"
+    )
+    return (
+        f"ALTER TABLE `hourly_downloads` REORGANIZE PARTITION `{HOURLY_DOWNLOADS_FUTURE_PARTITION}` INTO ("
+        + ", ".join(partitions)
+        + ")"
+    )
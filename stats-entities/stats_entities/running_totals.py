@@ -0,0 +1,49 @@
+"""running totals of the monthly tables of site_usage
+
+monthly_submissions.cumulative_count and monthly_downloads.cumulative_downloads hold the sum of every month up to
+and including the row's month, so all-time totals are a single row lookup
+the monthly functions update them in the same transaction as they write a month, from that month on, so rewriting
+a past month corrects the totals of every later month too
+"""
+
+from datetime import date
+from typing import Dict, Tuple, Type
+
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from stats_entities.site_usage import MonthlyDownloads, MonthlySubmissions
+
+# entity -> (monthly count column, running total column)
+RUNNING_TOTALS: Dict[Type, Tuple[str, str]] = {
+    MonthlySubmissions: ("count", "cumulative_count"),
+    MonthlyDownloads: ("downloads", "cumulative_downloads"),
+}
+
+
+def update_running_totals(session: Session, entity: Type, month: date) -> int:
+    """recomputes the running totals of the month and every later month, without committing
+    returns the running total of the month
+    """
+    count_name, cumulative_name = RUNNING_TOTALS[entity]
+    count = getattr(entity, count_name)
+
+    # summed rather than read from the previous month, so months written before the totals existed still count
+    running_total = session.execute(
+        select(func.coalesce(func.sum(count), 0)).where(entity.month < month)
+    ).scalar()
+    month_total = running_total
+
+    for row_month, row_count in session.execute(
+        select(entity.month, count).where(entity.month >= month).order_by(entity.month)
+    ).all():
+        running_total += row_count or 0
+        if row_month == month:
+            month_total = running_total
+        session.execute(
+            update(entity)
+            .where(entity.month == row_month)
+            .values({cumulative_name: running_total})
+        )
+
+    return month_total
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Integer, Date, DateTime, Enum, ForeignKey
-from sqlalchemy.dialects.mysql import TINYINT
+from sqlalchemy import Column, String, Integer, BigInteger, Date, DateTime, ForeignKey
+from sqlalchemy.dialects.mysql import SMALLINT, TINYINT
 from sqlalchemy.orm import declarative_base
 
 
@@ -7,26 +7,93 @@ SiteUsageBase = declarative_base()
 
 
 class HourlyDownloads(SiteUsageBase):
+    # range partitioned by month of start_dttm in mysql, see partitions.py
+    # dimensions are stored as ids into the download_* tables, which can't be foreign keys on a partitioned table
     __tablename__ = "hourly_downloads"
 
     start_dttm = Column(DateTime, primary_key=True)
-    category = Column(String(32), primary_key=True)
-    country = Column(String(255), primary_key=True)
-    download_type = Column(
-        String(16),
-        Enum("pdf", "html", "src", name="download_type_enum"),
+    category_id = Column(
+        SMALLINT(unsigned=True).with_variant(Integer, "sqlite"),
         primary_key=True,
+        autoincrement=False,
+    )
+    country_id = Column(
+        SMALLINT(unsigned=True).with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    download_type_id = Column(
+        TINYINT(unsigned=True).with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=False,
     )
-    archive = Column(String(16))
     primary_count = Column(Integer)
     cross_count = Column(Integer)
 
 
+class DailyDownloads(SiteUsageBase):
+    # hourly_downloads summed by utc day, kept up to date by aggregate_hourly_downloads as it writes each hour
+    __tablename__ = "daily_downloads"
+
+    day = Column(Date, primary_key=True)
+    category_id = Column(
+        SMALLINT(unsigned=True).with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    country_id = Column(
+        SMALLINT(unsigned=True).with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    download_type_id = Column(
+        TINYINT(unsigned=True).with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    primary_count = Column(Integer, nullable=False)
+    cross_count = Column(Integer, nullable=False)
+
+
+class MonthToDateDownloads(SiteUsageBase):
+    # primary counts of hourly_downloads summed by utc month up to the latest hour written in it,
+    # kept up to date by aggregate_hourly_downloads as it writes each hour
+    __tablename__ = "month_to_date_downloads"
+
+    month = Column(Date, primary_key=True)
+    downloads = Column(Integer, nullable=False)
+    latest_hour = Column(DateTime, nullable=False)
+
+
+class DownloadCategory(SiteUsageBase):
+    __tablename__ = "download_category"
+
+    id = Column(SMALLINT(unsigned=True).with_variant(Integer, "sqlite"), primary_key=True)
+    category = Column(String(32), nullable=False, unique=True)
+    archive = Column(String(16))
+
+
+class DownloadCountry(SiteUsageBase):
+    __tablename__ = "download_country"
+
+    id = Column(SMALLINT(unsigned=True).with_variant(Integer, "sqlite"), primary_key=True)
+    name = Column(String(255), nullable=False, unique=True)
+
+
+class DownloadType(SiteUsageBase):
+    __tablename__ = "download_type"
+
+    id = Column(TINYINT(unsigned=True).with_variant(Integer, "sqlite"), primary_key=True)
+    name = Column(String(16), nullable=False, unique=True)
+
+
 class MonthlyDownloads(SiteUsageBase):
     __tablename__ = "monthly_downloads"
 
     month = Column(Date, primary_key=True)
     downloads = Column(Integer)
+    # downloads of every month up to and including this one, see running_totals.py
+    cumulative_downloads = Column(BigInteger)
 
 
 class HistoricalHourlyRequests(SiteUsageBase):
@@ -61,3 +128,5 @@ class MonthlySubmissions(SiteUsageBase):
 
     month = Column(Date, primary_key=True)
     count = Column(Integer, nullable=False)
+    # submissions of every month up to and including this one, see running_totals.py
+    cumulative_count = Column(Integer)
@@ -0,0 +1,29 @@
+from typing import Iterator, List
+
+import pyarrow as pa
+
+
+class ArrowFileRows:
+    """local stand-in for the RowIterator of a log query, serving the results from arrow ipc files
+    supports the parts of RowIterator used with arrow ingestion, so tests and local runs can go through the same path
+    """
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+
+    @property
+    def total_rows(self) -> int:
+        total = 0
+        for path in self.paths:
+            with pa.ipc.open_file(path) as reader:
+                total += sum(
+                    reader.get_batch(i).num_rows
+                    for i in range(reader.num_record_batches)
+                )
+        return total
+
+    def to_arrow_iterable(self, bqstorage_client=None) -> Iterator[pa.RecordBatch]:
+        for path in self.paths:
+            with pa.ipc.open_file(path) as reader:
+                for i in range(reader.num_record_batches):
+                    yield reader.get_batch(i)
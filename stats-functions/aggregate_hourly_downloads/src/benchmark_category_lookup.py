@@ -0,0 +1,74 @@
+"""times the category_lookup_strategy options against the configured read database
+
+    ENV=DEV python benchmark_category_lookup.py --papers 150000 --repeats 3
+
+looks up the categories of the most recent current papers in arXiv_metadata with each strategy in turn, checks
+that they find the same rows and logs the time of every lookup and the best of each strategy. the IN list cost
+this compares against is in the database's parsing and planning, so only a mysql read database gives numbers
+worth choosing a strategy on
+"""
+
+import argparse
+import logging
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+import main
+from entities import Metadata
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ["in_list", "temp_table"]
+
+
+def run(argv: Optional[List[str]] = None) -> Dict[str, float]:
+    parser = argparse.ArgumentParser(
+        description="Compare the paper category lookup strategies"
+    )
+    parser.add_argument(
+        "--papers", type=int, default=150000, help="paper ids looked up each time"
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=3, help="lookups per strategy, alternating"
+    )
+    args = parser.parse_args(argv)
+
+    main.initialize_sessions()
+    with main.ReadSessionFactory() as session:
+        paper_ids = set(
+            session.scalars(
+                select(Metadata.paper_id)
+                .where(Metadata.is_current == 1)
+                .order_by(Metadata.metadata_id.desc())
+                .limit(args.papers)
+            )
+        )
+
+    timings = {strategy: [] for strategy in STRATEGIES}
+    results = {}
+    for _ in range(args.repeats):
+        for strategy in STRATEGIES:
+            main.config.category_lookup_strategy = strategy
+            start = time.perf_counter()
+            rows = main.get_paper_categories(paper_ids)
+            timings[strategy].append(time.perf_counter() - start)
+            results[strategy] = sorted(tuple(row) for row in rows)
+            logger.info(
+                f"{strategy}: {len(rows)} categories of {len(paper_ids)} papers in {timings[strategy][-1]:.2f}s"
+            )
+
+    if results["in_list"] != results["temp_table"]:
+        raise RuntimeError("The lookup strategies found different categories")
+
+    best = {strategy: min(timings[strategy]) for strategy in STRATEGIES}
+    logger.info(
+        f"Best of {args.repeats}: "
+        + ", ".join(f"{strategy} {best[strategy]:.2f}s" for strategy in STRATEGIES)
+    )
+    return best
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,89 @@
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Set, Tuple
+
+from models import PaperCategories
+
+
+class PaperCategoriesCache:
+    """in-process LRU cache of resolved PaperCategories, kept across warm invocations of the function
+    bounded by entry count and an estimate of the bytes held, entries expire ttl_in_seconds after being stored
+    a max_entries of 0 disables the cache
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_in_seconds: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_in_seconds = ttl_in_seconds
+        self.lock = threading.Lock()
+        # paper_id -> (expires at, categories, estimated size)
+        self.entries: OrderedDict[str, Tuple[float, PaperCategories, int]] = (
+            OrderedDict()
+        )
+        self.size = 0
+
+    @staticmethod
+    def _estimate_size(paper_id: str, cats: PaperCategories) -> int:
+        # categories are held as a primary index and a cross-list bitmask, see CategoryMembership
+        return (
+            sys.getsizeof(paper_id)
+            + sys.getsizeof(cats)
+            + sys.getsizeof(cats.membership)
+            + sys.getsizeof(cats.membership.crosses)
+        )
+
+    def _remove(self, paper_id: str):
+        _, _, size = self.entries.pop(paper_id)
+        self.size -= size
+
+    def get_many(
+        self, paper_ids: Iterable[str]
+    ) -> Tuple[Dict[str, PaperCategories], Set[str]]:
+        """returns the cached categories for the given papers and the set of papers that were not cached"""
+        now = time.monotonic()
+        found: Dict[str, PaperCategories] = {}
+        missing: Set[str] = set()
+
+        with self.lock:
+            for paper_id in paper_ids:
+                entry = self.entries.get(paper_id)
+                if entry is None:
+                    missing.add(paper_id)
+                elif entry[0] < now:
+                    self._remove(paper_id)
+                    missing.add(paper_id)
+                else:
+                    self.entries.move_to_end(paper_id)
+                    found[paper_id] = entry[1]
+
+        return found, missing
+
+    def put_many(self, paper_categories: Dict[str, PaperCategories]):
+        if self.max_entries <= 0:
+            return
+
+        expires_at = time.monotonic() + self.ttl_in_seconds
+        with self.lock:
+            for paper_id, cats in paper_categories.items():
+                if paper_id in self.entries:
+                    self._remove(paper_id)
+                size = self._estimate_size(paper_id, cats)
+                self.entries[paper_id] = (expires_at, cats, size)
+                self.size += size
+
+            # evict least recently used papers until back within both bounds
+            while self.entries and (
+                len(self.entries) > self.max_entries or self.size > self.max_bytes
+            ):
+                self._remove(next(iter(self.entries)))
+
+    def discard(self, paper_ids: Iterable[str]):
+        with self.lock:
+            for paper_id in paper_ids:
+                if paper_id in self.entries:
+                    self._remove(paper_id)
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,98 @@
+"""runs aggregate_hourly_downloads locally over a range of hours, for backfills
+
+    ENV=DEV python cli.py 2026-02-0100 2026-02-0723
+
+hours are given as YYYY-MM-DDHH in UTC and the range is inclusive. ranges longer than max_hours_per_run
+are split into consecutive runs, each with one log query and one category lookup
+with LOG_CACHE_DIR set, hours already queried are read from the log cache unless --force-refresh is given
+--rebuild-daily regenerates daily_downloads for the days of the range from hourly_downloads instead, and
+--rebuild-month-to-date regenerates month_to_date_downloads for its months
+
+    ENV=DEV python cli.py --rebuild-daily 2026-02-0100 2026-02-0723
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional, Tuple, Union
+
+import main
+from models import AggregationResult
+
+logger = logging.getLogger(__name__)
+
+
+def hour_windows(
+    start_hour: datetime, end_hour: datetime, max_hours: int
+) -> Iterator[Tuple[datetime, datetime]]:
+    window_start = start_hour
+    while window_start <= end_hour:
+        window_end = min(window_start + timedelta(hours=max_hours - 1), end_hour)
+        yield window_start, window_end
+        window_start = window_end + timedelta(hours=1)
+
+
+def months(start_day: date, end_day: date) -> Iterator[date]:
+    month = start_day.replace(day=1)
+    while month <= end_day:
+        yield month
+        month = (month + timedelta(days=32)).replace(day=1)
+
+
+def run(
+    argv: Optional[List[str]] = None,
+) -> Union[List[AggregationResult], List[Optional[int]], int]:
+    parser = argparse.ArgumentParser(
+        description="Aggregate hourly downloads for a range of hours"
+    )
+    parser.add_argument("start_hour", help="first hour to aggregate, YYYY-MM-DDHH")
+    parser.add_argument(
+        "end_hour", nargs="?", help="last hour to aggregate, defaults to start_hour"
+    )
+    parser.add_argument(
+        "--force-refresh",
+        action="store_true",
+        help="query bigquery even for hours in the log cache",
+    )
+    parser.add_argument(
+        "--rebuild-daily",
+        action="store_true",
+        help="regenerate daily_downloads for the days of the range instead of aggregating",
+    )
+    parser.add_argument(
+        "--rebuild-month-to-date",
+        action="store_true",
+        help="regenerate month_to_date_downloads for the months of the range instead of aggregating",
+    )
+    args = parser.parse_args(argv)
+
+    start_hour = main.parse_hour(args.start_hour)
+    end_hour = main.parse_hour(args.end_hour or args.start_hour)
+    if end_hour < start_hour:
+        parser.error("end_hour is before start_hour")
+
+    main.initialize_sessions()
+
+    if args.rebuild_daily:
+        return main.rebuild_daily_downloads(start_hour.date(), end_hour.date())
+    if args.rebuild_month_to_date:
+        return [
+            main.rebuild_month_to_date_downloads(month)
+            for month in months(start_hour.date(), end_hour.date())
+        ]
+
+    results = []
+    for window_start, window_end in hour_windows(
+        start_hour, end_hour, main.config.max_hours_per_run
+    ):
+        result = main.aggregate_hour_range(
+            window_start, window_end, force_refresh=args.force_refresh
+        )
+        logger.info(result.single_run_str())
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    run()
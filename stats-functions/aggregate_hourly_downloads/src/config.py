@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Literal, Optional
 from arxiv_functions.config import FunctionConfig, DatabaseConfig
 
 
@@ -8,7 +8,57 @@ class Config(FunctionConfig):
 
     max_event_age_in_minutes: int = 50
     batch_size_for_category_query: int = 10000
+    # sessions the in_list batches are spread over, each holds a connection from the read engine's pool
+    category_query_workers: int = 1
+    # "in_list" queries categories in batches of paper ids bound as IN (...) parameters,
+    # "temp_table" loads the ids into a temporary table and queries them with a single join
+    category_lookup_strategy: Literal["in_list", "temp_table"] = "in_list"
+    # local copy of paper categories reused across warm invocations, None to always query the read database
+    # note that /tmp is in-memory on cloud functions and counts towards the memory limit, so this, the category
+    # cache and the output spool are off unless enabled by the deployment, see terraform/aggregate_hourly_downloads
+    category_snapshot_path: Optional[str] = None
+    category_snapshot_max_age_in_hours: int = 24
+    # resolved paper categories kept in memory across warm invocations, 0 entries disables the cache
+    category_cache_max_entries: int = 0
+    category_cache_max_bytes: int = 256 * 1024 * 1024
+    category_cache_ttl_in_minutes: int = 360
+    # raw paper ids remembered by the paper id normalizer, the memo is cleared once full
+    paper_id_memo_size: int = 1000000
     hour_delay: int = 3
+    # hours a single run can aggregate when given a start_hour and end_hour, all are held in memory at once
+    max_hours_per_run: int = 24
+    # log query job ids are this prefix and a hash of the query, its parameters and the triggering event
+    log_query_job_prefix: str = "aggregate_hourly_downloads"
+    # directory of per hour parquet files of log query results, reused when an hour is aggregated again,
+    # None to always query bigquery. least recently used hours are evicted beyond log_cache_max_bytes
+    log_cache_dir: Optional[str] = None
+    log_cache_max_bytes: int = 1024 * 1024 * 1024
+    # query bigquery and overwrite the cached hours even when all are cached
+    log_cache_force_refresh: bool = False
+    # aggregated output is saved here before the write, so a retry after a failed write doesn't aggregate again,
+    # None to disable. spools older than the retry window are not reused
+    output_spool_dir: Optional[str] = None
+    output_spool_max_age_in_minutes: int = 50
+    # rows per multi-row upsert into hourly_downloads, each chunk is committed separately
+    write_chunk_size: int = 5000
+    # "upsert" writes every row of the hour, "diff" reads the hour back first and only writes rows that changed,
+    # which makes reprocessing an unchanged hour a single read
+    write_mode: Literal["upsert", "diff"] = "upsert"
+    # "orm" writes through write_mode, "load_data" bulk loads a tsv file with LOAD DATA LOCAL INFILE into a staging
+    # table and swaps whole hours into hourly_downloads, falling back to "orm" if the load fails. for large backfills
+    write_sink: Literal["orm", "load_data"] = "orm"
+
+    # "batch" fans each (paper, hour, country, download type) row out over the paper's categories,
+    # "two_stage" first merges papers with identical listings and fans out once per listing
+    aggregation_mode: Literal["batch", "two_stage"] = "batch"
+    # "staged" parses all log rows, then looks up all categories, then aggregates
+    # "streaming" works through the rows in chunks, looking up categories for a chunk while the next one is parsed;
+    # it always aggregates in batch mode
+    aggregation_pipeline: Literal["staged", "streaming"] = "staged"
+    pipeline_chunk_size: int = 100000
+    # "rest" iterates the log query results row by row, "arrow" downloads them as arrow record batches
+    # through the bigquery storage read api and parses them column by column
+    log_ingestion: Literal["rest", "arrow"] = "rest"
 
     paper_id_regex: str = r"^/[^/]+/([a-zA-Z-]+/[0-9]{7}|[0-9]{4}\.[0-9]{4,5})"
     download_type_regex: str = r"^/(html|pdf|src|e-print)/"
@@ -63,6 +113,7 @@ class TestConfig(Config):
 class DevConfig(Config):
     pass
 
+
 class ProdConfig(Config):
     pass
 
@@ -0,0 +1,69 @@
+import threading
+from typing import Dict, Iterable, Mapping, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from stats_entities.site_usage import DownloadCategory, DownloadCountry, DownloadType
+
+
+class DimensionTable:
+    """in-memory copy of one of the download_* dimension tables of hourly_downloads, value -> id
+    kept across warm invocations of the function; values not seen before are added to the table when first encoded
+    the copy is dropped whenever it is used with a different engine
+    """
+
+    def __init__(self, entity, value_column: str):
+        self.entity = entity
+        self.value_column = value_column
+        self.lock = threading.Lock()
+        self.bind = None
+        self.ids: Dict[str, int] = {}
+
+    def _load(self, session: Session):
+        column = getattr(self.entity, self.value_column)
+        self.ids = {
+            value: id for value, id in session.execute(select(column, self.entity.id))
+        }
+
+    def encode(
+        self,
+        session: Session,
+        values: Iterable[str],
+        extra_columns: Optional[Mapping[str, dict]] = None,
+    ) -> Dict[str, int]:
+        """ids for all the values, extra_columns holds the other columns of values that may need adding"""
+        with self.lock:
+            if session.get_bind() is not self.bind:
+                self.bind = session.get_bind()
+                self._load(session)
+
+            missing = set(values) - self.ids.keys()
+            if missing:
+                # another writer may have added them since the table was loaded
+                self._load(session)
+                missing -= self.ids.keys()
+            if missing:
+                session.execute(
+                    insert(self.entity)
+                    .prefix_with("IGNORE", dialect="mysql")
+                    .prefix_with("OR IGNORE", dialect="sqlite"),
+                    [
+                        {
+                            self.value_column: value,
+                            **(extra_columns or {}).get(value, {}),
+                        }
+                        for value in sorted(missing)
+                    ],
+                )
+                session.commit()
+                self._load(session)
+
+            return self.ids
+
+
+class HourlyDownloadsDimensions:
+    def __init__(self):
+        self.categories = DimensionTable(DownloadCategory, "category")
+        self.countries = DimensionTable(DownloadCountry, "name")
+        self.download_types = DimensionTable(DownloadType, "name")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, DateTime, MetaData, String, Integer, Table
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import declarative_base
 
 ReadBase = declarative_base()
@@ -19,3 +20,37 @@ class Metadata(ReadBase):
     document_id = Column(Integer, nullable=False, index=True)
     paper_id = Column(String(64), nullable=False)
     is_current = Column(Integer)
+
+
+# session scoped table the paper ids of a run are loaded into, to join against instead of an IN list
+# kept out of ReadBase.metadata since it only ever exists as a temporary table
+# paper_id has the charset and collation of arXiv_metadata.paper_id (the table default), mysql can't use the
+# index on arXiv_metadata.paper_id for the join if they differ
+PaperIdLookup = Table(
+    "stats_paper_id_lookup",
+    MetaData(),
+    Column(
+        "paper_id",
+        String(64).with_variant(
+            mysql.VARCHAR(64, charset="utf8mb3", collation="utf8mb3_general_ci"),
+            "mysql",
+        ),
+        primary_key=True,
+    ),
+    prefixes=["TEMPORARY"],
+)
+
+
+# session scoped copy of site_usage.hourly_downloads that bulk loaded rows are staged in before being
+# swapped into hourly_downloads, only ever exists as a temporary table on the write database
+HourlyDownloadsStaging = Table(
+    "hourly_downloads_staging",
+    MetaData(),
+    Column("start_dttm", DateTime, primary_key=True),
+    Column("category_id", Integer, primary_key=True, autoincrement=False),
+    Column("country_id", Integer, primary_key=True, autoincrement=False),
+    Column("download_type_id", Integer, primary_key=True, autoincrement=False),
+    Column("primary_count", Integer),
+    Column("cross_count", Integer),
+    prefixes=["TEMPORARY"],
+)
@@ -0,0 +1,84 @@
+import re
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from arxiv.identifier import Identifier, IdentifierException
+from arxiv.taxonomy.definitions import CATEGORIES
+
+# the log query extracts ids without a version, so the common cases are plain new and old style ids
+NEW_STYLE_ID = re.compile(r"(\d\d)(0[1-9]|1[0-2])\.(\d{4,5})")
+OLD_STYLE_ID = re.compile(r"([a-z-]+)/(\d\d)(0[1-9]|1[0-2])(\d{3})")
+
+OLD_STYLE_ARCHIVES = frozenset(category.in_archive for category in CATEGORIES.values())
+
+
+class PaperIdNormalizer:
+    """memoised replacement for Identifier(raw).id
+    well formed ids are validated with a regex, anything unusual is left to Identifier, and the result for each raw
+    string is remembered so repeated ids are only looked at once; invalid ids raise IdentifierException every time
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.memo: Dict[str, Optional[str]] = {}
+        now = datetime.now(timezone.utc)
+        self.current_yymm = (now.year % 100) * 100 + now.month
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.fast_path = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _fast_path(self, raw_id: str) -> Optional[str]:
+        """the id if it is certainly valid, None to leave it to Identifier
+        only accepts ids Identifier accepts as they are, paper numbers start at 1 in both styles
+        """
+        match = NEW_STYLE_ID.fullmatch(raw_id)
+        if match:
+            yymm = int(match[1]) * 100 + int(match[2])
+            # 4 digit numbers from 0704 to 1412, 5 digits from 1501 on
+            digits = 5 if yymm >= 1501 else 4
+            if (
+                704 <= yymm <= self.current_yymm
+                and len(match[3]) == digits
+                and int(match[3]) > 0
+            ):
+                return raw_id
+            return None
+
+        match = OLD_STYLE_ID.fullmatch(raw_id)
+        if match and match[1] in OLD_STYLE_ARCHIVES and int(match[4]) > 0:
+            # old style ids ran from 9108 to 0703
+            yymm = int(match[2]) * 100 + int(match[3])
+            if yymm >= 9108 or yymm <= 703:
+                return raw_id
+        return None
+
+    def normalize(self, raw_id: str) -> str:
+        if raw_id in self.memo:
+            self.hits += 1
+            paper_id = self.memo[raw_id]
+        else:
+            self.misses += 1
+            paper_id = self._fast_path(raw_id)
+            if paper_id is not None:
+                self.fast_path += 1
+            else:
+                try:
+                    paper_id = Identifier(raw_id).id
+                except IdentifierException:
+                    paper_id = None
+
+            if len(self.memo) >= self.max_size:
+                self.memo.clear()
+            self.memo[raw_id] = paper_id
+
+        if paper_id is None:
+            raise IdentifierException(f"invalid arXiv identifier {raw_id}")
+        return paper_id
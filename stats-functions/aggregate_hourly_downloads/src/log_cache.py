@@ -0,0 +1,132 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+
+class HourlyLogCache:
+    """directory of log query results, one compressed parquet file per hour
+    lets an hour be aggregated again without going back to bigquery, the directory can be a mounted bucket
+    files are evicted least recently used first once the directory holds more than max_bytes
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, hour: datetime) -> str:
+        return os.path.join(self.directory, f"{hour.strftime('%Y-%m-%d-%H')}.parquet")
+
+    @staticmethod
+    def hours(start_hour: datetime, end_hour: datetime) -> List[datetime]:
+        hours = []
+        hour = start_hour
+        while hour <= end_hour:
+            hours.append(hour)
+            hour += timedelta(hours=1)
+        return hours
+
+    def get(
+        self, start_hour: datetime, end_hour: datetime
+    ) -> Optional[Iterator[pa.RecordBatch]]:
+        """the cached log rows of every hour in the range, or None unless all of them are cached"""
+        paths = [self.path(hour) for hour in self.hours(start_hour, end_hour)]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+
+        for path in paths:
+            os.utime(path)  # marks the file as recently used
+        return self._read(paths)
+
+    @staticmethod
+    def _read(paths: List[str]) -> Iterator[pa.RecordBatch]:
+        for path in paths:
+            yield from pq.ParquetFile(path).iter_batches()
+
+    def put(self, start_hour: datetime, end_hour: datetime, table: pa.Table):
+        """stores the log rows of each hour in the range, including hours without any rows"""
+        for _ in self.put_batches(
+            start_hour, end_hour, table.to_batches(), table.schema
+        ):
+            pass
+
+    def put_batches(
+        self,
+        start_hour: datetime,
+        end_hour: datetime,
+        record_batches: Iterable[pa.RecordBatch],
+        schema: Optional[pa.Schema] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """passes the record batches on while appending their rows to the file of each hour in the range
+        the files are written to temporary paths and only put in place once every batch has gone through,
+        so a stream that fails or is abandoned part way never leaves a partial hour behind
+        without a schema, nothing is stored if there are no batches
+        """
+        writers = {}
+
+        def open_writers(schema: pa.Schema):
+            hour_type = pc.floor_temporal(
+                pa.array([], type=schema.field("start_dttm").type), unit="hour"
+            ).type
+            for hour in self.hours(start_hour, end_hour):
+                key = pa.scalar(hour, type=hour_type).as_py()
+                writers[key] = (
+                    self.path(hour),
+                    pq.ParquetWriter(
+                        f"{self.path(hour)}.tmp", schema, compression="zstd"
+                    ),
+                )
+
+        try:
+            if schema is not None:
+                open_writers(schema)
+            for record_batch in record_batches:
+                if not writers:
+                    open_writers(record_batch.schema)
+                hour_col = pc.floor_temporal(
+                    record_batch.column("start_dttm"), unit="hour"
+                )
+                for hour_value in pc.unique(hour_col):
+                    if hour_value.as_py() in writers:
+                        _, writer = writers[hour_value.as_py()]
+                        writer.write_batch(
+                            record_batch.filter(pc.equal(hour_col, hour_value))
+                        )
+                yield record_batch
+        except BaseException:
+            for path, writer in writers.values():
+                writer.close()
+                os.remove(f"{path}.tmp")
+            raise
+
+        for path, writer in writers.values():
+            writer.close()
+            os.replace(f"{path}.tmp", path)
+        if writers:
+            logger.info(f"Cached log query results of {len(writers)} hours")
+        self.evict(keep={path for path, _ in writers.values()})
+
+    def evict(self, keep: set = frozenset()):
+        files = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".parquet"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, path in sorted(files):
+            if size <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            logger.info(f"Evicting cached log query results {path}")
+            os.remove(path)
+            size -= file_size
@@ -1,28 +1,73 @@
 import os
+import time
+import hashlib
+import re
+import tempfile
 import logging
-from typing import Set, Dict, List, Tuple, Any, Union
-from datetime import datetime, timedelta, timezone
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Set, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+from datetime import date, datetime, timedelta, timezone
 
 import functions_framework
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from cloudevents.http import CloudEvent
 
-from google.cloud import bigquery
+from google.api_core.exceptions import Conflict
+from google.cloud import bigquery, bigquery_storage
 from google.cloud.bigquery.table import RowIterator, _EmptyRowIterator
 
-from sqlalchemy import Row
-from sqlalchemy.orm import sessionmaker, aliased
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Row,
+    Select,
+    delete,
+    event,
+    func,
+    insert,
+    literal,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker, aliased
 
 from config import get_config
-from entities import DocumentCategory, Metadata
+from entities import DocumentCategory, Metadata, PaperIdLookup, HourlyDownloadsStaging
+from snapshot import CategorySnapshot
+from log_cache import HourlyLogCache
+from spool import OutputSpool
+from cache import PaperCategoriesCache
+from identifiers import PaperIdNormalizer
+from dimensions import HourlyDownloadsDimensions
 from models import (
     PaperCategories,
+    DownloadBatch,
     DownloadData,
     DownloadCounts,
     DownloadKey,
+    AggregatedDownloads,
     AggregationResult,
+    Dimension,
+    CANONICAL_CATEGORY_LIST,
+    COUNTRY_SHIFT,
+    DOWNLOAD_TYPE_SHIFT,
+    HOUR_SHIFT,
 )
 
-from stats_entities.site_usage import HourlyDownloads
+from stats_entities.site_usage import (
+    DailyDownloads,
+    HourlyDownloads,
+    MonthToDateDownloads,
+)
 
 from arxiv_functions.exception import NoRetryError
 from arxiv_functions.utils import (
@@ -32,8 +77,7 @@ from arxiv_functions.utils import (
     parse_cloud_event_time,
 )
 
-from arxiv.identifier import Identifier, IdentifierException
-
+from arxiv.identifier import IdentifierException
 
 config = get_config(os.getenv("ENV"))
 
@@ -46,65 +90,190 @@ ReadSessionFactory = None
 write_engine = None
 WriteSessionFactory = None
 
+category_snapshot = None
+paper_id_normalizer = PaperIdNormalizer(config.paper_id_memo_size)
+hourly_downloads_dimensions = HourlyDownloadsDimensions()
+category_cache = PaperCategoriesCache(
+    config.category_cache_max_entries,
+    config.category_cache_max_bytes,
+    config.category_cache_ttl_in_minutes * 60,
+)
+
 
 def process_table_rows(
-    rows: Union[RowIterator, _EmptyRowIterator],
-) -> Tuple[
-    Any, Set[str], Set[datetime], int, int
-]:  # Changed return types to accommodate generator
+    rows: Union[RowIterator, _EmptyRowIterator, Iterable[Row]],
+    batch: Optional[DownloadBatch] = None,
+) -> Tuple[DownloadBatch, Set[str], Set[datetime], Dict[str, int]]:
     """
-    processes rows of data from bigquery
-    returns a generator pointing to download data, a set of all unique paper_ids, and a set of the time periods this covers
+    processes rows of data from bigquery into a columnar batch
+    returns the batch of download data, a set of all unique paper_ids, a set of the time periods this covers, and counts of unprocessable rows
     """
-    paper_ids = set()  # only look things up for each paper once
-    time_periods = set()  # Changed to set for O(1) lookups
+    batch = DownloadBatch() if batch is None else batch
     counts = {"bad_id": 0, "problem": 0}
 
-    # Use a generator to avoid "double memory" hit of list + iterator
-    def download_data_generator():
-        for row in rows:
-            try:
-                d_type = (
-                    "src" if row["download_type"] == "e-print" else row["download_type"]
-                )  # combine e-print and src downloads
-                paper_id = Identifier(row["paper_id"]).id
-                dt = row["start_dttm"].replace(
-                    minute=0, second=0, microsecond=0
-                )  # bucketing by hour
-
-                paper_ids.add(paper_id)
-                time_periods.add(dt)
-
-                yield DownloadData(
-                    paper_id=paper_id,
-                    country=row["geo_country"],
-                    download_type=d_type,
-                    time=dt,
-                    num=row["num_downloads"],
-                )
-            except IdentifierException:
-                counts["bad_id"] += 1
-                continue
-            except Exception:
-                counts["problem"] += 1
-                continue
+    for row in rows:
+        try:
+            if row["geo_country"] is None or row["download_type"] is None:
+                # rows with missing values can't be processed, as in _append_record_batch
+                raise ValueError("row without a country or download type")
+            d_type = (
+                "src" if row["download_type"] == "e-print" else row["download_type"]
+            )  # combine e-print and src downloads
+            paper_id = paper_id_normalizer.normalize(row["paper_id"])
+            dt = row["start_dttm"].replace(
+                minute=0, second=0, microsecond=0
+            )  # bucketing by hour
+
+            batch.append(
+                paper_id=paper_id,
+                country=row["geo_country"],
+                download_type=d_type,
+                time=dt,
+                num=row["num_downloads"],
+            )
+        except IdentifierException:
+            counts["bad_id"] += 1
+            continue
+        except Exception:
+            counts["problem"] += 1
+            continue
 
-    return download_data_generator(), paper_ids, time_periods, counts
+    # only look things up for each paper once
+    return batch, set(batch.paper_ids.values), set(batch.hours.values), counts
+
+
+def process_record_batches(
+    record_batches: Iterable[pa.RecordBatch],
+    batch: Optional[DownloadBatch] = None,
+) -> Tuple[DownloadBatch, Set[str], Set[datetime], Dict[str, int]]:
+    """
+    columnar equivalent of process_table_rows for log query results downloaded as arrow record batches
+    identifiers, countries, download types and hours are parsed once per distinct value rather than once per row
+    """
+    batch = DownloadBatch() if batch is None else batch
+    counts = {"bad_id": 0, "problem": 0}
+
+    for record_batch in record_batches:
+        _append_record_batch(batch, record_batch, counts)
+
+    return batch, set(batch.paper_ids.values), set(batch.hours.values), counts
+
+
+def _encode_values(
+    column: pa.Array, dimension: Dimension, parse=lambda value: value
+) -> np.ndarray:
+    """dimension ids of each row of the column, parsing each distinct value once"""
+    encoded = pc.dictionary_encode(column)
+    ids = np.array(
+        [dimension.encode(parse(value)) for value in encoded.dictionary.to_pylist()],
+        dtype=np.int64,
+    )
+    return ids[encoded.indices.to_numpy(zero_copy_only=False)]
+
+
+def _extend_column(col: array, values: np.ndarray):
+    col.frombytes(values.astype(col.typecode).tobytes())
+
+
+def _append_record_batch(
+    batch: DownloadBatch, record_batch: pa.RecordBatch, counts: Dict[str, int]
+):
+    # rows with missing values can't be processed
+    valid = pc.is_valid(record_batch.column("paper_id"))
+    for name in ["geo_country", "download_type", "start_dttm", "num_downloads"]:
+        valid = pc.and_(valid, pc.is_valid(record_batch.column(name)))
+    counts["problem"] += record_batch.num_rows - (pc.sum(valid).as_py() or 0)
+    record_batch = record_batch.filter(valid)
+
+    # drop rows with invalid ids before anything is encoded, as process_table_rows does
+    paper_values = pc.dictionary_encode(record_batch.column("paper_id"))
+    paper_ids = []
+    for raw_id in paper_values.dictionary.to_pylist():
+        try:
+            paper_ids.append(paper_id_normalizer.normalize(raw_id))
+        except IdentifierException:
+            paper_ids.append(None)
+    paper_index = paper_values.indices.to_numpy(zero_copy_only=False)
+    valid_id = np.array([paper_id is not None for paper_id in paper_ids], dtype=bool)
+    good_row = valid_id[paper_index]
+    counts["bad_id"] += int(len(good_row) - np.count_nonzero(good_row))
+    record_batch = record_batch.filter(pa.array(good_row))
+    paper_index = paper_index[good_row]
+
+    paper_dim_ids = np.array(
+        [
+            batch.paper_ids.encode(paper_id) if paper_id is not None else -1
+            for paper_id in paper_ids
+        ],
+        dtype=np.int64,
+    )
+    country = _encode_values(record_batch.column("geo_country"), batch.countries)
+    download_type = _encode_values(
+        record_batch.column("download_type"),
+        batch.download_types,
+        lambda d_type: "src" if d_type == "e-print" else d_type,
+    )  # combine e-print and src downloads
+    hour = _encode_values(
+        record_batch.column("start_dttm"),
+        batch.hours,
+        lambda dt: dt.replace(minute=0, second=0, microsecond=0),
+    )  # bucketing by hour
+    num = record_batch.column("num_downloads").to_numpy(zero_copy_only=False)
+
+    _extend_column(batch.num_col, num)
+    _extend_column(batch.paper_col, paper_dim_ids[paper_index])
+    _extend_column(batch.country_col, country)
+    _extend_column(batch.download_type_col, download_type)
+    _extend_column(batch.hour_col, hour)
 
 
 def get_paper_categories(paper_ids: Set[str]) -> List[Row[Tuple[str, str, int]]]:
+    id_list = list(paper_ids)
+    batches = [
+        id_list[i : i + config.batch_size_for_category_query]
+        for i in range(0, len(id_list), config.batch_size_for_category_query)
+    ]
+
+    start = time.perf_counter()
+    if config.category_lookup_strategy == "temp_table":
+        logger.info(
+            f"Executing read database query for {len(id_list)} papers using a temporary table"
+        )
+        with ReadSessionFactory() as session:
+            all_paper_cats = _get_paper_categories_temp_table(session, batches)
+    else:
+        workers = min(config.category_query_workers, len(batches))
+        logger.info(
+            f"Executing read database query for {len(id_list)} papers in {len(batches)} batches of {config.batch_size_for_category_query} over {max(workers, 1)} sessions"
+        )
+        if workers > 1:
+            # each worker takes every nth batch on its own session, so queries run concurrently on the replica
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(
+                    _get_paper_categories_in_list,
+                    [batches[i::workers] for i in range(workers)],
+                )
+                all_paper_cats = [row for result in results for row in result]
+        else:
+            all_paper_cats = _get_paper_categories_in_list(batches)
+
+    logger.info(
+        f"Read database queries successfully executed in {time.perf_counter() - start:.2f}s; session closed"
+    )
+
+    return all_paper_cats
+
+
+def _get_paper_categories_in_list(
+    batches: List[List[str]],
+) -> List[Row[Tuple[str, str, int]]]:
     meta = aliased(Metadata)
     dc = aliased(DocumentCategory)
 
-    id_list = list(paper_ids)
     all_paper_cats = []
-
     with ReadSessionFactory() as session:
-        logger.info(
-            f"Executing read database query for {len(id_list)} papers in batches of {config.batch_size_for_category_query}"
-        )
-        for i in range(0, len(id_list), config.batch_size_for_category_query):
-            batch = id_list[i : i + config.batch_size_for_category_query]
+        for batch in batches:
+            start = time.perf_counter()
             results = (
                 session.query(meta.paper_id, dc.category, dc.is_primary)
                 .join(meta, dc.document_id == meta.document_id)
@@ -113,12 +282,109 @@ def get_paper_categories(paper_ids: Set[str]) -> List[Row[Tuple[str, str, int]]]
                 .all()
             )
             all_paper_cats.extend(results)
-
-    logger.info("Read database queries successfully executed; session closed")
+            logger.info(
+                f"Category query for {len(batch)} papers returned {len(results)} rows in {time.perf_counter() - start:.2f}s"
+            )
 
     return all_paper_cats
 
 
+def _get_paper_categories_temp_table(
+    session: Session, batches: List[List[str]]
+) -> List[Row[Tuple[str, str, int]]]:
+    """loads the paper ids into a temporary table and finds their categories with a single join"""
+    meta = aliased(Metadata)
+    dc = aliased(DocumentCategory)
+
+    # temporary tables live as long as the pooled connection, so clear out any left by a failed run
+    connection = session.connection()
+    PaperIdLookup.create(connection, checkfirst=True)
+    try:
+        session.execute(delete(PaperIdLookup))
+        for batch in batches:
+            session.execute(
+                insert(PaperIdLookup), [{"paper_id": paper_id} for paper_id in batch]
+            )
+
+        return (
+            session.query(meta.paper_id, dc.category, dc.is_primary)
+            .select_from(PaperIdLookup)
+            .join(meta, meta.paper_id == PaperIdLookup.c.paper_id)
+            .join(dc, dc.document_id == meta.document_id)
+            .filter(meta.is_current == 1)
+            .all()
+        )
+    finally:
+        PaperIdLookup.drop(connection, checkfirst=False)
+
+
+def get_category_snapshot() -> Optional[CategorySnapshot]:
+    """opens the local category snapshot once per container, if configured"""
+    global category_snapshot
+
+    if category_snapshot is None and config.category_snapshot_path:
+        category_snapshot = CategorySnapshot(
+            config.category_snapshot_path, config.category_snapshot_max_age_in_hours
+        )
+
+    return category_snapshot
+
+
+def refresh_category_snapshot(snapshot: CategorySnapshot):
+    """brings the snapshot up to date with papers whose metadata changed since its high water mark"""
+    snapshot.expire_if_stale()
+    high_water_mark = snapshot.high_water_mark
+
+    meta = aliased(Metadata)
+    dc = aliased(DocumentCategory)
+
+    with ReadSessionFactory() as session:
+        max_metadata_id = session.query(func.max(meta.metadata_id)).scalar() or 0
+
+        if high_water_mark is None:
+            # empty snapshot, papers are added as they are looked up from here on
+            snapshot.set_high_water_mark(max_metadata_id)
+            return
+
+        if max_metadata_id <= high_water_mark:
+            return
+
+        results = (
+            session.query(meta.paper_id, dc.category, dc.is_primary)
+            .join(meta, dc.document_id == meta.document_id)
+            .filter(meta.metadata_id > high_water_mark)
+            .filter(meta.metadata_id <= max_metadata_id)
+            .filter(meta.is_current == 1)
+            .all()
+        )
+
+    snapshot.put(results, high_water_mark=max_metadata_id)
+    category_cache.discard({row[0] for row in results})
+    logger.info(
+        f"Refreshed category snapshot with {len(results)} rows for metadata ids {high_water_mark + 1}-{max_metadata_id}"
+    )
+
+
+def lookup_paper_categories(paper_ids: Set[str]) -> List[Tuple[str, str, int]]:
+    """reads categories from the local snapshot where possible, and from the read database otherwise"""
+    snapshot = get_category_snapshot()
+    if snapshot is None:
+        return get_paper_categories(paper_ids)
+
+    refresh_category_snapshot(snapshot)
+    rows, missing_ids = snapshot.get(paper_ids)
+    logger.info(
+        f"Found categories for {len(paper_ids) - len(missing_ids)} of {len(paper_ids)} papers in snapshot"
+    )
+
+    if missing_ids:
+        results = get_paper_categories(missing_ids)
+        snapshot.put(results)
+        rows.extend(results)
+
+    return rows
+
+
 def process_paper_categories(
     data: List[Row[Tuple[str, str, int]]],
 ) -> Dict[str, PaperCategories]:
@@ -135,125 +401,1079 @@ def process_paper_categories(
     return paper_categories
 
 
+def build_category_incidence(
+    paper_ids: List[str],
+    paper_categories: Dict[str, PaperCategories],
+    categories: Dimension[Tuple[str, str]],
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """builds a sparse (CSR) paper x category incidence for the papers of a batch
+    the categories of paper p are category_ids[indptr[p]:indptr[p + 1]], with is_primary marking whether each
+    listing is weighted as a primary or a cross-list; papers without category data have no entries
+    """
+    indptr = np.zeros(len(paper_ids) + 1, dtype=np.int64)
+    category_ids: List[int] = []
+    is_primary: List[bool] = []
+
+    # dimension id of each canonical category index, encoded the first time the category is seen
+    dimension_ids = [-1] * len(CANONICAL_CATEGORY_LIST)
+
+    def dimension_id(index: int) -> int:
+        if dimension_ids[index] < 0:
+            category = CANONICAL_CATEGORY_LIST[index]
+            dimension_ids[index] = categories.encode((category.in_archive, category.id))
+        return dimension_ids[index]
+
+    for i, paper_id in enumerate(paper_ids):
+        cats = paper_categories.get(paper_id)
+        if cats:
+            membership = cats.membership
+            if membership.primary >= 0:
+                category_ids.append(dimension_id(membership.primary))
+                is_primary.append(True)
+            for index in membership.cross_indexes():
+                category_ids.append(dimension_id(index))
+                is_primary.append(False)
+        indptr[i + 1] = len(category_ids)
+
+    return (
+        indptr,
+        np.array(category_ids, dtype=np.int64),
+        np.array(is_primary, dtype=bool),
+    )
+
+
+def _column(col: array) -> np.ndarray:
+    """zero-copy view of a DownloadBatch column, widened for key arithmetic"""
+    return np.frombuffer(col, dtype=col.typecode).astype(np.int64)
+
+
+def _fan_out_and_sum(
+    result: AggregatedDownloads,
+    group: np.ndarray,
+    cell: np.ndarray,
+    num: np.ndarray,
+    indptr: np.ndarray,
+    category_ids: np.ndarray,
+    is_primary: np.ndarray,
+):
+    """reduces rows per (group, cell), fans the reduced rows out over each group's categories
+    and adds the primary and cross counts per packed key to the result
+    groups index the incidence given by indptr/category_ids/is_primary and must all have at least one category
+    """
+    # reduce rows per (group, cell)
+    cell_values, cell_index = np.unique(cell, return_inverse=True)
+    pairs, pair_index = np.unique(
+        group * len(cell_values) + cell_index, return_inverse=True
+    )
+    pair_num = np.bincount(pair_index, weights=num).astype(np.int64)
+    pair_group = pairs // max(len(cell_values), 1)
+    pair_cell = cell_values[pairs % max(len(cell_values), 1)]
+
+    # fan out each reduced row over its group's categories
+    degree = np.diff(indptr)[pair_group]
+    fan_out = np.repeat(np.arange(len(pairs)), degree)
+    edge = np.repeat(indptr[pair_group], degree) + (
+        np.arange(len(fan_out)) - np.repeat(np.cumsum(degree) - degree, degree)
+    )
+    edge_key = pair_cell[fan_out] | category_ids[edge]
+    edge_num = pair_num[fan_out]
+    edge_primary = is_primary[edge]
+
+    # sum primary and cross counts per packed key
+    keys, key_index = np.unique(edge_key, return_inverse=True)
+    primary_counts = np.bincount(
+        key_index, weights=np.where(edge_primary, edge_num, 0), minlength=len(keys)
+    ).astype(np.int64)
+    cross_counts = np.bincount(
+        key_index, weights=np.where(edge_primary, 0, edge_num), minlength=len(keys)
+    ).astype(np.int64)
+
+    for key, primary, cross in zip(
+        keys.tolist(), primary_counts.tolist(), cross_counts.tolist()
+    ):
+        counts = result.counts.get(key)
+        if counts is None:
+            counts = result.counts[key] = DownloadCounts()
+        counts.primary += primary
+        counts.cross += cross
+
+
+def _batch_columns(
+    download_data: DownloadBatch,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """returns the paper ids, packed keys without a category, and download counts of each row"""
+    cell = (
+        (_column(download_data.hour_col) << HOUR_SHIFT)
+        | (_column(download_data.country_col) << COUNTRY_SHIFT)
+        | (_column(download_data.download_type_col) << DOWNLOAD_TYPE_SHIFT)
+    )
+    return _column(download_data.paper_col), cell, _column(download_data.num_col)
+
+
+def _log_missing_data(download_data: DownloadBatch, missing_data_count: int):
+    if missing_data_count > 10:
+        hour = download_data.hours.decode(0) if len(download_data.hours) else "Unknown"
+        logger.warning(
+            f"{hour}: Could not find category data for {missing_data_count} paper_ids (may be invalid)"
+        )
+
+
 def aggregate_data(
-    download_data: List[DownloadData],
+    download_data: Union[DownloadBatch, Iterable[DownloadData]],
     paper_categories: Dict[str, PaperCategories],
-) -> Dict[DownloadKey, DownloadCounts]:
-    """creates a dictionary of download counts by time, country, download type, and category
-    goes through each download entry, matches it with its caegories and adds the number of downloads to the count
+) -> AggregatedDownloads:
+    """creates a mapping of download counts by time, country, download type, and category
+    rows are first reduced per (paper, hour, country, download type), then fanned out over each paper's categories
+    through a sparse paper x category incidence and summed per packed key with numpy, instead of looping over rows in python
     """
     logger.info("Aggregating download data")
-    all_data: Dict[DownloadKey, DownloadCounts] = {}
-    missing_data_count = 0
-
-    for entry in download_data:
-        cats = paper_categories.get(entry.paper_id)
-        if not cats:
-            missing_data_count += 1
-            continue  # dont process this paper
-
-        # record primary
-        key = DownloadKey(
-            entry.time,
-            entry.country,
-            entry.download_type,
-            cats.primary.in_archive,
-            cats.primary.id,
+    if not isinstance(download_data, DownloadBatch):
+        download_data = DownloadBatch.from_download_data(download_data)
+
+    result = AggregatedDownloads(
+        download_data.hours, download_data.countries, download_data.download_types
+    )
+    indptr, category_ids, is_primary = build_category_incidence(
+        download_data.paper_ids.values, paper_categories, result.categories
+    )
+    missing_data_count = _aggregate_batch(
+        result, download_data, indptr, category_ids, is_primary
+    )
+    _log_missing_data(download_data, missing_data_count)
+
+    return result
+
+
+def _aggregate_batch(
+    result: AggregatedDownloads,
+    download_data: DownloadBatch,
+    indptr: np.ndarray,
+    category_ids: np.ndarray,
+    is_primary: np.ndarray,
+) -> int:
+    """adds the rows of a batch to a result sharing its dimensions, returns the number of rows without category data"""
+    paper, cell, num = _batch_columns(download_data)
+
+    # dont process papers without category data
+    found = np.diff(indptr)[paper] > 0
+
+    _fan_out_and_sum(
+        result,
+        paper[found],
+        cell[found],
+        num[found],
+        indptr,
+        category_ids,
+        is_primary,
+    )
+
+    return int(len(paper) - np.count_nonzero(found))
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _record_batch_chunks(
+    record_batches: Iterable[pa.RecordBatch], size: int
+) -> Iterator[List[pa.RecordBatch]]:
+    chunk, chunk_rows = [], 0
+    for record_batch in record_batches:
+        chunk.append(record_batch)
+        chunk_rows += record_batch.num_rows
+        if chunk_rows >= size:
+            yield chunk
+            chunk, chunk_rows = [], 0
+    if chunk:
+        yield chunk
+
+
+def aggregate_streaming(
+    rows: Union[RowIterator, _EmptyRowIterator, Iterable[pa.RecordBatch]],
+) -> Tuple[AggregatedDownloads, DownloadBatch, Dict[str, int]]:
+    """parses, looks up and aggregates the log rows chunk by chunk instead of one stage at a time
+    the categories of papers first seen in a chunk are resolved on a background thread while the next chunk is
+    fetched and parsed, and each chunk is aggregated as soon as its categories are known and then released,
+    so only two chunks of rows are held at once
+    returns the aggregated downloads, an empty batch holding the dimensions of all rows, and the counts of the run
+    """
+    dimensions = DownloadBatch()
+    result = AggregatedDownloads(
+        dimensions.hours, dimensions.countries, dimensions.download_types
+    )
+    indptr = np.zeros(1, dtype=np.int64)
+    category_ids = np.zeros(0, dtype=np.int64)
+    is_primary = np.zeros(0, dtype=bool)
+    counts = {
+        "fetched": 0,
+        "bad_id": 0,
+        "problem": 0,
+        "missing": 0,
+        "found_papers": 0,
+        "cache_hit": 0,
+        "cache_miss": 0,
+    }
+
+    def aggregate_chunk(chunk: DownloadBatch, lookup: Future):
+        nonlocal indptr, category_ids, is_primary
+        new_paper_ids, (paper_categories, cache_hits, cache_misses) = lookup.result()
+        counts["found_papers"] += len(paper_categories)
+        counts["cache_hit"] += cache_hits
+        counts["cache_miss"] += cache_misses
+
+        # papers are looked up in the order they were encoded, so the incidence grows in paper id order
+        new_indptr, new_category_ids, new_is_primary = build_category_incidence(
+            new_paper_ids, paper_categories, result.categories
         )
-        counts = all_data.setdefault(key, DownloadCounts())
-        counts.primary += entry.num
-
-        # record for each cross
-        for cat in cats.crosses:
-            key = DownloadKey(
-                entry.time,
-                entry.country,
-                entry.download_type,
-                cat.in_archive,
-                cat.id,
+        indptr = np.concatenate((indptr, new_indptr[1:] + len(category_ids)))
+        category_ids = np.concatenate((category_ids, new_category_ids))
+        is_primary = np.concatenate((is_primary, new_is_primary))
+
+        counts["missing"] += _aggregate_batch(
+            result, chunk, indptr, category_ids, is_primary
+        )
+
+    def lookup_categories(paper_ids: List[str]):
+        return paper_ids, resolve_paper_categories(paper_ids)
+
+    if config.log_ingestion == "arrow":
+        parse_rows, chunks = process_record_batches, _record_batch_chunks
+    else:
+        parse_rows, chunks = process_table_rows, _chunks
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pending = None
+        for rows_chunk in chunks(rows, config.pipeline_chunk_size):
+            known_paper_count = len(dimensions.paper_ids)
+            chunk, _, _, chunk_counts = parse_rows(
+                rows_chunk, dimensions.sharing_dimensions()
             )
-            counts = all_data.setdefault(key, DownloadCounts())
-            counts.cross += entry.num
+            counts["fetched"] += len(chunk)
+            counts["bad_id"] += chunk_counts["bad_id"]
+            counts["problem"] += chunk_counts["problem"]
 
-    if missing_data_count > 10:
-        time = download_data[0].time if download_data else "Unknown"
-        logger.warning(
-            f"{time}: Could not find category data for {missing_data_count} paper_ids (may be invalid)"
+            lookup = executor.submit(
+                lookup_categories, dimensions.paper_ids.values[known_paper_count:]
+            )
+            if pending is not None:
+                aggregate_chunk(*pending)
+            pending = (chunk, lookup)
+
+        if pending is not None:
+            aggregate_chunk(*pending)
+
+    _log_missing_data(dimensions, counts["missing"])
+    return result, dimensions, counts
+
+
+def aggregate_data_two_stage(
+    download_data: Union[DownloadBatch, Iterable[DownloadData]],
+    paper_categories: Dict[str, PaperCategories],
+) -> AggregatedDownloads:
+    """two-stage alternative to aggregate_data with identical output
+    stage one reduces rows to per-paper vectors of (hour, country, download type) counts, merging papers that share
+    an identical set of listings; stage two fans each vector out over its categories once,
+    so fan-out work scales with distinct listings rather than with rows
+    """
+    logger.info("Aggregating download data in two stages")
+    if not isinstance(download_data, DownloadBatch):
+        download_data = DownloadBatch.from_download_data(download_data)
+
+    result = AggregatedDownloads(
+        download_data.hours, download_data.countries, download_data.download_types
+    )
+    indptr, category_ids, is_primary = build_category_incidence(
+        download_data.paper_ids.values, paper_categories, result.categories
+    )
+    paper, cell, num = _batch_columns(download_data)
+
+    # group papers by their listings, -1 for papers without category data
+    listings: Dict[Tuple[Tuple[int, bool], ...], int] = {}
+    listing_indptr = [0]
+    listing_category_ids: List[int] = []
+    listing_is_primary: List[bool] = []
+    paper_listing = np.full(len(indptr) - 1, -1, dtype=np.int64)
+
+    for i, (start, end) in enumerate(zip(indptr[:-1].tolist(), indptr[1:].tolist())):
+        if start == end:
+            continue
+        signature = tuple(
+            sorted(
+                zip(category_ids[start:end].tolist(), is_primary[start:end].tolist())
+            )
+        )
+        listing = listings.get(signature)
+        if listing is None:
+            listing = listings[signature] = len(listings)
+            listing_category_ids.extend(cat for cat, _ in signature)
+            listing_is_primary.extend(primary for _, primary in signature)
+            listing_indptr.append(len(listing_category_ids))
+        paper_listing[i] = listing
+
+    # dont process papers without category data
+    group = paper_listing[paper]
+    found = group >= 0
+    _log_missing_data(download_data, int(len(paper) - np.count_nonzero(found)))
+
+    _fan_out_and_sum(
+        result,
+        group[found],
+        cell[found],
+        num[found],
+        np.array(listing_indptr, dtype=np.int64),
+        np.array(listing_category_ids, dtype=np.int64),
+        np.array(listing_is_primary, dtype=bool),
+    )
+
+    return result
+
+
+def rows_by_hour(
+    aggregated_data: Mapping[DownloadKey, DownloadCounts],
+    time_periods: Set[datetime],
+) -> Dict[datetime, List[dict]]:
+    """output rows for each hour, hours without downloads have no rows but are still replaced
+    packed keys are decoded here, once per output row
+    """
+    # Optimized: Use raw dicts for bulk_insert_mappings (much faster than bulk_save_objects)
+    data_by_hour: Dict[datetime, List[dict]] = {hour: [] for hour in time_periods}
+    for key, counts in aggregated_data.items():
+        data_by_hour.setdefault(key.time, []).append(
+            {
+                "country": key.country,
+                "download_type": key.download_type,
+                "archive": key.archive,
+                "category": key.category,
+                "primary_count": counts.primary,
+                "cross_count": counts.cross,
+                "start_dttm": key.time,
+            }
+        )
+    return data_by_hour
+
+
+def _upsert_statement(session: Session, rows: List[dict]):
+    """multi-row insert that overwrites the counts of keys already in hourly_downloads"""
+    table = HourlyDownloads.__table__
+    if session.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(table).values(rows)
+        return statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={
+                name: statement.excluded[name]
+                for name in ["primary_count", "cross_count"]
+            },
+        )
+
+    statement = mysql_insert(table).values(rows)
+    return statement.on_duplicate_key_update(
+        primary_count=statement.inserted.primary_count,
+        cross_count=statement.inserted.cross_count,
+    )
+
+
+DAILY_COLUMNS = [
+    "day",
+    "category_id",
+    "country_id",
+    "download_type_id",
+    "primary_count",
+    "cross_count",
+]
+
+
+def _naive_utc(hour: datetime) -> datetime:
+    if hour.tzinfo is not None:
+        hour = hour.astimezone(timezone.utc).replace(tzinfo=None)
+    return hour
+
+
+def _utc_day(hour: datetime) -> date:
+    return _naive_utc(hour).date()
+
+
+def _add_to_daily_statement(session: Session, rows: Union[List[dict], Select]):
+    """insert of rows or the result of a select into daily_downloads that adds their counts to those of keys
+    already in the day, negative counts subtract
+    """
+    table = DailyDownloads.__table__
+    if session.get_bind().dialect.name == "sqlite":
+        statement = sqlite_insert(table)
+    else:
+        statement = mysql_insert(table)
+    if isinstance(rows, Select):
+        statement = statement.from_select(DAILY_COLUMNS, rows)
+    else:
+        statement = statement.values(rows)
+
+    if session.get_bind().dialect.name == "sqlite":
+        return statement.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key],
+            set_={
+                name: table.c[name] + statement.excluded[name]
+                for name in ["primary_count", "cross_count"]
+            },
+        )
+    return statement.on_duplicate_key_update(
+        primary_count=table.c.primary_count + statement.inserted.primary_count,
+        cross_count=table.c.cross_count + statement.inserted.cross_count,
+    )
+
+
+def _remove_empty_daily_rows(session: Session, day: date):
+    # keys whose downloads were all subtracted, a rebuild wouldn't have them
+    session.execute(
+        delete(DailyDownloads).where(
+            DailyDownloads.day == day,
+            DailyDownloads.primary_count == 0,
+            DailyDownloads.cross_count == 0,
+        )
+    )
+
+
+def _greatest(session: Session, *values):
+    if session.get_bind().dialect.name == "sqlite":
+        return func.max(*values)
+    return func.greatest(*values)
+
+
+def _add_to_month_to_date_statement(session: Session, hour: datetime, downloads: int):
+    """update adding downloads to the running total of the hour's month in month_to_date_downloads and moving
+    its latest hour forward to the hour
+    """
+    hour = _naive_utc(hour)
+    return (
+        update(MonthToDateDownloads)
+        .where(MonthToDateDownloads.month == hour.date().replace(day=1))
+        .values(
+            downloads=MonthToDateDownloads.downloads + downloads,
+            latest_hour=_greatest(session, MonthToDateDownloads.latest_hour, hour),
+        )
+    )
+
+
+def _seed_month_to_date_statement(session: Session, hour: datetime):
+    """insert of the running total of the hour's month summed from its days in daily_downloads, with the latest
+    of its hours in hourly_downloads, nothing if the month has no downloads
+    """
+    hour = _naive_utc(hour)
+    month_start = hour.replace(day=1, hour=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1)
+    latest_hour = (
+        select(func.max(HourlyDownloads.start_dttm))
+        .where(
+            HourlyDownloads.start_dttm >= month_start,
+            HourlyDownloads.start_dttm < month_end,
+        )
+        .scalar_subquery()
+    )
+    return insert(MonthToDateDownloads).from_select(
+        ["month", "downloads", "latest_hour"],
+        select(
+            literal(month_start.date(), Date),
+            func.sum(DailyDownloads.primary_count),
+            _greatest(
+                session,
+                func.coalesce(latest_hour, literal(hour, DateTime)),
+                literal(hour, DateTime),
+            ),
+        )
+        .where(
+            DailyDownloads.day >= month_start.date(),
+            DailyDownloads.day < month_end.date(),
         )
+        .having(func.count() > 0),
+    )
 
-    return all_data
+
+def _add_to_month_to_date(session: Session, hour: datetime, downloads: int):
+    """adds downloads to the running total of the hour's month, to be called once the hour's changes are in
+    hourly_downloads and daily_downloads
+    a month without a running total yet, the first hour of a new month or a backfill of an older one, is seeded
+    with the whole month from daily_downloads rather than just the hour's downloads, but only when the hour
+    changes them
+    """
+    if session.execute(
+        _add_to_month_to_date_statement(session, hour, downloads)
+    ).rowcount:
+        return
+    if downloads:
+        session.execute(_seed_month_to_date_statement(session, hour))
+
+
+def _add_to_rollups(session: Session, hour: datetime, deltas: List[dict]):
+    """adds the changes to the counts of an hour to daily_downloads and month_to_date_downloads"""
+    if deltas:
+        session.execute(_add_to_daily_statement(session, deltas))
+        _remove_empty_daily_rows(session, _utc_day(hour))
+    _add_to_month_to_date(
+        session, hour, sum(delta["primary_count"] for delta in deltas)
+    )
+
+
+def _daily_deltas(
+    day: date,
+    rows: List[dict],
+    existing_rows: Dict[Tuple[int, int, int], Tuple[int, int]],
+) -> List[dict]:
+    """changes to the day's counts from replacing the existing counts of the rows' keys with those of the rows"""
+    deltas = []
+    for row in rows:
+        primary, cross = existing_rows.get(_row_key(row), (0, 0))
+        if (row["primary_count"], row["cross_count"]) != (primary, cross):
+            deltas.append(
+                {
+                    "day": day,
+                    "category_id": row["category_id"],
+                    "country_id": row["country_id"],
+                    "download_type_id": row["download_type_id"],
+                    "primary_count": row["primary_count"] - primary,
+                    "cross_count": row["cross_count"] - cross,
+                }
+            )
+    return deltas
+
+
+def _row_key(row: dict) -> Tuple[int, int, int]:
+    # the primary key is (start_dttm, category_id, country_id, download_type_id) and start_dttm is the same for the hour
+    return row["category_id"], row["country_id"], row["download_type_id"]
+
+
+def _hour_rows(
+    session: Session, hour: datetime
+) -> Dict[Tuple[int, int, int], Tuple[int, int]]:
+    """rows of the hour already in hourly_downloads, primary key -> (primary count, cross count)"""
+    rows = session.execute(
+        select(
+            HourlyDownloads.category_id,
+            HourlyDownloads.country_id,
+            HourlyDownloads.download_type_id,
+            HourlyDownloads.primary_count,
+            HourlyDownloads.cross_count,
+        ).where(HourlyDownloads.start_dttm == hour)
+    )
+    return {tuple(row[:3]): tuple(row[3:]) for row in rows}
+
+
+def _write_hours_orm(data_by_hour: Dict[datetime, List[dict]]) -> int:
+    """replaces the rows of each hour with an upsert in primary key order, in chunks of write_chunk_size rows
+    each chunk is committed on its own to keep locks short, then keys no longer in the hour are removed
+    a failure part way through an hour leaves a mix of old and new counts that a retry overwrites
+    in "diff" write mode only rows that differ from those already in the database are upserted
+    each commit also adds the difference between the new and old counts it writes to daily_downloads and
+    month_to_date_downloads, so they stay the sums of their hours whichever chunk a failure happens in
+    """
+    chunk_size = config.write_chunk_size
+    for hour, data_to_insert in sorted(data_by_hour.items()):
+        start = time.perf_counter()
+        data_to_insert = sorted(data_to_insert, key=_row_key)
+        day = _utc_day(hour)
+        with WriteSessionFactory() as session:
+            logger.info(f"{hour}: Executing write database transactions")
+            existing_rows = _hour_rows(session, hour)
+            vanished_keys = set(existing_rows) - {
+                _row_key(row) for row in data_to_insert
+            }
+
+            if config.write_mode == "diff":
+                new_count = 0
+                changed_rows = []
+                for row in data_to_insert:
+                    existing = existing_rows.get(_row_key(row))
+                    if existing is None:
+                        new_count += 1
+                    elif existing == (row["primary_count"], row["cross_count"]):
+                        continue
+                    changed_rows.append(row)
+                logger.info(
+                    f"{hour}: {new_count} new, {len(changed_rows) - new_count} changed, {len(vanished_keys)} removed and {len(data_to_insert) - len(changed_rows)} unchanged rows"
+                )
+            else:
+                changed_rows = data_to_insert
+
+            for i in range(0, len(changed_rows), chunk_size):
+                chunk = changed_rows[i : i + chunk_size]
+                session.execute(_upsert_statement(session, chunk))
+                _add_to_rollups(session, hour, _daily_deltas(day, chunk, existing_rows))
+                session.commit()
+
+            # remove previous data for keys without downloads this time
+            vanished_keys = sorted(vanished_keys)
+            for i in range(0, len(vanished_keys), chunk_size):
+                chunk = vanished_keys[i : i + chunk_size]
+                session.execute(
+                    delete(HourlyDownloads).where(
+                        HourlyDownloads.start_dttm == hour,
+                        tuple_(
+                            HourlyDownloads.category_id,
+                            HourlyDownloads.country_id,
+                            HourlyDownloads.download_type_id,
+                        ).in_(chunk),
+                    )
+                )
+                removed_rows = [
+                    {
+                        "category_id": category_id,
+                        "country_id": country_id,
+                        "download_type_id": download_type_id,
+                        "primary_count": 0,
+                        "cross_count": 0,
+                    }
+                    for category_id, country_id, download_type_id in chunk
+                ]
+                _add_to_rollups(
+                    session, hour, _daily_deltas(day, removed_rows, existing_rows)
+                )
+                session.commit()
+
+            if not changed_rows and not vanished_keys:
+                # nothing to write, but the hour is still the latest aggregated one of its month
+                _add_to_rollups(session, hour, [])
+                session.commit()
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"{hour}: Upserted {len(changed_rows)} rows and removed {len(vanished_keys)} in {elapsed:.2f}s ({len(changed_rows) / elapsed if elapsed else 0:.0f} rows/s)"
+        )
+
+    logger.info("Write database transactions successfully committed; session closed")
+
+    return sum(len(data_to_insert) for data_to_insert in data_by_hour.values())
+
+
+STAGING_COLUMNS = [
+    "start_dttm",
+    "category_id",
+    "country_id",
+    "download_type_id",
+    "primary_count",
+    "cross_count",
+]
+
+
+def _tsv_field(value) -> str:
+    """escapes a value the way LOAD DATA reads it by default, fields split on tabs and rows on newlines"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _write_tsv(data_by_hour: Dict[datetime, List[dict]]) -> str:
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".tsv", delete=False, encoding="utf-8", newline=""
+    ) as f:
+        for hour, data_to_insert in sorted(data_by_hour.items()):
+            for row in data_to_insert:
+                f.write("\t".join(_tsv_field(row[name]) for name in STAGING_COLUMNS))
+                f.write("\n")
+        return f.name
+
+
+def _read_tsv(path: str) -> Iterator[dict]:
+    """sqlite stand-in for LOAD DATA, parses the file back into rows"""
+    unescape = {"t": "\t", "n": "\n"}
+    with open(path, encoding="utf-8", newline="") as f:
+        for line in f:
+            fields = [
+                re.sub(r"\\(.)", lambda m: unescape.get(m[1], m[1]), field)
+                for field in line.rstrip("\n").split("\t")
+            ]
+            row = {
+                name: int(field) for name, field in zip(STAGING_COLUMNS[1:], fields[1:])
+            }
+            row["start_dttm"] = datetime.strptime(fields[0], "%Y-%m-%d %H:%M:%S")
+            yield row
+
+
+def _load_staging_table(session: Session, path: str):
+    if session.get_bind().dialect.name == "sqlite":
+        rows = list(_read_tsv(path))
+        if rows:
+            session.execute(insert(HourlyDownloadsStaging), rows)
+        return
+
+    # the file, escaping and line endings match the LOAD DATA defaults
+    session.execute(
+        text(
+            f"LOAD DATA LOCAL INFILE :path INTO TABLE {HourlyDownloadsStaging.name} "
+            f"CHARACTER SET utf8mb4 ({', '.join(STAGING_COLUMNS)})"
+        ),
+        {"path": path},
+    )
+
+
+def _write_hours_load_data(data_by_hour: Dict[datetime, List[dict]]) -> int:
+    """bulk loads the rows from a tsv file into a staging table, then swaps each hour into hourly_downloads
+    with a set based delete and insert ... select in its own transaction, which also subtracts the old rows
+    of the hour from daily_downloads and month_to_date_downloads and adds the new ones
+    """
+    start = time.perf_counter()
+    path = _write_tsv(data_by_hour)
+    row_count = sum(len(data_to_insert) for data_to_insert in data_by_hour.values())
+
+    try:
+        # the staging table is temporary, so it only exists on the connection that created it; the session is
+        # bound to that one connection, which keeps it from going back to the pool at each commit
+        engine = WriteSessionFactory.kw["bind"]
+        with engine.connect() as connection, WriteSessionFactory(
+            bind=connection
+        ) as session:
+            HourlyDownloadsStaging.create(session.connection(), checkfirst=True)
+            try:
+                session.execute(delete(HourlyDownloadsStaging))
+                _load_staging_table(session, path)
+                session.commit()
+                logger.info(
+                    f"Loaded {row_count} rows into {HourlyDownloadsStaging.name} in {time.perf_counter() - start:.2f}s"
+                )
+
+                for hour in sorted(data_by_hour):
+                    logger.info(f"{hour}: Swapping staged rows into hourly_downloads")
+                    day = _utc_day(hour)
+                    old_downloads = session.execute(
+                        select(
+                            func.coalesce(func.sum(HourlyDownloads.primary_count), 0)
+                        ).where(HourlyDownloads.start_dttm == hour)
+                    ).scalar()
+                    session.execute(
+                        _add_to_daily_statement(
+                            session,
+                            select(
+                                literal(day, Date),
+                                HourlyDownloads.category_id,
+                                HourlyDownloads.country_id,
+                                HourlyDownloads.download_type_id,
+                                -HourlyDownloads.primary_count,
+                                -HourlyDownloads.cross_count,
+                            ).where(HourlyDownloads.start_dttm == hour),
+                        )
+                    )
+                    session.execute(
+                        delete(HourlyDownloads).where(
+                            HourlyDownloads.start_dttm == hour
+                        )
+                    )
+                    session.execute(
+                        insert(HourlyDownloads).from_select(
+                            STAGING_COLUMNS,
+                            select(
+                                *(
+                                    HourlyDownloadsStaging.c[name]
+                                    for name in STAGING_COLUMNS
+                                )
+                            ).where(HourlyDownloadsStaging.c.start_dttm == hour),
+                        )
+                    )
+                    session.execute(
+                        _add_to_daily_statement(
+                            session,
+                            select(
+                                literal(day, Date),
+                                *(
+                                    HourlyDownloadsStaging.c[name]
+                                    for name in STAGING_COLUMNS[1:]
+                                ),
+                            ).where(HourlyDownloadsStaging.c.start_dttm == hour),
+                        )
+                    )
+                    _remove_empty_daily_rows(session, day)
+                    new_downloads = session.execute(
+                        select(
+                            func.coalesce(
+                                func.sum(HourlyDownloadsStaging.c.primary_count), 0
+                            )
+                        ).where(HourlyDownloadsStaging.c.start_dttm == hour)
+                    ).scalar()
+                    _add_to_month_to_date(session, hour, new_downloads - old_downloads)
+                    session.commit()
+            finally:
+                session.rollback()
+                HourlyDownloadsStaging.drop(session.connection(), checkfirst=True)
+                session.commit()
+    finally:
+        os.remove(path)
+
+    elapsed = time.perf_counter() - start
+    logger.info(
+        f"Wrote {row_count} rows with LOAD DATA in {elapsed:.2f}s ({row_count / elapsed if elapsed else 0:.0f} rows/s)"
+    )
+    return row_count
+
+
+def encode_dimensions(
+    data_by_hour: Dict[datetime, List[dict]],
+) -> Dict[datetime, List[dict]]:
+    """replaces the category, country and download type of each output row with their ids in the download_*
+    dimension tables, adding values that aren't in them yet
+    """
+    rows = [row for data_to_insert in data_by_hour.values() for row in data_to_insert]
+    with WriteSessionFactory() as session:
+        category_ids = hourly_downloads_dimensions.categories.encode(
+            session,
+            {row["category"] for row in rows},
+            {row["category"]: {"archive": row["archive"]} for row in rows},
+        )
+        country_ids = hourly_downloads_dimensions.countries.encode(
+            session, {row["country"] for row in rows}
+        )
+        download_type_ids = hourly_downloads_dimensions.download_types.encode(
+            session, {row["download_type"] for row in rows}
+        )
+
+    return {
+        hour: [
+            {
+                "start_dttm": row["start_dttm"],
+                "category_id": category_ids[row["category"]],
+                "country_id": country_ids[row["country"]],
+                "download_type_id": download_type_ids[row["download_type"]],
+                "primary_count": row["primary_count"],
+                "cross_count": row["cross_count"],
+            }
+            for row in data_to_insert
+        ]
+        for hour, data_to_insert in data_by_hour.items()
+    }
+
+
+def write_hours(data_by_hour: Dict[datetime, List[dict]]) -> int:
+    """writes the rows of each hour through the configured write_sink, falling back to the orm writer
+    if the database can't bulk load (e.g. local_infile is disabled)
+    """
+    data_by_hour = encode_dimensions(data_by_hour)
+    if config.write_sink == "load_data":
+        try:
+            return _write_hours_load_data(data_by_hour)
+        except DBAPIError:
+            logger.warning(
+                "Bulk load into hourly_downloads failed, writing through the orm instead",
+                exc_info=True,
+            )
+    return _write_hours_orm(data_by_hour)
 
 
 def insert_into_database(
-    aggregated_data: Dict[DownloadKey, DownloadCounts],
+    aggregated_data: Mapping[DownloadKey, DownloadCounts],
     time_periods: Set[datetime],  # Changed to Set
 ) -> int:
-    """adds the data from an hour of downloads into the database
-    uses bulk insert and update statements to increase efficiency
+    """adds the data from one or more hours of downloads into the database"""
+    return write_hours(rows_by_hour(aggregated_data, time_periods))
+
+
+def rebuild_daily_downloads(start_day: date, end_day: date) -> int:
+    """regenerates the daily_downloads rows of each day in the inclusive range by summing its hours in
+    hourly_downloads, one transaction per day; returns the number of rows written
     """
-    # Optimized: Use raw dicts for bulk_insert_mappings (much faster than bulk_save_objects)
-    data_to_insert = [
-        {
-            "country": key.country,
-            "download_type": key.download_type,
-            "archive": key.archive,
-            "category": key.category,
-            "primary_count": counts.primary,
-            "cross_count": counts.cross,
-            "start_dttm": key.time,
-        }
-        for key, counts in aggregated_data.items()
-    ]
+    row_count = 0
+    day = start_day
+    while day <= end_day:
+        start = datetime(day.year, day.month, day.day)
+        with WriteSessionFactory() as session:
+            session.execute(delete(DailyDownloads).where(DailyDownloads.day == day))
+            result = session.execute(
+                insert(DailyDownloads).from_select(
+                    DAILY_COLUMNS,
+                    select(
+                        literal(day, Date),
+                        HourlyDownloads.category_id,
+                        HourlyDownloads.country_id,
+                        HourlyDownloads.download_type_id,
+                        func.sum(HourlyDownloads.primary_count),
+                        func.sum(HourlyDownloads.cross_count),
+                    )
+                    .where(
+                        HourlyDownloads.start_dttm >= start,
+                        HourlyDownloads.start_dttm < start + timedelta(days=1),
+                    )
+                    .group_by(
+                        HourlyDownloads.category_id,
+                        HourlyDownloads.country_id,
+                        HourlyDownloads.download_type_id,
+                    ),
+                )
+            )
+            session.commit()
+
+        logger.info(f"{day}: Rebuilt {result.rowcount} rows of daily_downloads")
+        row_count += result.rowcount
+        day += timedelta(days=1)
+
+    return row_count
 
+
+def rebuild_month_to_date_downloads(month: date) -> Optional[int]:
+    """regenerates the month_to_date_downloads row of the month from its hours in hourly_downloads,
+    returns the month's downloads or None if it has no hours
+    """
+    start = datetime(month.year, month.month, 1)
+    end = (start + timedelta(days=32)).replace(day=1)
     with WriteSessionFactory() as session:
-        logger.info("Executing write database transaction")
-        # remove previous data for the time period
-        session.query(HourlyDownloads).filter(
-            HourlyDownloads.start_dttm.in_(list(time_periods))
-        ).delete(synchronize_session=False)
-
-        # High-performance bulk insert skipping ORM object state overhead
-        session.bulk_insert_mappings(HourlyDownloads, data_to_insert)
+        downloads, latest_hour = session.execute(
+            select(
+                func.sum(HourlyDownloads.primary_count),
+                func.max(HourlyDownloads.start_dttm),
+            ).where(
+                HourlyDownloads.start_dttm >= start, HourlyDownloads.start_dttm < end
+            )
+        ).one()
+
+        session.execute(
+            delete(MonthToDateDownloads).where(
+                MonthToDateDownloads.month == start.date()
+            )
+        )
+        if latest_hour is not None:
+            session.add(
+                MonthToDateDownloads(
+                    month=start.date(),
+                    downloads=downloads or 0,
+                    latest_hour=latest_hour,
+                )
+            )
         session.commit()
 
-    logger.info("Write database transaction successfully committed; session closed")
+    logger.info(
+        f"{start.date()}: Rebuilt month_to_date_downloads, {downloads} downloads through {latest_hour}"
+    )
+    return downloads if latest_hour is not None else None
+
+
+def get_output_spool() -> Optional[OutputSpool]:
+    if not config.output_spool_dir:
+        return None
+    return OutputSpool(
+        config.output_spool_dir, config.output_spool_max_age_in_minutes * 60
+    )
+
+
+def resolve_paper_categories(
+    paper_ids: Iterable[str],
+) -> Tuple[Dict[str, PaperCategories], int, int]:
+    """finds categories for the papers, only looking up those not cached by a previous invocation
+    returns the categories found, and the number of cache hits and misses
+    """
+    paper_categories, missing_ids = category_cache.get_many(paper_ids)
+    cache_hit_count = len(paper_categories)
+    cache_miss_count = len(missing_ids)
+
+    if missing_ids:
+        query_results = lookup_paper_categories(missing_ids)
+        new_paper_categories = process_paper_categories(query_results)
+        category_cache.put_many(new_paper_categories)
+        paper_categories.update(new_paper_categories)
+
+    return paper_categories, cache_hit_count, cache_miss_count
+
+
+def aggregate_staged(
+    rows: Union[RowIterator, _EmptyRowIterator, Iterable[pa.RecordBatch]],
+) -> Tuple[AggregatedDownloads, DownloadBatch, Dict[str, int]]:
+    """parses all log rows, then looks up categories for all papers, then aggregates
+    returns the same as aggregate_streaming
+    """
+    parse_rows = (
+        process_record_batches
+        if config.log_ingestion == "arrow"
+        else process_table_rows
+    )
+    download_data, paper_ids, _, counts = parse_rows(rows)
+    counts["fetched"] = len(download_data)
+
+    # find categories for all the papers
+    paper_categories, counts["cache_hit"], counts["cache_miss"] = (
+        resolve_paper_categories(paper_ids)
+    )
+    counts["found_papers"] = len(paper_categories)
+
+    if not paper_categories:
+        return (
+            AggregatedDownloads(
+                download_data.hours,
+                download_data.countries,
+                download_data.download_types,
+            ),
+            download_data,
+            counts,
+        )
+
+    # aggregate download data
+    aggregate = (
+        aggregate_data_two_stage
+        if config.aggregation_mode == "two_stage"
+        else aggregate_data
+    )
+    return aggregate(download_data, paper_categories), download_data, counts
 
-    return len(data_to_insert)
+
+def format_time_periods(time_periods: Set[datetime]) -> str:
+    if len(time_periods) > 1:
+        return f"{min(time_periods).strftime('%Y-%m-%d %H:%M:%S')} to {max(time_periods).strftime('%Y-%m-%d %H:%M:%S')} ({len(time_periods)} hours)"
+    return ", ".join([t.strftime("%Y-%m-%d %H:%M:%S") for t in time_periods])
 
 
 def perform_aggregation(
-    rows: Union[RowIterator, _EmptyRowIterator],
+    rows: Union[RowIterator, _EmptyRowIterator, Iterable[pa.RecordBatch]],
+    hour_range: Optional[Tuple[datetime, datetime]] = None,
 ) -> AggregationResult:
+    """aggregates the log rows and writes them to the database
+    with an hour_range, every hour of it is replaced, and the output is spooled before the write so a retry of
+    the range can skip straight to it
+    """
     logger.info("Processing results of log query")
-    data_gen, paper_ids, time_periods, counts = process_table_rows(rows)
+    start = time.perf_counter()
+    paper_id_normalizer.reset_stats()
 
-    # Consume generator into list to populate paper_ids for the next DB query
-    download_data = list(data_gen)
-    fetched_count = len(download_data)
-    unique_id_count = len(paper_ids)
+    if config.aggregation_pipeline == "streaming":
+        aggregated_data, download_data, counts = aggregate_streaming(rows)
+    else:
+        aggregated_data, download_data, counts = aggregate_staged(rows)
+
+    fetched_count = counts["fetched"]
+    unique_id_count = len(download_data.paper_ids)
     bad_id_count = counts["bad_id"]
     problem_row_count = counts["problem"]
+    time_periods = set(download_data.hours.values)
+    if hour_range:
+        # hours of the range without any downloads this time still replace what was written for them before,
+        # in the same form as the hours of the log rows
+        tzinfo = (
+            next(iter(time_periods)).tzinfo if time_periods else hour_range[0].tzinfo
+        )
+        hour = _naive_utc(hour_range[0])
+        while hour <= _naive_utc(hour_range[1]):
+            time_periods.add(hour.replace(tzinfo=tzinfo))
+            hour += timedelta(hours=1)
 
-    time_period_str = ", ".join([t.strftime("%Y-%m-%d %H:%M:%S") for t in time_periods])
+    time_period_str = format_time_periods(time_periods)
 
+    logger.info(
+        f"{time_period_str}: Paper id memo hit ratio {paper_id_normalizer.hit_ratio:.1%}, {paper_id_normalizer.fast_path} of {paper_id_normalizer.misses} new ids matched the fast path"
+    )
     if problem_row_count > 30:
         logger.warning(
             f"{time_period_str}: Problem processing {problem_row_count} rows"
         )
 
-    # find categories for all the papers
-    query_results = get_paper_categories(paper_ids)
-    paper_categories = process_paper_categories(query_results)
-
-    if fetched_count > 0 and not paper_categories:
+    if fetched_count > 0 and not counts["found_papers"]:
         logger.error(f"{time_period_str}: No category data retrieved from database!")
         raise NoRetryError
 
-    # aggregate download data
-    aggregated_data = aggregate_data(download_data, paper_categories)
+    logger.info(
+        f"{time_period_str}: Aggregated {fetched_count} rows into {len(aggregated_data)} keys in {time.perf_counter() - start:.2f}s using the {config.aggregation_pipeline} pipeline"
+    )
 
     # write all_data to tables
-    add_count = insert_into_database(aggregated_data, time_periods)
+    data_by_hour = rows_by_hour(aggregated_data, time_periods)
+    output_spool = get_output_spool() if hour_range else None
+    if output_spool:
+        output_spool.save(*hour_range, data_by_hour)
+    add_count = write_hours(data_by_hour)
+    if output_spool:
+        output_spool.remove(*hour_range)
     result = AggregationResult(
         time_period_str,
         add_count,
@@ -261,11 +1481,26 @@ def perform_aggregation(
         unique_id_count,
         bad_id_count,
         problem_row_count,
+        counts["cache_hit"],
+        counts["cache_miss"],
     )
     return result
 
 
-def query_logs(start_time: str, end_time: str) -> RowIterator:
+def log_query_job_id(job_config: bigquery.QueryJobConfig, run_id: str) -> str:
+    """deterministic job id for a run of the log query
+    redeliveries of an event share its id, so a retry finds the job started by the failed attempt
+    """
+    fingerprint = hashlib.sha256(config.logs_query.encode())
+    for parameter in job_config.query_parameters:
+        fingerprint.update(f"{parameter.name}={parameter.value}".encode())
+    fingerprint.update(run_id.encode())
+    return f"{config.log_query_job_prefix}_{fingerprint.hexdigest()}"
+
+
+def query_logs(
+    start_time: str, end_time: str, run_id: Optional[str] = None
+) -> RowIterator:
     job_config = bigquery.QueryJobConfig(
         query_parameters=[
             bigquery.ScalarQueryParameter(
@@ -287,7 +1522,24 @@ def query_logs(start_time: str, end_time: str) -> RowIterator:
     logger.info("Initializing bigquery client")
     bq_client = bigquery.Client()
     logger.info("Executing log query in bigquery")
-    query_job = bq_client.query(config.logs_query, job_config=job_config)
+    if run_id is None:
+        query_job = bq_client.query(config.logs_query, job_config=job_config)
+    else:
+        job_id = log_query_job_id(job_config, run_id)
+        try:
+            query_job = bq_client.query(
+                config.logs_query, job_config=job_config, job_id=job_id
+            )
+        except Conflict:
+            # a previous attempt at this run already started the query, use its results
+            query_job = bq_client.get_job(job_id)
+            logger.info(f"Reattached to existing log query job {job_id}")
+
+            if query_job.done() and query_job.error_result:
+                logger.warning(
+                    f"Existing log query job {job_id} failed, running the query again"
+                )
+                query_job = bq_client.query(config.logs_query, job_config=job_config)
     logger.info("Log query successfully executed")
 
     rows = query_job.result()
@@ -299,6 +1551,92 @@ def query_logs(start_time: str, end_time: str) -> RowIterator:
         raise NoRetryError
 
 
+def query_logs_arrow(
+    start_time: str, end_time: str, run_id: Optional[str] = None
+) -> Iterator[pa.RecordBatch]:
+    """runs the log query and downloads the results as arrow record batches through the bigquery storage read api"""
+    rows = query_logs(start_time, end_time, run_id)
+
+    logger.info("Downloading log query results with the storage read api")
+    return rows.to_arrow_iterable(
+        bqstorage_client=bigquery_storage.BigQueryReadClient()
+    )
+
+
+def _log_rows(
+    record_batches: Iterable[pa.RecordBatch],
+) -> Union[Iterator[Dict], Iterable[pa.RecordBatch]]:
+    """cached log rows in the form the configured log ingestion parses"""
+    if config.log_ingestion == "arrow":
+        return record_batches
+    return (row for record_batch in record_batches for row in record_batch.to_pylist())
+
+
+def get_log_rows(
+    start_hour: datetime,
+    end_hour: datetime,
+    run_id: Optional[str] = None,
+    force_refresh: bool = False,
+) -> Union[RowIterator, Iterable]:
+    """log query results for start_hour to end_hour inclusive
+    with a log cache configured, the results are reused when every hour is cached and stored per hour otherwise
+    """
+    start_time, _ = get_start_and_end_times(start_hour)
+    _, end_time = get_start_and_end_times(end_hour)
+
+    if not config.log_cache_dir:
+        if config.log_ingestion == "arrow":
+            return query_logs_arrow(start_time, end_time, run_id)
+        return query_logs(start_time, end_time, run_id)
+
+    log_cache = HourlyLogCache(config.log_cache_dir, config.log_cache_max_bytes)
+    if not (force_refresh or config.log_cache_force_refresh):
+        cached = log_cache.get(start_hour, end_hour)
+        if cached is not None:
+            logger.info(
+                f"Using cached log query results from {start_time} to {end_time}"
+            )
+            return _log_rows(cached)
+
+    if config.log_ingestion == "arrow":
+        record_batches = query_logs_arrow(start_time, end_time, run_id)
+    else:
+        # downloaded page by page over the rest api
+        record_batches = query_logs(start_time, end_time, run_id).to_arrow_iterable()
+
+    # each batch is written to the cache as it is passed on, the hours are cached once all of them are parsed
+    logger.info(f"Caching log query results from {start_time} to {end_time}")
+    return _log_rows(log_cache.put_batches(start_hour, end_hour, record_batches))
+
+
+def aggregate_hour_range(
+    start_hour: datetime,
+    end_hour: datetime,
+    run_id: Optional[str] = None,
+    force_refresh: bool = False,
+) -> AggregationResult:
+    """aggregates every hour from start_hour to end_hour inclusive with a single log query and category lookup
+    a retry after a failed write writes the spooled output of the earlier attempt,
+    retries of the same run_id reuse the log query job of the earlier attempt, force_refresh skips both caches
+    """
+    output_spool = get_output_spool()
+    if output_spool and not force_refresh:
+        data_by_hour = output_spool.load(start_hour, end_hour)
+        if data_by_hour is not None:
+            time_period_str = format_time_periods(set(data_by_hour))
+            logger.info(
+                f"{time_period_str}: Writing spooled output of a previous attempt"
+            )
+            add_count = write_hours(data_by_hour)
+            output_spool.remove(start_hour, end_hour)
+            return AggregationResult(time_period_str, add_count, 0, 0, 0, 0)
+
+    return perform_aggregation(
+        get_log_rows(start_hour, end_hour, run_id, force_refresh),
+        (start_hour, end_hour),
+    )
+
+
 def get_start_and_end_times(hour: datetime) -> tuple[datetime, datetime]:
     start_time = f"{hour.strftime('%Y-%m-%d %H')}:00:00"
     end_time = f"{hour.strftime('%Y-%m-%d %H')}:59:59"
@@ -316,9 +1654,7 @@ def validate_cloud_event(cloud_event: CloudEvent) -> datetime:
     return (event_time - timedelta(hours=config.hour_delay)).replace(minute=0, second=0)
 
 
-def validate_hour(cloud_event: CloudEvent) -> datetime:
-    hour = cloud_event.data["message"]["attributes"]["hour"]
-
+def parse_hour(hour: str) -> datetime:
     return (
         datetime.strptime(hour, "%Y-%m-%d%H")
         .replace(tzinfo=timezone.utc)
@@ -326,6 +1662,22 @@ def validate_hour(cloud_event: CloudEvent) -> datetime:
     )
 
 
+def validate_hour(cloud_event: CloudEvent) -> datetime:
+    hour = cloud_event.data["message"]["attributes"]["hour"]
+
+    return parse_hour(hour)
+
+
+def validate_hour_range(start_hour: datetime, end_hour: datetime):
+    hour_count = (end_hour - start_hour) // timedelta(hours=1) + 1
+
+    if end_hour < start_hour or hour_count > config.max_hours_per_run:
+        logger.error(
+            f"Invalid hour range {start_hour} to {end_hour}, must be in order and cover at most {config.max_hours_per_run} hours"
+        )
+        raise NoRetryError
+
+
 def validate_inputs(cloud_event: CloudEvent) -> datetime:
     try:
         hour = validate_hour(cloud_event)
@@ -342,8 +1694,33 @@ def validate_inputs(cloud_event: CloudEvent) -> datetime:
     return hour
 
 
-@functions_framework.cloud_event
-def aggregate_hourly_downloads(cloud_event: CloudEvent):
+def validate_range_inputs(cloud_event: CloudEvent) -> Tuple[datetime, datetime]:
+    """returns the first and last hour to aggregate
+    from the start_hour and end_hour attributes if present, otherwise the single hour from validate_inputs
+    """
+    attributes = (cloud_event.data or {}).get("message", {}).get("attributes") or {}
+    if "start_hour" not in attributes and "end_hour" not in attributes:
+        hour = validate_inputs(cloud_event)
+        return hour, hour
+
+    try:
+        start_hour = parse_hour(attributes["start_hour"])
+        end_hour = parse_hour(attributes["end_hour"])
+    except (KeyError, ValueError):
+        logger.exception("Invalid hour range attributes")
+        raise NoRetryError
+
+    validate_hour_range(start_hour, end_hour)
+
+    logger.info(f"Parameters for job: start_hour={start_hour}, end_hour={end_hour}")
+    return start_hour, end_hour
+
+
+def enable_local_infile(dialect, connection_record, cargs, cparams):
+    cparams["local_infile"] = True
+
+
+def initialize_sessions():
     global read_engine, ReadSessionFactory, write_engine, WriteSessionFactory
 
     if config.env != "TEST":
@@ -354,14 +1731,23 @@ def aggregate_hourly_downloads(cloud_event: CloudEvent):
         if write_engine is None:
             logger.info("Initializing write engine and sessionmaker")
             write_engine = get_engine_unix_socket(config.write_db)
+            if config.write_sink == "load_data":
+                # LOAD DATA LOCAL INFILE has to be allowed by the client connection as well as the server
+                event.listen(write_engine, "do_connect", enable_local_infile)
             WriteSessionFactory = sessionmaker(bind=write_engine)
 
-    try:
-        hour = validate_inputs(cloud_event)
-        start_time, end_time = get_start_and_end_times(hour)
 
-        log_query_result = query_logs(start_time, end_time)
-        aggregation_result = perform_aggregation(log_query_result)
+@functions_framework.cloud_event
+def aggregate_hourly_downloads(cloud_event: CloudEvent):
+    global read_engine, ReadSessionFactory, write_engine, WriteSessionFactory
+
+    initialize_sessions()
+
+    try:
+        start_hour, end_hour = validate_range_inputs(cloud_event)
+        aggregation_result = aggregate_hour_range(
+            start_hour, end_hour, cloud_event["id"]
+        )
 
         logger.info(aggregation_result.single_run_str())
 
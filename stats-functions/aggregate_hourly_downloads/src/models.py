@@ -1,6 +1,21 @@
 import logging
-from typing import Set, Literal
+from array import array
+from collections.abc import Mapping
+from typing import (
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Literal,
+    Tuple,
+    TypeVar,
+)
 from datetime import datetime
+from types import MappingProxyType
 
 from arxiv.taxonomy.category import Category
 from arxiv.taxonomy.definitions import CATEGORIES
@@ -10,49 +25,104 @@ logger = logging.getLogger(__name__)
 
 DOWNLOAD_TYPE = Literal["pdf", "html", "src"]
 
+T = TypeVar("T", bound=Hashable)
+
+# every category id, including aliases and subsumed categories, mapped to its canonical category
+# built once at import so resolving a category row is a single lookup
+CANONICAL_CATEGORIES: Mapping[str, Category] = MappingProxyType(
+    {cat_id: category.get_canonical() for cat_id, category in CATEGORIES.items()}
+)
+
+# canonical categories numbered by id, so a paper's categories fit in a small int and a bitmask
+_canonical_ids = sorted({category.id for category in CANONICAL_CATEGORIES.values()})
+CANONICAL_CATEGORY_LIST: Tuple[Category, ...] = tuple(
+    CATEGORIES[cat_id] for cat_id in _canonical_ids
+)
+# every category id mapped to the index of its canonical category
+CATEGORY_INDEX: Mapping[str, int] = MappingProxyType(
+    {
+        cat_id: _canonical_ids.index(category.id)
+        for cat_id, category in CANONICAL_CATEGORIES.items()
+    }
+)
+
+
+class CategoryMembership:
+    """compact form of a paper's categories: the index of its primary category in CANONICAL_CATEGORY_LIST
+    (-1 when unknown) and a bitmask with a bit set for the index of each cross-list category
+    """
+
+    __slots__ = ("primary", "crosses")
+
+    def __init__(self, primary: int = -1, crosses: int = 0):
+        self.primary = primary
+        self.crosses = crosses
+
+    def cross_indexes(self) -> Iterator[int]:
+        crosses = self.crosses
+        while crosses:
+            lowest = crosses & -crosses
+            yield lowest.bit_length() - 1
+            crosses ^= lowest
+
+    def __eq__(self, other):
+        if not isinstance(other, CategoryMembership):
+            return False
+        return self.primary == other.primary and self.crosses == other.crosses
+
+    def __repr__(self):
+        return f"CategoryMembership(primary={self.primary}, crosses={self.crosses:#x})"
+
 
 class PaperCategories:
-    paper_id: str
-    primary: Category
-    crosses: Set[Category]
+    """the categories of a paper, stored as a CategoryMembership
+    primary and crosses give the canonical Category objects
+    """
 
-    def __init__(self, id: str):
+    __slots__ = ("paper_id", "membership")
+
+    def __init__(self, id: str, membership: Optional[CategoryMembership] = None):
         self.paper_id = id
-        self.primary = None
-        self.crosses = set()
+        self.membership = membership if membership is not None else CategoryMembership()
+
+    @property
+    def primary(self) -> Optional[Category]:
+        if self.membership.primary < 0:
+            return None
+        return CANONICAL_CATEGORY_LIST[self.membership.primary]
+
+    @property
+    def crosses(self) -> Set[Category]:
+        return {
+            CANONICAL_CATEGORY_LIST[index] for index in self.membership.cross_indexes()
+        }
 
     def add_primary(self, cat: str):
         if (
-            self.primary is not None
+            self.membership.primary >= 0
         ):  # this function should only get called once per paper
             logger.error(
                 f"Multiple primary categories for {self.paper_id}: {self.primary} and {cat}"
             )
             self.add_cross(cat)  # add as a cross just to keep data
         else:
-            catgory = CATEGORIES[cat]
-            canon = catgory.get_canonical()
-            self.primary = canon
-            self.crosses.discard(
-                canon
+            index = CATEGORY_INDEX[cat]
+            self.membership.primary = index
+            self.membership.crosses &= ~(
+                1 << index
             )  # removes from crosses if present, the same category cant be both primary and cross.
             # This is relevant because an alternate name may be listed as a cross list
 
     def add_cross(self, cat: str):
-        catgory = CATEGORIES[cat]
-        canon = catgory.get_canonical()
+        index = CATEGORY_INDEX[cat]
         # avoid dupliciates of categories with other names
-        if self.primary is None or canon != self.primary:
-            self.crosses.add(canon)
+        if index != self.membership.primary:
+            self.membership.crosses |= 1 << index
 
     def __eq__(self, other):
         if not isinstance(other, PaperCategories):
             return False
-        return (
-            self.paper_id == other.paper_id
-            and self.primary == other.primary
-            and self.crosses == other.crosses
-        )
+        return self.paper_id == other.paper_id and self.membership == other.membership
 
     def __repr__(self):
         crosses_str = ", ".join(cat.id for cat in self.crosses)
@@ -84,6 +154,117 @@ class DownloadData:
         )
 
 
+class Dimension(Generic[T]):
+    """dictionary encoding for one column of download data
+    each distinct value is stored once and referred to by a small integer id
+    """
+
+    def __init__(self):
+        self.ids: Dict[T, int] = {}
+        self.values: List[T] = []
+
+    def encode(self, value: T) -> int:
+        id = self.ids.get(value)
+        if id is None:
+            id = len(self.values)
+            self.ids[value] = id
+            self.values.append(value)
+        return id
+
+    def decode(self, id: int) -> T:
+        return self.values[id]
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value) -> bool:
+        return value in self.ids
+
+
+class DownloadBatch:
+    """columnar store of download data
+    rows are kept as parallel typed arrays of dimension ids and counts rather than one DownloadData object per row,
+    which keeps a busy hour of log data to a few bytes per row
+    """
+
+    def __init__(self):
+        self.paper_ids: Dimension[str] = Dimension()
+        self.countries: Dimension[str] = Dimension()
+        self.download_types: Dimension[str] = Dimension()
+        self.hours: Dimension[datetime] = Dimension()
+
+        self.paper_col = array("I")
+        self.country_col = array("H")
+        self.download_type_col = array("B")
+        self.hour_col = array("H")
+        self.num_col = array("q")
+
+    @classmethod
+    def from_download_data(
+        cls, download_data: Iterable[DownloadData]
+    ) -> "DownloadBatch":
+        batch = cls()
+        for entry in download_data:
+            batch.append(
+                entry.paper_id,
+                entry.country,
+                entry.download_type,
+                entry.time,
+                entry.num,
+            )
+        return batch
+
+    def sharing_dimensions(self) -> "DownloadBatch":
+        """returns an empty batch that encodes into the same dimensions as this one,
+        so the rows of several batches can be aggregated into one result
+        """
+        batch = DownloadBatch()
+        batch.paper_ids = self.paper_ids
+        batch.countries = self.countries
+        batch.download_types = self.download_types
+        batch.hours = self.hours
+        return batch
+
+    def append(
+        self,
+        paper_id: str,
+        country: str,
+        download_type: DOWNLOAD_TYPE,
+        time: datetime,
+        num: int,
+    ):
+        # counts are appended first as they are the only column that can reject a value,
+        # which would otherwise leave the columns misaligned
+        self.num_col.append(num)
+        self.paper_col.append(self.paper_ids.encode(paper_id))
+        self.country_col.append(self.countries.encode(country))
+        self.download_type_col.append(self.download_types.encode(download_type))
+        self.hour_col.append(self.hours.encode(time))
+
+    def __len__(self) -> int:
+        return len(self.num_col)
+
+    def __iter__(self) -> Iterator[DownloadData]:
+        """decodes rows back into DownloadData objects, intended for debugging and tests"""
+        for paper, country, download_type, hour, num in zip(
+            self.paper_col,
+            self.country_col,
+            self.download_type_col,
+            self.hour_col,
+            self.num_col,
+        ):
+            yield DownloadData(
+                paper_id=self.paper_ids.decode(paper),
+                country=self.countries.decode(country),
+                download_type=self.download_types.decode(download_type),
+                time=self.hours.decode(hour),
+                num=num,
+            )
+
+    def __repr__(self) -> str:
+        return f"DownloadBatch(rows={len(self)}, papers={len(self.paper_ids)}, countries={len(self.countries)}, hours={len(self.hours)})"
+
+
 class DownloadCounts:
     def __init__(self, primary: int = 0, cross: int = 0):
         self.primary = primary
@@ -140,6 +321,100 @@ class DownloadKey:
         return f"Key(type: {self.download_type}, cat: {self.category}, country: {self.country}, day: {self.time.day} hour: {self.time.hour})"
 
 
+# bit layout of a packed download key: hour | country | download type | category
+CATEGORY_BITS = 16
+DOWNLOAD_TYPE_BITS = 8
+COUNTRY_BITS = 16
+
+DOWNLOAD_TYPE_SHIFT = CATEGORY_BITS
+COUNTRY_SHIFT = DOWNLOAD_TYPE_SHIFT + DOWNLOAD_TYPE_BITS
+HOUR_SHIFT = COUNTRY_SHIFT + COUNTRY_BITS
+
+
+def pack_key(hour: int, country: int, download_type: int, category: int) -> int:
+    """packs the dimension ids of a download key into a single int"""
+    return (
+        (hour << HOUR_SHIFT)
+        | (country << COUNTRY_SHIFT)
+        | (download_type << DOWNLOAD_TYPE_SHIFT)
+        | category
+    )
+
+
+def unpack_key(key: int) -> Tuple[int, int, int, int]:
+    return (
+        key >> HOUR_SHIFT,
+        (key >> COUNTRY_SHIFT) & ((1 << COUNTRY_BITS) - 1),
+        (key >> DOWNLOAD_TYPE_SHIFT) & ((1 << DOWNLOAD_TYPE_BITS) - 1),
+        key & ((1 << CATEGORY_BITS) - 1),
+    )
+
+
+class AggregatedDownloads(Mapping):
+    """download counts keyed by packed integer keys
+    behaves as a read-only mapping of DownloadKey to DownloadCounts,
+    keys are decoded through the dimension dictionaries only when read (i.e. at write time)
+    """
+
+    def __init__(
+        self,
+        hours: Dimension[datetime],
+        countries: Dimension[str],
+        download_types: Dimension[str],
+        categories: Optional[Dimension[Tuple[str, str]]] = None,
+    ):
+        self.hours = hours
+        self.countries = countries
+        self.download_types = download_types
+        self.categories: Dimension[Tuple[str, str]] = (
+            categories if categories is not None else Dimension()
+        )  # (archive, category id)
+        self.counts: Dict[int, DownloadCounts] = {}
+
+    def encode(self, key: DownloadKey) -> Optional[int]:
+        """returns the packed key, or None if any part of the key has not been seen"""
+        ids = (
+            self.hours.ids.get(key.time),
+            self.countries.ids.get(key.country),
+            self.download_types.ids.get(key.download_type),
+            self.categories.ids.get((key.archive, key.category)),
+        )
+        if None in ids:
+            return None
+        return pack_key(*ids)
+
+    def decode(self, key: int) -> DownloadKey:
+        hour, country, download_type, category = unpack_key(key)
+        archive, category_id = self.categories.decode(category)
+        return DownloadKey(
+            self.hours.decode(hour),
+            self.countries.decode(country),
+            self.download_types.decode(download_type),
+            archive,
+            category_id,
+        )
+
+    def __getitem__(self, key: DownloadKey) -> DownloadCounts:
+        packed = self.encode(key) if isinstance(key, DownloadKey) else None
+        if packed is None or packed not in self.counts:
+            raise KeyError(key)
+        return self.counts[packed]
+
+    def __iter__(self) -> Iterator[DownloadKey]:
+        for key in self.counts:
+            yield self.decode(key)
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def items(self) -> Iterator[Tuple[DownloadKey, DownloadCounts]]:
+        for key, counts in self.counts.items():
+            yield self.decode(key), counts
+
+    def __repr__(self) -> str:
+        return f"AggregatedDownloads(keys={len(self)})"
+
+
 class AggregationResult:
     def __init__(
         self,
@@ -149,6 +424,8 @@ class AggregationResult:
         unique_ids_count: int,
         bad_id_count: int,
         problem_row_count: int,
+        cache_hit_count: int = 0,
+        cache_miss_count: int = 0,
     ):
         self.time_period_str = time_period_str
         self.output_count = output_count
@@ -156,9 +433,11 @@ class AggregationResult:
         self.unique_ids_count = unique_ids_count
         self.bad_id_count = bad_id_count
         self.problem_row_count = problem_row_count
+        self.cache_hit_count = cache_hit_count
+        self.cache_miss_count = cache_miss_count
 
     def single_run_str(self) -> str:
-        return f"{self.time_period_str}: SUCCESS! rows created: {self.output_count}, fetched rows: {self.fetched_count}, unique_ids: {self.unique_ids_count}, invalid_ids: {self.bad_id_count}, other unprocessable rows: {self.problem_row_count}"
+        return f"{self.time_period_str}: SUCCESS! rows created: {self.output_count}, fetched rows: {self.fetched_count}, unique_ids: {self.unique_ids_count}, invalid_ids: {self.bad_id_count}, other unprocessable rows: {self.problem_row_count}, category cache hits: {self.cache_hit_count}, misses: {self.cache_miss_count}"
 
     def table_row_str(self) -> str:
         return f"{self.time_period_str:<20} {self.output_count:<7} {self.fetched_count:<12} {self.unique_ids_count:<10} {self.bad_id_count:<7} {self.problem_row_count:<10}"
@@ -0,0 +1,110 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CategorySnapshot:
+    """local sqlite copy of paper categories from the read database, keyed by paper_id
+    survives across warm invocations of the function, so only papers that are new to the snapshot
+    or whose metadata changed since the high water mark (max metadata_id seen) need to be read from mysql
+    """
+
+    def __init__(self, path: str, max_age_in_hours: int = 24):
+        self.path = path
+        self.max_age_in_seconds = max_age_in_hours * 3600
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+
+        with self.lock, self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS paper_categories (
+                    paper_id TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    is_primary INTEGER NOT NULL,
+                    PRIMARY KEY (paper_id, category)
+                )
+                """)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)"
+            )
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS lookup (paper_id TEXT PRIMARY KEY)"
+            )
+
+        self.expire_if_stale()
+
+    def _get_state(self, key: str) -> Optional[int]:
+        row = self.connection.execute(
+            "SELECT value FROM state WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: Optional[int]):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value)
+        )
+
+    def expire_if_stale(self):
+        """categories can change without a new metadata row, so the snapshot is rebuilt periodically"""
+        with self.lock, self.connection:
+            created = self._get_state("created")
+            if created is None or time.time() - created > self.max_age_in_seconds:
+                logger.info("Resetting paper category snapshot")
+                self.connection.execute("DELETE FROM paper_categories")
+                self._set_state("high_water_mark", None)
+                self._set_state("created", int(time.time()))
+
+    def _fill_lookup(self, paper_ids: Iterable[str]):
+        self.connection.execute("DELETE FROM lookup")
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO lookup (paper_id) VALUES (?)",
+            ((paper_id,) for paper_id in paper_ids),
+        )
+
+    @property
+    def high_water_mark(self) -> Optional[int]:
+        with self.lock:
+            return self._get_state("high_water_mark")
+
+    def set_high_water_mark(self, value: int):
+        with self.lock, self.connection:
+            self._set_state("high_water_mark", value)
+
+    def get(self, paper_ids: Set[str]) -> Tuple[List[Tuple[str, str, int]], Set[str]]:
+        """returns the snapshot rows for the given papers and the set of papers not in the snapshot"""
+        with self.lock, self.connection:
+            self._fill_lookup(paper_ids)
+            rows = self.connection.execute("""
+                SELECT pc.paper_id, pc.category, pc.is_primary
+                FROM lookup JOIN paper_categories pc ON pc.paper_id = lookup.paper_id
+                """).fetchall()
+
+        found = {row[0] for row in rows}
+        return rows, set(paper_ids) - found
+
+    def put(
+        self,
+        rows: Iterable[Tuple[str, str, int]],
+        high_water_mark: Optional[int] = None,
+    ):
+        """replaces the categories of every paper present in rows"""
+        rows = [tuple(row) for row in rows]
+
+        with self.lock, self.connection:
+            self._fill_lookup(row[0] for row in rows)
+            self.connection.execute(
+                "DELETE FROM paper_categories WHERE paper_id IN (SELECT paper_id FROM lookup)"
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO paper_categories (paper_id, category, is_primary) VALUES (?, ?, ?)",
+                rows,
+            )
+            if high_water_mark is not None:
+                self._set_state("high_water_mark", high_water_mark)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,131 @@
+import logging
+import os
+import time
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SPOOL_FORMAT = 1
+STRING_COLUMNS = ["country", "download_type", "archive", "category"]
+COUNT_COLUMNS = ["primary_count", "cross_count"]
+
+
+class OutputSpool:
+    """aggregated rows of a run, saved as a compressed npz file before they are written to the database
+    a retry of the run within max_age_in_seconds writes the saved rows instead of aggregating again,
+    the file is removed once every hour has been committed
+    """
+
+    def __init__(self, directory: str, max_age_in_seconds: int):
+        self.directory = directory
+        self.max_age_in_seconds = max_age_in_seconds
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, start_hour: datetime, end_hour: datetime) -> str:
+        return os.path.join(
+            self.directory,
+            f"{start_hour.strftime('%Y-%m-%d-%H')}_{end_hour.strftime('%Y-%m-%d-%H')}.npz",
+        )
+
+    @staticmethod
+    def _to_datetime64(hours: List[datetime]) -> np.ndarray:
+        return np.array(
+            [
+                (hour.astimezone(timezone.utc) if hour.tzinfo else hour).replace(
+                    tzinfo=None
+                )
+                for hour in hours
+            ],
+            dtype="datetime64[s]",
+        )
+
+    def save(
+        self,
+        start_hour: datetime,
+        end_hour: datetime,
+        data_by_hour: Dict[datetime, List[dict]],
+    ):
+        hours = sorted(data_by_hour)
+        rows = [row for hour in hours for row in data_by_hour[hour]]
+        columns = {
+            name: np.array([row[name] for row in rows], dtype=str)
+            for name in STRING_COLUMNS
+        }
+        columns.update(
+            {
+                name: np.array([row[name] for row in rows], dtype=np.int64)
+                for name in COUNT_COLUMNS
+            }
+        )
+
+        path = self.path(start_hour, end_hour)
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez_compressed(
+                f,
+                format=SPOOL_FORMAT,
+                created=time.time(),
+                utc_aware=any(hour.tzinfo is not None for hour in hours),
+                hours=self._to_datetime64(hours),
+                # rows per hour, in the order of hours
+                hour_row_counts=np.array(
+                    [len(data_by_hour[hour]) for hour in hours], dtype=np.int64
+                ),
+                **columns,
+            )
+        # only complete files are ever visible under the spool's name
+        os.replace(f"{path}.tmp", path)
+        logger.info(f"Spooled {len(rows)} aggregated rows to {path}")
+
+    def load(
+        self, start_hour: datetime, end_hour: datetime
+    ) -> Optional[Dict[datetime, List[dict]]]:
+        """the spooled rows of the run by hour, or None if there is no valid spool for it"""
+        path = self.path(start_hour, end_hour)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with np.load(path, allow_pickle=False) as spool:
+                if int(spool["format"]) != SPOOL_FORMAT:
+                    raise ValueError(f"unknown spool format {spool['format']}")
+                if time.time() - float(spool["created"]) > self.max_age_in_seconds:
+                    logger.info(f"Discarding expired spool {path}")
+                    self.remove(start_hour, end_hour)
+                    return None
+
+                tzinfo = timezone.utc if bool(spool["utc_aware"]) else None
+                hours = [
+                    hour.replace(tzinfo=tzinfo)
+                    for hour in spool["hours"].astype(datetime)
+                ]
+                columns = {
+                    name: spool[name].tolist()
+                    for name in STRING_COLUMNS + COUNT_COLUMNS
+                }
+                hour_row_counts = spool["hour_row_counts"].tolist()
+        except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+            logger.warning(f"Discarding unreadable spool {path}", exc_info=True)
+            self.remove(start_hour, end_hour)
+            return None
+
+        data_by_hour: Dict[datetime, List[dict]] = {}
+        offset = 0
+        for hour, row_count in zip(hours, hour_row_counts):
+            data_by_hour[hour] = [
+                dict(
+                    {name: columns[name][i] for name in STRING_COLUMNS + COUNT_COLUMNS},
+                    start_dttm=hour,
+                )
+                for i in range(offset, offset + row_count)
+            ]
+            offset += row_count
+        return data_by_hour
+
+    def remove(self, start_hour: datetime, end_hour: datetime):
+        path = self.path(start_hour, end_hour)
+        if os.path.exists(path):
+            os.remove(path)
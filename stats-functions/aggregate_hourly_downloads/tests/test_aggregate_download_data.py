@@ -7,39 +7,86 @@ os.environ["ENV"] = "TEST"
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
 
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
+import pyarrow as pa
 from unittest.mock import patch
 from cloudevents.http import CloudEvent
+from google.api_core.exceptions import Conflict, NotFound
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, delete, select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateTable
 
-from entities import ReadBase, DocumentCategory, Metadata
+from entities import ReadBase, DocumentCategory, Metadata, PaperIdLookup
 from models import (
     PaperCategories,
+    CANONICAL_CATEGORIES,
+    CANONICAL_CATEGORY_LIST,
+    CATEGORY_INDEX,
+    CategoryMembership,
+    DownloadBatch,
     DownloadData,
     DownloadKey,
     DownloadCounts,
+    AggregatedDownloads,
+    Dimension,
+    pack_key,
+    unpack_key,
 )
 from main import (
     process_table_rows,
+    process_record_batches,
     get_paper_categories,
+    lookup_paper_categories,
     process_paper_categories,
     perform_aggregation,
     aggregate_data,
+    aggregate_staged,
+    aggregate_streaming,
+    aggregate_data_two_stage,
+    build_category_incidence,
     insert_into_database,
+    write_hours,
+    _upsert_statement,
+    _add_to_daily_statement,
+    _add_to_month_to_date_statement,
+    _seed_month_to_date_statement,
     query_logs,
+    query_logs_arrow,
     get_start_and_end_times,
     validate_cloud_event,
     validate_hour,
     validate_inputs,
+    validate_range_inputs,
+    aggregate_hour_range,
+    rebuild_daily_downloads,
+    rebuild_month_to_date_downloads,
 )
+import benchmark_category_lookup
+import cli
 
+from arxiv.identifier import Identifier, IdentifierException
 from arxiv.taxonomy.definitions import CATEGORIES
-from stats_entities.site_usage import SiteUsageBase, HourlyDownloads
+from snapshot import CategorySnapshot
+from identifiers import PaperIdNormalizer
+from arrow_files import ArrowFileRows
+from log_cache import HourlyLogCache
+from spool import OutputSpool
+from dimensions import DimensionTable
+from cache import PaperCategoriesCache
+from stats_entities.site_usage import (
+    SiteUsageBase,
+    HourlyDownloads,
+    DailyDownloads,
+    MonthToDateDownloads,
+    DownloadCategory,
+    DownloadCountry,
+    DownloadType,
+)
 from arxiv_functions.exception import NoRetryError
 
-
 fake_rows_from_bq = [
     {
         "paper_id": "2301.00001",
@@ -72,13 +119,7 @@ fake_rows_from_bq = [
 ]
 
 
-@pytest.fixture
-def read_session_factory():
-    engine = create_engine("sqlite:///:memory:")
-    ReadBase.metadata.create_all(engine)
-
-    ReadSessionFactory = sessionmaker(bind=engine)
-
+def add_read_rows(ReadSessionFactory):
     with ReadSessionFactory() as session:
         session.add_all(
             [
@@ -101,6 +142,29 @@ def read_session_factory():
         )
         session.commit()
 
+
+@pytest.fixture
+def read_session_factory():
+    engine = create_engine("sqlite:///:memory:")
+    ReadBase.metadata.create_all(engine)
+
+    ReadSessionFactory = sessionmaker(bind=engine)
+    add_read_rows(ReadSessionFactory)
+
+    yield ReadSessionFactory
+
+    engine.dispose()
+
+
+@pytest.fixture
+def file_read_session_factory(tmp_path):
+    # in-memory sqlite gives each thread its own empty database, so concurrent lookups need a file
+    engine = create_engine(f"sqlite:///{tmp_path / 'read.sqlite3'}")
+    ReadBase.metadata.create_all(engine)
+
+    ReadSessionFactory = sessionmaker(bind=engine)
+    add_read_rows(ReadSessionFactory)
+
     yield ReadSessionFactory
 
     engine.dispose()
@@ -116,15 +180,36 @@ def write_session_factory():
     engine.dispose()
 
 
+def read_hourly_downloads(session):
+    """hourly_downloads rows with their dimension ids decoded, ordered by hour, category and country"""
+    return session.execute(
+        select(
+            HourlyDownloads.start_dttm,
+            DownloadCategory.category,
+            DownloadCategory.archive,
+            DownloadCountry.name.label("country"),
+            DownloadType.name.label("download_type"),
+            HourlyDownloads.primary_count,
+            HourlyDownloads.cross_count,
+        )
+        .join(DownloadCategory, DownloadCategory.id == HourlyDownloads.category_id)
+        .join(DownloadCountry, DownloadCountry.id == HourlyDownloads.country_id)
+        .join(DownloadType, DownloadType.id == HourlyDownloads.download_type_id)
+        .order_by(
+            HourlyDownloads.start_dttm, DownloadCategory.category, DownloadCountry.name
+        )
+    ).all()
+
+
 def test_process_table_rows_success_valid_and_invalid_rows():
     (
-        download_data_gen,
+        download_batch,
         paper_ids,
         time_periods,
         counts,
     ) = process_table_rows(fake_rows_from_bq)
 
-    download_data = list(download_data_gen)
+    download_data = list(download_batch)
 
     assert len(download_data) == 2
     assert download_data[0].paper_id == "2301.00001"
@@ -142,6 +227,190 @@ def test_process_table_rows_success_valid_and_invalid_rows():
     assert datetime(2026, 2, 9, 10, 0) in time_periods
 
 
+log_schema = pa.schema(
+    [
+        ("paper_id", pa.string()),
+        ("geo_country", pa.string()),
+        ("download_type", pa.string()),
+        ("start_dttm", pa.timestamp("us", tz="UTC")),
+        ("num_downloads", pa.int64()),
+    ]
+)
+
+
+def write_arrow_file(path, rows, max_chunksize=2) -> str:
+    table = pa.Table.from_pylist(rows, schema=log_schema)
+    with pa.ipc.new_file(str(path), log_schema) as writer:
+        for record_batch in table.to_batches(max_chunksize=max_chunksize):
+            writer.write_batch(record_batch)
+    return str(path)
+
+
+def test_process_record_batches_matches_table_rows(tmp_path):
+    rows = ArrowFileRows([write_arrow_file(tmp_path / "logs.arrow", fake_rows_from_bq)])
+    assert rows.total_rows == 4
+
+    arrow_batch, paper_ids, time_periods, counts = process_record_batches(
+        rows.to_arrow_iterable()
+    )
+    table_batch, table_paper_ids, _, table_counts = process_table_rows(
+        fake_rows_from_bq
+    )
+
+    def as_tuples(batch):
+        return [
+            (d.paper_id, d.country, d.download_type, d.time.replace(tzinfo=None), d.num)
+            for d in batch
+        ]
+
+    assert as_tuples(arrow_batch) == as_tuples(table_batch)
+    assert paper_ids == table_paper_ids
+    assert counts == table_counts
+    assert [t.replace(tzinfo=None) for t in time_periods] == [datetime(2026, 2, 9, 10)]
+
+
+def test_process_record_batches_and_table_rows_skip_the_same_null_values(tmp_path):
+    rows = [
+        {
+            "paper_id": "2301.00001",
+            "geo_country": "US",
+            "download_type": "pdf",
+            "start_dttm": datetime(2026, 2, 9, 10, 45, 12, tzinfo=timezone.utc),
+            "num_downloads": 3,
+        }
+    ]
+    for name in rows[0]:
+        rows.append({**rows[0], name: None})
+
+    arrow_batch, paper_ids, _, counts = process_record_batches(
+        ArrowFileRows(
+            [write_arrow_file(tmp_path / "logs.arrow", rows)]
+        ).to_arrow_iterable()
+    )
+    table_batch, table_paper_ids, _, table_counts = process_table_rows(rows)
+
+    assert [(d.paper_id, d.country, d.download_type, d.num) for d in arrow_batch] == [
+        (d.paper_id, d.country, d.download_type, d.num) for d in table_batch
+    ]
+    assert len(table_batch) == 1
+    assert paper_ids == table_paper_ids == {"2301.00001"}
+    assert counts == table_counts == {"bad_id": 0, "problem": 5}
+
+
+def test_paper_id_normalizer():
+    normalizer = PaperIdNormalizer(max_size=3)
+
+    with patch("identifiers.Identifier", wraps=Identifier) as mock_identifier:
+        assert normalizer.normalize("2301.00001") == "2301.00001"
+        assert normalizer.normalize("2301.00001") == "2301.00001"
+        assert normalizer.normalize("hep-th/9901001") == "hep-th/9901001"
+        assert normalizer.normalize("0801.1234") == "0801.1234"
+        mock_identifier.assert_not_called()
+
+        # unusual input is left to Identifier
+        assert normalizer.normalize("2301.00001v2") == "2301.00001"
+        mock_identifier.assert_called_once_with("2301.00001v2")
+
+        # invalid ids raise on every lookup but are only parsed once
+        for _ in range(2):
+            with pytest.raises(IdentifierException):
+                normalizer.normalize("not_an_id")
+        assert mock_identifier.call_count == 2
+
+    assert normalizer.fast_path == 3
+    assert normalizer.hits == 2
+    assert normalizer.misses == 5
+    assert normalizer.hit_ratio == pytest.approx(2 / 7)
+    assert len(normalizer.memo) <= 3
+
+    normalizer.reset_stats()
+    assert normalizer.hit_ratio == 0.0
+
+
+# ids Identifier rejects, the fast path must leave them all to it
+INVALID_PAPER_IDS = [
+    "2301.00000",
+    "0801.0000",
+    "hep-th/9901000",
+    "2313.00001",
+    "2300.00001",
+    "0703.1234",
+    "1412.12345",
+    "1501.1234",
+    "9901.00001",
+    "not-an-archive/9901001",
+    "hep-th/0801001",
+    "hep-th/9013001",
+    "2301.001",
+]
+
+
+@pytest.mark.parametrize(
+    "raw_id",
+    [
+        "2301.00001",
+        "2301.99999",
+        "1501.00001",
+        "1412.9999",
+        "0704.0001",
+        "hep-th/9108001",
+        "math/0703999",
+        "astro-ph/9901001",
+        "2301.00001v2",
+        "math.GT/0309136",
+    ]
+    + INVALID_PAPER_IDS,
+)
+def test_paper_id_fast_path_agrees_with_identifier(raw_id):
+    fast_path_id = PaperIdNormalizer(max_size=10)._fast_path(raw_id)
+    try:
+        expected = Identifier(raw_id).id
+    except IdentifierException:
+        expected = None
+
+    # the fast path can leave any id to Identifier, but never accepts one Identifier wouldn't return as is
+    assert fast_path_id is None or fast_path_id == expected
+    if raw_id in INVALID_PAPER_IDS:
+        assert fast_path_id is None
+
+
+def test_download_batch_dictionary_encoding():
+    hour = datetime(2026, 2, 9, 10)
+    batch = DownloadBatch.from_download_data(
+        [
+            DownloadData("2301.00001", "US", "pdf", hour, 10),
+            DownloadData("2301.00001", "DE", "pdf", hour, 5),
+            DownloadData("2301.00002", "US", "src", hour, 1),
+        ]
+    )
+
+    assert len(batch) == 3
+    assert batch.paper_ids.values == ["2301.00001", "2301.00002"]
+    assert batch.countries.values == ["US", "DE"]
+    assert batch.download_types.values == ["pdf", "src"]
+    assert batch.hours.values == [hour]
+
+    assert list(batch.paper_col) == [0, 0, 1]
+    assert list(batch.country_col) == [0, 1, 0]
+    assert list(batch.num_col) == [10, 5, 1]
+
+    decoded = list(batch)
+    assert decoded[1].paper_id == "2301.00001"
+    assert decoded[1].country == "DE"
+    assert decoded[2].download_type == "src"
+    assert decoded[2].num == 1
+
+
+def test_download_batch_rejected_row_keeps_columns_aligned():
+    batch = DownloadBatch()
+
+    with pytest.raises(TypeError):
+        batch.append("2301.00001", "US", "pdf", datetime(2026, 2, 9, 10), None)
+
+    assert len(batch) == 0
+    assert len(batch.paper_col) == 0
+
+
 def test_get_paper_categories_success(read_session_factory):
     with patch("main.ReadSessionFactory", read_session_factory):
         result = get_paper_categories(
@@ -155,6 +424,187 @@ def test_get_paper_categories_success(read_session_factory):
         assert result[1][1] == "cs.LO"
 
 
+@pytest.mark.parametrize("strategy", ["in_list", "temp_table"])
+def test_get_paper_categories_lookup_strategies(read_session_factory, strategy):
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.config.category_lookup_strategy", strategy
+    ):
+        result = get_paper_categories({"2301.00001", "2301.00002", "2301.00003"})
+        assert sorted(tuple(row) for row in result) == [
+            ("2301.00001", "cs.AI", 1),
+            ("2301.00002", "cs.CR", 1),
+            ("2301.00002", "cs.LO", 0),
+        ]
+
+        # the temporary table does not outlive the lookup, so a second one starts clean
+        result = get_paper_categories({"2301.00001"})
+        assert [tuple(row) for row in result] == [("2301.00001", "cs.AI", 1)]
+
+
+def test_get_paper_categories_concurrent_batches(file_read_session_factory):
+    with patch("main.ReadSessionFactory", file_read_session_factory), patch(
+        "main.config.batch_size_for_category_query", 1
+    ), patch("main.config.category_query_workers", 2):
+        result = get_paper_categories({"2301.00001", "2301.00002", "2301.00003"})
+
+    assert sorted(tuple(row) for row in result) == [
+        ("2301.00001", "cs.AI", 1),
+        ("2301.00002", "cs.CR", 1),
+        ("2301.00002", "cs.LO", 0),
+    ]
+
+
+def test_get_paper_categories_strategies_agree_across_batches():
+    engine = create_engine("sqlite:///:memory:")
+    ReadBase.metadata.create_all(engine)
+    ReadSessionFactory = sessionmaker(bind=engine)
+
+    with ReadSessionFactory() as session:
+        for i in range(1, 301):
+            session.add(DocumentCategory(document_id=i, category="cs.AI", is_primary=1))
+            if i % 3 == 0:
+                session.add(
+                    DocumentCategory(document_id=i, category="cs.LO", is_primary=0)
+                )
+            # every other paper also has an older, non current version
+            session.add(
+                Metadata(
+                    metadata_id=i,
+                    document_id=i,
+                    paper_id=f"2301.{i:05d}",
+                    is_current=1,
+                )
+            )
+            if i % 2 == 0:
+                session.add(
+                    Metadata(
+                        metadata_id=1000 + i,
+                        document_id=1000 + i,
+                        paper_id=f"2301.{i:05d}",
+                        is_current=0,
+                    )
+                )
+        session.add(DocumentCategory(document_id=1002, category="cs.CR", is_primary=1))
+        session.commit()
+
+    paper_ids = {f"2301.{i:05d}" for i in range(1, 351)}
+    results = {}
+    with patch("main.ReadSessionFactory", ReadSessionFactory), patch(
+        "main.config.batch_size_for_category_query", 64
+    ):
+        for strategy in ["in_list", "temp_table"]:
+            with patch("main.config.category_lookup_strategy", strategy):
+                results[strategy] = sorted(
+                    tuple(row) for row in get_paper_categories(paper_ids)
+                )
+
+    assert len(results["in_list"]) == 400
+    assert results["in_list"] == results["temp_table"]
+    engine.dispose()
+
+
+def test_benchmark_category_lookup(read_session_factory):
+    with patch("main.initialize_sessions"), patch(
+        "main.ReadSessionFactory", read_session_factory
+    ), patch("main.config.category_lookup_strategy", "in_list"), patch(
+        "main.get_paper_categories", wraps=get_paper_categories
+    ) as mock_get:
+        best = benchmark_category_lookup.run(["--papers", "2", "--repeats", "2"])
+
+    assert set(best) == {"in_list", "temp_table"}
+    assert mock_get.call_count == 4
+    assert len(mock_get.call_args.args[0]) == 2
+
+
+def test_paper_id_lookup_matches_metadata_collation_on_mysql():
+    sql = str(CreateTable(PaperIdLookup).compile(dialect=mysql.dialect()))
+    assert sql.startswith("\nCREATE TEMPORARY TABLE stats_paper_id_lookup")
+    assert (
+        "paper_id VARCHAR(64) CHARACTER SET utf8mb3 COLLATE utf8mb3_general_ci NOT NULL"
+        in sql
+    )
+
+    sql = str(CreateTable(PaperIdLookup).compile(dialect=sqlite.dialect()))
+    assert "paper_id VARCHAR(64) NOT NULL" in sql
+
+
+def test_category_snapshot_put_and_get(tmp_path):
+    snapshot = CategorySnapshot(str(tmp_path / "snapshot.sqlite3"))
+    assert snapshot.high_water_mark is None
+
+    snapshot.put([("2301.00002", "cs.CR", 1), ("2301.00002", "cs.LO", 0)])
+    snapshot.put([("2301.00001", "cs.AI", 1)], high_water_mark=2)
+
+    rows, missing = snapshot.get({"2301.00002", "2301.00003"})
+    assert sorted(rows) == [("2301.00002", "cs.CR", 1), ("2301.00002", "cs.LO", 0)]
+    assert missing == {"2301.00003"}
+    assert snapshot.high_water_mark == 2
+
+    # a paper's categories are replaced rather than merged
+    snapshot.put([("2301.00002", "math.LO", 1)])
+    rows, missing = snapshot.get({"2301.00002"})
+    assert rows == [("2301.00002", "math.LO", 1)]
+    snapshot.close()
+
+    # state survives reopening, but not once it is older than the max age
+    snapshot = CategorySnapshot(str(tmp_path / "snapshot.sqlite3"))
+    assert snapshot.high_water_mark == 2
+    snapshot.close()
+    snapshot = CategorySnapshot(str(tmp_path / "snapshot.sqlite3"), max_age_in_hours=-1)
+    assert snapshot.high_water_mark is None
+    assert snapshot.get({"2301.00002"}) == ([], {"2301.00002"})
+    snapshot.close()
+
+
+def test_lookup_paper_categories_with_snapshot(read_session_factory, tmp_path):
+    snapshot = CategorySnapshot(str(tmp_path / "snapshot.sqlite3"))
+    paper_ids = {"2301.00001", "2301.00002"}
+
+    with (
+        patch("main.ReadSessionFactory", read_session_factory),
+        patch("main.category_snapshot", snapshot),
+    ):
+        result = lookup_paper_categories(paper_ids)
+        assert sorted(result) == [
+            ("2301.00001", "cs.AI", 1),
+            ("2301.00002", "cs.CR", 1),
+            ("2301.00002", "cs.LO", 0),
+        ]
+        assert snapshot.high_water_mark == 2
+
+        # cached papers are not read from the database again
+        with patch("main.get_paper_categories") as mock_get:
+            assert sorted(lookup_paper_categories(paper_ids)) == sorted(result)
+            mock_get.assert_not_called()
+
+        # a new metadata version moves 2301.00001 to a different category
+        with read_session_factory() as session:
+            session.add_all(
+                [
+                    DocumentCategory(document_id="3", category="cs.LG", is_primary="1"),
+                    Metadata(
+                        metadata_id="3",
+                        document_id="3",
+                        paper_id="2301.00001",
+                        is_current="1",
+                    ),
+                ]
+            )
+            session.query(Metadata).filter(Metadata.metadata_id == 2).update(
+                {Metadata.is_current: 0}
+            )
+            session.commit()
+
+        with patch("main.get_paper_categories") as mock_get:
+            result = lookup_paper_categories({"2301.00001"})
+            mock_get.assert_not_called()
+
+        assert result == [("2301.00001", "cs.LG", 1)]
+        assert snapshot.high_water_mark == 3
+
+    snapshot.close()
+
+
 def test_insert_into_database_success(write_session_factory):
     mock_aggregated_data = {
         DownloadKey(
@@ -178,11 +628,11 @@ def test_insert_into_database_success(write_session_factory):
         insert_into_database(mock_aggregated_data, mock_time_periods)
 
     with write_session_factory() as session:
-        results = (
-            session.query(HourlyDownloads)
-            .filter_by(start_dttm=datetime(2025, 11, 1, 12))
-            .all()
-        )
+        results = [
+            r
+            for r in read_hourly_downloads(session)
+            if r.start_dttm == datetime(2025, 11, 1, 12)
+        ]
 
         assert len(results) == 2
         assert results[0].primary_count == 150
@@ -222,6 +672,93 @@ def test_query_logs_empty_results_raises_error(mock_logger, mock_client_class):
         query_logs("2023-01-01", "2023-01-02")
 
 
+class FakeQueryJob:
+    def __init__(self, job_id, rows, error_result=None):
+        self.job_id = job_id
+        self.rows = rows
+        self.error_result = error_result
+
+    def done(self):
+        return True
+
+    def result(self):
+        return self.rows
+
+
+class FakeBigQueryClient:
+    """keeps jobs by id like bigquery, which rejects a second job with the same id"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.jobs = {}
+        self.queries_run = 0
+
+    def query(self, query, job_config=None, job_id=None):
+        if job_id in self.jobs:
+            raise Conflict(f"Already Exists: Job {job_id}")
+        self.queries_run += 1
+        job = FakeQueryJob(job_id, self.rows)
+        self.jobs[job_id or f"job_{self.queries_run}"] = job
+        return job
+
+    def get_job(self, job_id):
+        if job_id not in self.jobs:
+            raise NotFound(f"Not found: Job {job_id}")
+        return self.jobs[job_id]
+
+
+def test_query_logs_reattaches_to_job_on_retry():
+    rows = MagicMock(total_rows=10)
+    fake_client = FakeBigQueryClient(rows)
+
+    with patch("main.bigquery.Client", return_value=fake_client):
+        first = query_logs("2023-01-01 10:00:00", "2023-01-01 10:59:59", "event-1")
+        retry = query_logs("2023-01-01 10:00:00", "2023-01-01 10:59:59", "event-1")
+        assert fake_client.queries_run == 1
+        assert first is rows and retry is rows
+
+        # another event for the same hour is a new run and queries again
+        query_logs("2023-01-01 10:00:00", "2023-01-01 10:59:59", "event-2")
+        query_logs("2023-01-01 11:00:00", "2023-01-01 11:59:59", "event-1")
+        assert fake_client.queries_run == 3
+
+    assert all(
+        job_id.startswith("aggregate_hourly_downloads_") for job_id in fake_client.jobs
+    )
+
+
+def test_query_logs_reruns_failed_job():
+    fake_client = FakeBigQueryClient(MagicMock(total_rows=10))
+
+    with patch("main.bigquery.Client", return_value=fake_client):
+        query_logs("2023-01-01 10:00:00", "2023-01-01 10:59:59", "event-1")
+        for job in fake_client.jobs.values():
+            job.error_result = {"reason": "backendError"}
+
+        query_logs("2023-01-01 10:00:00", "2023-01-01 10:59:59", "event-1")
+
+    assert fake_client.queries_run == 2
+
+
+@patch("main.bigquery_storage.BigQueryReadClient")
+@patch("main.bigquery.Client")
+def test_query_logs_arrow_with_arrow_files(
+    mock_client_class, mock_read_client, tmp_path
+):
+    mock_client = mock_client_class.return_value
+    mock_client.query.return_value.result.return_value = ArrowFileRows(
+        [write_arrow_file(tmp_path / "logs.arrow", fake_rows_from_bq)]
+    )
+
+    record_batches = list(query_logs_arrow("2023-01-01", "2023-01-02"))
+
+    assert sum(record_batch.num_rows for record_batch in record_batches) == 4
+    assert record_batches[0].column("paper_id").to_pylist() == [
+        "2301.00001",
+        "2301.00002",
+    ]
+
+
 def test_process_cats_basic():
     data = [
         ("1234.5678", "math.GM", 1),
@@ -349,6 +886,46 @@ def test_paper_categories_alias():
     assert item.crosses == set()
 
 
+def test_canonical_categories_table():
+    assert CANONICAL_CATEGORIES["cs.SY"] == CATEGORIES["eess.SY"]  # alias
+    assert CANONICAL_CATEGORIES["chao-dyn"] == CATEGORIES["nlin.CD"]  # subsumed
+    assert CANONICAL_CATEGORIES["cs.AI"] == CATEGORIES["cs.AI"]
+    assert len(CANONICAL_CATEGORIES) == len(CATEGORIES)
+
+    with pytest.raises(TypeError):
+        CANONICAL_CATEGORIES["cs.AI"] = CATEGORIES["cs.LO"]
+
+    with pytest.raises(KeyError):
+        PaperCategories("1234.5678").add_primary("not.a.category")
+
+
+def test_category_membership():
+    item = PaperCategories("1234.5678")
+    item.add_primary("hep-lat")
+    item.add_cross("q-fin.CP")
+    item.add_cross("cs.SY")
+
+    membership = item.membership
+    assert CANONICAL_CATEGORY_LIST[membership.primary] == CATEGORIES["hep-lat"]
+    assert membership.crosses == (1 << CATEGORY_INDEX["q-fin.CP"]) | (
+        1 << CATEGORY_INDEX["eess.SY"]
+    )
+    assert {
+        CANONICAL_CATEGORY_LIST[index].id for index in membership.cross_indexes()
+    } == {"q-fin.CP", "eess.SY"}
+
+    # converts back to the same paper categories
+    copy = PaperCategories(
+        "1234.5678", CategoryMembership(membership.primary, membership.crosses)
+    )
+    assert copy == item
+    assert copy.primary == CATEGORIES["hep-lat"]
+    assert copy.crosses == {CATEGORIES["q-fin.CP"], CATEGORIES["eess.SY"]}
+
+    assert list(CategoryMembership(crosses=0b101001).cross_indexes()) == [0, 3, 5]
+    assert list(CategoryMembership().cross_indexes()) == []
+
+
 def test_aggregate_data():
     paper1 = PaperCategories("1234.5678")
     paper1.add_primary("math.GM")
@@ -419,6 +996,113 @@ def test_aggregate_data():
     assert result == expected
 
 
+def test_pack_key_round_trip():
+    key = pack_key(hour=700, country=201, download_type=2, category=155)
+
+    assert unpack_key(key) == (700, 201, 2, 155)
+    assert key != pack_key(hour=700, country=201, download_type=2, category=154)
+
+
+def test_aggregated_downloads_decodes_packed_keys():
+    hour = datetime(2024, 7, 26, 13, 0)
+    batch = DownloadBatch.from_download_data(
+        [DownloadData("1234.5678", "USA", "pdf", hour, 10)]
+    )
+    result = AggregatedDownloads(batch.hours, batch.countries, batch.download_types)
+    category = result.categories.encode(("math", "math.GM"))
+    result.counts[pack_key(0, 0, 0, category)] = DownloadCounts(10, 0)
+
+    key = DownloadKey(hour, "USA", "pdf", "math", "math.GM")
+
+    assert list(result) == [key]
+    assert result[key] == DownloadCounts(10, 0)
+    assert DownloadKey(hour, "Ireland", "pdf", "math", "math.GM") not in result
+    assert dict(result.items()) == {key: DownloadCounts(10, 0)}
+
+
+def test_build_category_incidence():
+    paper1 = PaperCategories("1234.5678")
+    paper1.add_primary("math.GM")
+    paper1.add_cross("q-fin.CP")
+    paper2 = PaperCategories("1234.5679")
+    paper2.add_primary("hep-lat")
+
+    categories = Dimension()
+    indptr, category_ids, is_primary = build_category_incidence(
+        ["1234.5678", "missing", "1234.5679"],
+        {"1234.5678": paper1, "1234.5679": paper2},
+        categories,
+    )
+
+    assert indptr.tolist() == [0, 2, 2, 3]
+    assert [categories.decode(i) for i in category_ids] == [
+        ("math", "math.GM"),
+        ("q-fin", "q-fin.CP"),
+        ("hep-lat", "hep-lat"),
+    ]
+    assert is_primary.tolist() == [True, False, True]
+
+
+def test_aggregate_data_skips_papers_without_categories():
+    paper = PaperCategories("1234.5678")
+    paper.add_primary("math.GM")
+    hour = datetime(2024, 7, 26, 13, 0)
+
+    result = aggregate_data(
+        [
+            DownloadData("1234.5678", "USA", "pdf", hour, 10),
+            DownloadData("9999.99999", "USA", "pdf", hour, 7),
+            DownloadData("1234.5678", "USA", "pdf", hour, 2),
+        ],
+        {"1234.5678": paper},
+    )
+
+    assert result == {
+        DownloadKey(hour, "USA", "pdf", "math", "math.GM"): DownloadCounts(12, 0)
+    }
+
+
+def test_aggregate_data_two_stage_matches_batch():
+    paper1 = PaperCategories("1234.5678")
+    paper1.add_primary("math.GM")
+    paper1.add_cross("q-fin.CP")
+
+    # same listings as paper1, merged into one vector before fan-out
+    paper2 = PaperCategories("1234.5679")
+    paper2.add_primary("math.GM")
+    paper2.add_cross("q-fin.CP")
+
+    # same categories as paper1 with primary and cross swapped, must not be merged
+    paper3 = PaperCategories("1234.5680")
+    paper3.add_primary("q-fin.CP")
+    paper3.add_cross("math.GM")
+    paper_categories = {
+        "1234.5678": paper1,
+        "1234.5679": paper2,
+        "1234.5680": paper3,
+    }
+
+    hour = datetime(2024, 7, 26, 13, 0)
+    download_data = [
+        DownloadData("1234.5678", "USA", "pdf", hour, 10),
+        DownloadData("1234.5679", "USA", "pdf", hour, 5),
+        DownloadData("1234.5680", "USA", "pdf", hour, 3),
+        DownloadData("1234.5679", "Ireland", "src", hour, 1),
+        DownloadData("9999.99999", "Ireland", "src", hour, 1),
+    ]
+
+    result = aggregate_data_two_stage(download_data, paper_categories)
+
+    assert result == aggregate_data(download_data, paper_categories)
+    assert result[DownloadKey(hour, "USA", "pdf", "math", "math.GM")] == DownloadCounts(
+        15, 3
+    )
+    assert result[
+        DownloadKey(hour, "USA", "pdf", "q-fin", "q-fin.CP")
+    ] == DownloadCounts(3, 15)
+    assert len(result) == 4
+
+
 @patch("main.event_time_exceeds_retry_window")
 @patch("main.config")
 def test_validate_cloud_event(mock_config, mock_retry_check):
@@ -508,6 +1192,866 @@ def test_validate_inputs_fallback_to_event_time(mock_val_cloud):
     mock_val_cloud.assert_called_once()
 
 
+def test_validate_range_inputs():
+    mock_attributes = {
+        "type": "mock_type",
+        "source": "mock_source",
+        "time": "2025-11-01T12:00:01Z",
+    }
+
+    def event(attributes):
+        return CloudEvent(
+            attributes=mock_attributes,
+            data={"message": {"data": "", "attributes": attributes}},
+        )
+
+    assert validate_range_inputs(
+        event({"start_hour": "2025-10-0322", "end_hour": "2025-10-0401"})
+    ) == (
+        datetime(2025, 10, 3, 22, tzinfo=timezone.utc),
+        datetime(2025, 10, 4, 1, tzinfo=timezone.utc),
+    )
+
+    # a single hour is a range of one
+    assert validate_range_inputs(event({"hour": "2025-10-0312"})) == (
+        datetime(2025, 10, 3, 12, tzinfo=timezone.utc),
+        datetime(2025, 10, 3, 12, tzinfo=timezone.utc),
+    )
+
+    for attributes in [
+        {"start_hour": "2025-10-0401", "end_hour": "2025-10-0322"},  # out of order
+        {"start_hour": "2025-10-0100", "end_hour": "2025-10-0400"},  # too long
+        {"start_hour": "2025-10-0100"},  # no end
+        {"start_hour": "2025-10-0100", "end_hour": "2025-10-0125"},  # not an hour
+    ]:
+        with pytest.raises(NoRetryError):
+            validate_range_inputs(event(attributes))
+
+
+def test_insert_into_database_one_transaction_per_hour(write_session_factory):
+    def key(hour, category_id):
+        return DownloadKey(
+            time=datetime(2025, 11, 1, hour),
+            country="US",
+            download_type="pdf",
+            archive="cs",
+            category_id=category_id,
+        )
+
+    with patch("main.WriteSessionFactory", write_session_factory):
+        insert_into_database(
+            {
+                key(11, "cs.AI"): DownloadCounts(1, 0),
+                key(12, "cs.AI"): DownloadCounts(2, 0),
+            },
+            {datetime(2025, 11, 1, 11), datetime(2025, 11, 1, 12)},
+        )
+
+        # rewriting a range replaces every hour in it, including hours without data
+        mock_session_factory = MagicMock(wraps=write_session_factory)
+        with patch("main.WriteSessionFactory", mock_session_factory):
+            add_count = insert_into_database(
+                {key(12, "cs.LO"): DownloadCounts(3, 1)},
+                {datetime(2025, 11, 1, 11), datetime(2025, 11, 1, 12)},
+            )
+        # one to encode the dimensions, then one per hour
+        assert mock_session_factory.call_count == 3
+
+    assert add_count == 1
+    with write_session_factory() as session:
+        results = read_hourly_downloads(session)
+        assert [(r.start_dttm.hour, r.category, r.primary_count) for r in results] == [
+            (12, "cs.LO", 3)
+        ]
+
+
+def test_write_hours_upserts_in_chunks(write_session_factory):
+    hour = datetime(2025, 11, 1, 12)
+
+    def row(category, country, primary_count):
+        return {
+            "country": country,
+            "download_type": "pdf",
+            "archive": category.split(".")[0],
+            "category": category,
+            "primary_count": primary_count,
+            "cross_count": 0,
+            "start_dttm": hour,
+        }
+
+    mock_session_factory = MagicMock(wraps=write_session_factory)
+    with patch("main.WriteSessionFactory", mock_session_factory), patch(
+        "main.config.write_chunk_size", 2
+    ):
+        write_hours(
+            {
+                hour: [
+                    row("math.GM", "US", 1),
+                    row("cs.AI", "US", 1),
+                    row("cs.AI", "DE", 1),
+                ]
+            }
+        )
+        # cs.AI from DE has vanished, math.GM is updated and cs.LO is new
+        add_count = write_hours(
+            {
+                hour: [
+                    row("math.GM", "US", 5),
+                    row("cs.LO", "US", 2),
+                    row("cs.AI", "US", 1),
+                ]
+            }
+        )
+
+    assert add_count == 3
+    # each write encodes the dimensions, then writes the hour
+    assert mock_session_factory.call_count == 4
+    with write_session_factory() as session:
+        results = read_hourly_downloads(session)
+        assert [(r.category, r.country, r.primary_count) for r in results] == [
+            ("cs.AI", "US", 1),
+            ("cs.LO", "US", 2),
+            ("math.GM", "US", 5),
+        ]
+
+
+def test_write_hours_diff_mode_writes_only_changed_rows(write_session_factory):
+    hour = datetime(2025, 11, 1, 12)
+
+    def row(category, country, primary_count):
+        return {
+            "country": country,
+            "download_type": "pdf",
+            "archive": category.split(".")[0],
+            "category": category,
+            "primary_count": primary_count,
+            "cross_count": 0,
+            "start_dttm": hour,
+        }
+
+    original = [row("cs.AI", "US", 1), row("cs.AI", "DE", 1), row("math.GM", "US", 1)]
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_mode", "diff"
+    ), patch("main._upsert_statement", wraps=_upsert_statement) as mock_upsert:
+        write_hours({hour: original})
+        assert len(mock_upsert.call_args.args[1]) == 3
+
+        # an unchanged hour writes nothing
+        mock_upsert.reset_mock()
+        write_hours({hour: original})
+        mock_upsert.assert_not_called()
+
+        write_hours(
+            {
+                hour: [
+                    row("cs.AI", "US", 1),
+                    row("cs.LO", "US", 2),
+                    row("math.GM", "US", 5),
+                ]
+            }
+        )
+        # the new cs.LO row and the changed math.GM row
+        assert sorted(r["primary_count"] for r in mock_upsert.call_args.args[1]) == [
+            2,
+            5,
+        ]
+
+    with write_session_factory() as session:
+        results = read_hourly_downloads(session)
+        assert [(r.category, r.country, r.primary_count) for r in results] == [
+            ("cs.AI", "US", 1),
+            ("cs.LO", "US", 2),
+            ("math.GM", "US", 5),
+        ]
+
+
+def test_write_hours_load_data_sink(write_session_factory, tmp_path):
+    hour_11 = datetime(2025, 11, 1, 11, tzinfo=timezone.utc)
+    hour_12 = datetime(2025, 11, 1, 12, tzinfo=timezone.utc)
+
+    def row(hour, category, country, primary_count):
+        return {
+            "country": country,
+            "download_type": "pdf",
+            "archive": category.split(".")[0],
+            "category": category,
+            "primary_count": primary_count,
+            "cross_count": 1,
+            "start_dttm": hour,
+        }
+
+    with patch("main.WriteSessionFactory", write_session_factory):
+        write_hours({hour_11: [row(hour_11, "cs.AI", "US", 9)]})
+
+        with patch("main.config.write_sink", "load_data"), patch(
+            "main.tempfile.tempdir", str(tmp_path)
+        ), patch("main._write_hours_orm") as mock_orm:
+            add_count = write_hours(
+                {
+                    hour_11: [],
+                    hour_12: [
+                        row(hour_12, "cs.AI", "Côte d'Ivoire", 3),
+                        row(hour_12, "cs.LO", "tab\tand \\ backslash", 2),
+                    ],
+                }
+            )
+        mock_orm.assert_not_called()
+        assert os.listdir(tmp_path) == []  # the tsv file is removed
+
+    assert add_count == 2
+    with write_session_factory() as session:
+        results = read_hourly_downloads(session)
+        assert [
+            (r.start_dttm.hour, r.category, r.country, r.primary_count, r.cross_count)
+            for r in results
+        ] == [
+            (12, "cs.AI", "Côte d'Ivoire", 3, 1),
+            (12, "cs.LO", "tab\tand \\ backslash", 2, 1),
+        ]
+
+
+def test_write_hours_load_data_keeps_staging_table_on_one_connection(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'write.sqlite3'}", pool_size=3)
+    SiteUsageBase.metadata.create_all(engine)
+    # fill the pool, so a session checking out a connection after each commit would get a different one
+    connections = [engine.connect() for _ in range(3)]
+    for connection in connections:
+        connection.close()
+    write_session_factory = sessionmaker(bind=engine)
+
+    hours = [datetime(2025, 11, 1, hour) for hour in [10, 11, 12]]
+    data_by_hour = {
+        hour: [
+            {
+                "country": "US",
+                "download_type": "pdf",
+                "archive": "cs",
+                "category": "cs.AI",
+                "primary_count": hour.hour,
+                "cross_count": 0,
+                "start_dttm": hour,
+            }
+        ]
+        for hour in hours
+    }
+
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_sink", "load_data"
+    ), patch("main._write_hours_orm") as mock_orm:
+        assert write_hours(data_by_hour) == 3
+    mock_orm.assert_not_called()
+
+    with write_session_factory() as session:
+        assert [
+            (r.start_dttm, r.primary_count) for r in read_hourly_downloads(session)
+        ] == [(hour, hour.hour) for hour in hours]
+        assert read_month_to_date_downloads(session) == [
+            (date(2025, 11, 1), 33, hours[-1])
+        ]
+
+    engine.dispose()
+
+
+def test_write_hours_load_data_falls_back_to_orm(write_session_factory):
+    hour = datetime(2025, 11, 1, 12)
+    data_by_hour = {
+        hour: [
+            {
+                "country": "US",
+                "download_type": "pdf",
+                "archive": "cs",
+                "category": "cs.AI",
+                "primary_count": 1,
+                "cross_count": 0,
+                "start_dttm": hour,
+            }
+        ]
+    }
+
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_sink", "load_data"
+    ), patch(
+        "main._load_staging_table",
+        side_effect=OperationalError(
+            "LOAD DATA", {}, Exception("Loading local data is disabled")
+        ),
+    ):
+        assert write_hours(data_by_hour) == 1
+
+    with write_session_factory() as session:
+        assert session.query(HourlyDownloads).count() == 1
+
+
+def read_daily_downloads(session):
+    return [
+        (r.day, r.category, r.country, r.primary_count, r.cross_count)
+        for r in session.execute(
+            select(
+                DailyDownloads.day,
+                DownloadCategory.category,
+                DownloadCountry.name.label("country"),
+                DailyDownloads.primary_count,
+                DailyDownloads.cross_count,
+            )
+            .join(DownloadCategory, DownloadCategory.id == DailyDownloads.category_id)
+            .join(DownloadCountry, DownloadCountry.id == DailyDownloads.country_id)
+            .order_by(DailyDownloads.day, DownloadCategory.category)
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "write_mode, write_sink",
+    [("upsert", "orm"), ("diff", "orm"), ("upsert", "load_data")],
+)
+def test_write_hours_keeps_daily_downloads_in_sync(
+    write_session_factory, tmp_path, write_mode, write_sink
+):
+    hour_11 = datetime(2025, 11, 1, 11)
+    hour_12 = datetime(2025, 11, 1, 12)
+    next_day = datetime(2025, 11, 2, 0)
+
+    def row(hour, category, country, primary_count):
+        return {
+            "country": country,
+            "download_type": "pdf",
+            "archive": category.split(".")[0],
+            "category": category,
+            "primary_count": primary_count,
+            "cross_count": 1,
+            "start_dttm": hour,
+        }
+
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_mode", write_mode
+    ), patch("main.config.write_sink", write_sink), patch(
+        "main.config.write_chunk_size", 1
+    ), patch(
+        "main.tempfile.tempdir", str(tmp_path)
+    ):
+        write_hours(
+            {
+                hour_11: [
+                    row(hour_11, "cs.AI", "US", 1),
+                    row(hour_11, "cs.AI", "DE", 4),
+                ],
+                hour_12: [row(hour_12, "cs.AI", "US", 2)],
+                next_day: [row(next_day, "math.GM", "US", 3)],
+            }
+        )
+        with write_session_factory() as session:
+            assert read_daily_downloads(session) == [
+                (date(2025, 11, 1), "cs.AI", "DE", 4, 1),
+                (date(2025, 11, 1), "cs.AI", "US", 3, 2),
+                (date(2025, 11, 2), "math.GM", "US", 3, 1),
+            ]
+
+        # re-aggregated hours subtract their old counts: cs.AI from US vanishes from both hours of the day
+        write_hours(
+            {
+                hour_11: [row(hour_11, "cs.AI", "DE", 4)],
+                hour_12: [
+                    row(hour_12, "cs.AI", "DE", 1),
+                    row(hour_12, "cs.LO", "US", 2),
+                ],
+            }
+        )
+        with write_session_factory() as session:
+            incremental = read_daily_downloads(session)
+        assert incremental == [
+            (date(2025, 11, 1), "cs.AI", "DE", 5, 2),
+            (date(2025, 11, 1), "cs.LO", "US", 2, 1),
+            (date(2025, 11, 2), "math.GM", "US", 3, 1),
+        ]
+
+        assert rebuild_daily_downloads(date(2025, 11, 1), date(2025, 11, 2)) == 3
+        with write_session_factory() as session:
+            assert read_daily_downloads(session) == incremental
+
+
+def read_month_to_date_downloads(session):
+    return [
+        (r.month, r.downloads, r.latest_hour)
+        for r in session.query(MonthToDateDownloads).order_by(
+            MonthToDateDownloads.month
+        )
+    ]
+
+
+@pytest.mark.parametrize(
+    "write_mode, write_sink",
+    [("upsert", "orm"), ("diff", "orm"), ("upsert", "load_data")],
+)
+def test_write_hours_keeps_month_to_date_downloads_in_sync(
+    write_session_factory, tmp_path, write_mode, write_sink
+):
+    hour_22 = datetime(2025, 11, 30, 22)
+    hour_23 = datetime(2025, 11, 30, 23)
+    next_month = datetime(2025, 12, 1, 0)
+
+    def row(hour, category, country, primary_count):
+        return {
+            "country": country,
+            "download_type": "pdf",
+            "archive": category.split(".")[0],
+            "category": category,
+            "primary_count": primary_count,
+            "cross_count": 1,
+            "start_dttm": hour,
+        }
+
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_mode", write_mode
+    ), patch("main.config.write_sink", write_sink), patch(
+        "main.tempfile.tempdir", str(tmp_path)
+    ):
+        write_hours(
+            {
+                hour_22: [
+                    row(hour_22, "cs.AI", "US", 1),
+                    row(hour_22, "cs.AI", "DE", 4),
+                ],
+                hour_23: [row(hour_23, "cs.AI", "US", 2)],
+                next_month: [row(next_month, "math.GM", "US", 3)],
+            }
+        )
+        with write_session_factory() as session:
+            assert read_month_to_date_downloads(session) == [
+                (date(2025, 11, 1), 7, hour_23),
+                (date(2025, 12, 1), 3, next_month),
+            ]
+
+        # re-aggregating an earlier hour changes the total but not the latest hour
+        write_hours(
+            {
+                hour_22: [row(hour_22, "cs.AI", "DE", 1)],
+                hour_23: [row(hour_23, "cs.AI", "US", 2)],
+            }
+        )
+        with write_session_factory() as session:
+            incremental = read_month_to_date_downloads(session)
+        assert incremental == [
+            (date(2025, 11, 1), 3, hour_23),
+            (date(2025, 12, 1), 3, next_month),
+        ]
+
+        assert rebuild_month_to_date_downloads(date(2025, 11, 1)) == 3
+        assert rebuild_month_to_date_downloads(date(2025, 12, 1)) == 3
+        assert rebuild_month_to_date_downloads(date(2026, 1, 1)) is None
+        with write_session_factory() as session:
+            assert read_month_to_date_downloads(session) == incremental
+
+
+@pytest.mark.parametrize("write_sink", ["orm", "load_data"])
+def test_write_hours_seeds_month_to_date_downloads_of_a_month_without_one(
+    write_session_factory, tmp_path, write_sink
+):
+    november = [datetime(2025, 11, day, 12) for day in [10, 20]]
+    december = datetime(2025, 12, 1, 0)
+
+    def row(hour, primary_count):
+        return {
+            "country": "US",
+            "download_type": "pdf",
+            "archive": "cs",
+            "category": "cs.AI",
+            "primary_count": primary_count,
+            "cross_count": 0,
+            "start_dttm": hour,
+        }
+
+    with patch("main.WriteSessionFactory", write_session_factory), patch(
+        "main.config.write_sink", write_sink
+    ), patch("main.tempfile.tempdir", str(tmp_path)):
+        write_hours({hour: [row(hour, 5)] for hour in november})
+        write_hours({december: [row(december, 3)]})
+        # november's hours were written before its running total was kept
+        with write_session_factory() as session:
+            session.execute(delete(MonthToDateDownloads))
+            session.commit()
+
+        # backfilling an hour of november seeds its whole month, not just the hour
+        write_hours({november[0]: [row(november[0], 2)]})
+        # an hour without changes doesn't give its month a running total
+        write_hours({december: [row(december, 3)]})
+        # nor does an empty hour of a month without downloads
+        write_hours({datetime(2025, 10, 1, 0): []})
+
+        with write_session_factory() as session:
+            assert read_month_to_date_downloads(session) == [
+                (date(2025, 11, 1), 7, november[1]),
+            ]
+
+        assert rebuild_month_to_date_downloads(date(2025, 11, 1)) == 7
+
+
+def test_upsert_statement_for_mysql():
+    mock_session = MagicMock()
+    mock_session.get_bind.return_value.dialect.name = "mysql"
+    statement = _upsert_statement(
+        mock_session,
+        [
+            {
+                "start_dttm": datetime(2025, 11, 1, 12),
+                "category_id": 1,
+                "country_id": 1,
+                "download_type_id": 1,
+                "primary_count": 1,
+                "cross_count": 0,
+            }
+        ],
+    )
+
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assert sql.startswith("INSERT INTO hourly_downloads")
+    assert "ON DUPLICATE KEY UPDATE primary_count = VALUES(primary_count)" in sql
+
+    statement = _add_to_daily_statement(
+        mock_session,
+        [
+            {
+                "day": date(2025, 11, 1),
+                "category_id": 1,
+                "country_id": 1,
+                "download_type_id": 1,
+                "primary_count": -1,
+                "cross_count": 0,
+            }
+        ],
+    )
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assert sql.startswith("INSERT INTO daily_downloads")
+    assert (
+        "ON DUPLICATE KEY UPDATE primary_count = (daily_downloads.primary_count + VALUES(primary_count))"
+        in sql
+    )
+
+    statement = _add_to_month_to_date_statement(
+        mock_session, datetime(2025, 11, 1, 12, tzinfo=timezone.utc), 5
+    )
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assert sql.startswith("UPDATE month_to_date_downloads")
+    assert "latest_hour=greatest(month_to_date_downloads.latest_hour, %s)" in sql
+
+    statement = _seed_month_to_date_statement(
+        mock_session, datetime(2025, 11, 1, 12, tzinfo=timezone.utc)
+    )
+    sql = str(statement.compile(dialect=mysql.dialect()))
+    assert sql.startswith("INSERT INTO month_to_date_downloads")
+    assert "sum(daily_downloads.primary_count)" in sql
+
+
+def test_dimension_table_reuses_and_adds_ids(write_session_factory):
+    categories = DimensionTable(DownloadCategory, "category")
+    with write_session_factory() as session:
+        ids = dict(
+            categories.encode(
+                session, ["cs.AI", "math.GM"], {"cs.AI": {"archive": "cs"}}
+            )
+        )
+        # values added by another writer are picked up rather than inserted again
+        session.add(DownloadCategory(category="cs.LO", archive="cs"))
+        session.commit()
+
+        more_ids = categories.encode(session, ["cs.AI", "cs.LO"])
+
+        assert more_ids["cs.AI"] == ids["cs.AI"]
+        assert session.query(DownloadCategory).count() == 3
+        assert session.get(DownloadCategory, ids["cs.AI"]).archive == "cs"
+        assert session.get(DownloadCategory, more_ids["cs.LO"]).category == "cs.LO"
+
+
+def test_aggregate_hour_range(read_session_factory, write_session_factory):
+    rows = [
+        dict(row, start_dttm=datetime(2026, 2, 9, hour, 30))
+        for hour in [10, 11, 12]
+        for row in fake_rows_from_bq[:2]
+    ]
+
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ), patch("main.query_logs", return_value=rows) as mock_query_logs, patch(
+        "main.get_paper_categories", wraps=get_paper_categories
+    ) as mock_get:
+        result = aggregate_hour_range(
+            datetime(2026, 2, 9, 10, tzinfo=timezone.utc),
+            datetime(2026, 2, 9, 12, tzinfo=timezone.utc),
+        )
+
+    mock_query_logs.assert_called_once_with(
+        "2026-02-09 10:00:00", "2026-02-09 12:59:59", None
+    )
+    mock_get.assert_called_once()
+    assert result.fetched_count == 6
+    assert (
+        result.time_period_str == "2026-02-09 10:00:00 to 2026-02-09 12:00:00 (3 hours)"
+    )
+
+    with write_session_factory() as session:
+        hours = {
+            r.start_dttm.hour
+            for r in read_hourly_downloads(session)
+            if r.category == "cs.AI"
+        }
+        assert hours == {10, 11, 12}
+
+
+def test_aggregate_hour_range_replaces_hours_without_rows(
+    read_session_factory, write_session_factory
+):
+    def rows_for(hours):
+        return [
+            dict(row, start_dttm=datetime(2026, 2, 9, hour, 30))
+            for hour in hours
+            for row in fake_rows_from_bq[:2]
+        ]
+
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ):
+        for hours in ([10, 11], [10]):
+            with patch("main.query_logs", return_value=rows_for(hours)):
+                result = aggregate_hour_range(
+                    datetime(2026, 2, 9, 10, tzinfo=timezone.utc),
+                    datetime(2026, 2, 9, 11, tzinfo=timezone.utc),
+                )
+            assert (
+                result.time_period_str
+                == "2026-02-09 10:00:00 to 2026-02-09 11:00:00 (2 hours)"
+            )
+
+    with write_session_factory() as session:
+        hourly = read_hourly_downloads(session)
+        assert hourly
+        assert {r.start_dttm.hour for r in hourly} == {10}
+
+        daily = {}
+        for r in hourly:
+            key = (r.category, r.country)
+            primary, cross = daily.get(key, (0, 0))
+            daily[key] = (primary + r.primary_count, cross + r.cross_count)
+        assert {
+            (category, country): (primary, cross)
+            for _, category, country, primary, cross in read_daily_downloads(session)
+        } == daily
+
+        assert read_month_to_date_downloads(session) == [
+            (
+                date(2026, 2, 1),
+                sum(r.primary_count for r in hourly),
+                datetime(2026, 2, 9, 11),
+            )
+        ]
+
+
+def test_hourly_log_cache(tmp_path):
+    table = pa.Table.from_pylist(fake_rows_from_bq, schema=log_schema)
+    log_cache = HourlyLogCache(str(tmp_path), max_bytes=10**9)
+    hour_10 = datetime(2026, 2, 9, 10, tzinfo=timezone.utc)
+    hour_12 = datetime(2026, 2, 9, 12, tzinfo=timezone.utc)
+
+    assert log_cache.get(hour_10, hour_12) is None
+    log_cache.put(hour_10, hour_12, table)
+
+    # hour 12 has no rows but is still cached
+    cached = pa.Table.from_batches(list(log_cache.get(hour_10, hour_12)), log_schema)
+    assert cached.num_rows == 4
+    assert cached.column("paper_id").to_pylist()[:2] == ["2301.00001", "2301.00002"]
+    assert not list(log_cache.get(hour_12, hour_12))
+    assert log_cache.get(hour_10, hour_12 + timedelta(hours=1)) is None
+
+    # the least recently used hours are evicted first, never the ones just written
+    os.utime(log_cache.path(hour_10), (0, 0))
+    log_cache.max_bytes = 1
+    log_cache.put(hour_12, hour_12, table)
+    assert not os.path.exists(log_cache.path(hour_10))
+    assert not os.path.exists(log_cache.path(hour_10 + timedelta(hours=1)))
+    assert os.path.exists(log_cache.path(hour_12))
+
+
+def test_hourly_log_cache_put_batches(tmp_path):
+    batches = pa.Table.from_pylist(fake_rows_from_bq, schema=log_schema).to_batches(
+        max_chunksize=1
+    )
+    log_cache = HourlyLogCache(str(tmp_path), max_bytes=10**9)
+    hour_10 = datetime(2026, 2, 9, 10, tzinfo=timezone.utc)
+    hour_12 = datetime(2026, 2, 9, 12, tzinfo=timezone.utc)
+
+    # batches are written as they are passed on, but the hours are only cached once all have gone through
+    stream = log_cache.put_batches(hour_10, hour_12, iter(batches))
+    assert next(stream) == batches[0]
+    assert os.path.getsize(f"{log_cache.path(hour_10)}.tmp") > 0
+    assert log_cache.get(hour_10, hour_12) is None
+    stream.close()
+    assert os.listdir(tmp_path) == []
+
+    assert list(log_cache.put_batches(hour_10, hour_12, iter(batches))) == batches
+    cached = pa.Table.from_batches(list(log_cache.get(hour_10, hour_12)), log_schema)
+    assert cached.num_rows == 4
+    assert not list(log_cache.get(hour_12, hour_12))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+@pytest.mark.parametrize("ingestion", ["rest", "arrow"])
+def test_aggregate_hour_range_uses_log_cache(
+    read_session_factory, write_session_factory, tmp_path, ingestion
+):
+    rows = [
+        dict(row, start_dttm=datetime(2026, 2, 9, hour, 30))
+        for hour in [10, 11]
+        for row in fake_rows_from_bq
+    ]
+    fake_client = FakeBigQueryClient(
+        ArrowFileRows([write_arrow_file(tmp_path / "logs.arrow", rows)])
+    )
+    start_hour = datetime(2026, 2, 9, 10, tzinfo=timezone.utc)
+    end_hour = datetime(2026, 2, 9, 11, tzinfo=timezone.utc)
+
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ), patch("main.config.log_cache_dir", str(tmp_path / "log_cache")), patch(
+        "main.config.log_ingestion", ingestion
+    ), patch(
+        "main.bigquery.Client", return_value=fake_client
+    ), patch(
+        "main.bigquery_storage.BigQueryReadClient"
+    ):
+        first = aggregate_hour_range(start_hour, end_hour)
+        cached = aggregate_hour_range(start_hour, end_hour)
+        assert fake_client.queries_run == 1
+
+        aggregate_hour_range(start_hour, end_hour, force_refresh=True)
+        assert fake_client.queries_run == 2
+
+    assert first.fetched_count > 0 and first.output_count > 0
+    assert [
+        (r.fetched_count, r.bad_id_count, r.problem_row_count, r.output_count)
+        for r in [first, cached]
+    ] == [
+        (
+            first.fetched_count,
+            first.bad_id_count,
+            first.problem_row_count,
+            first.output_count,
+        )
+    ] * 2
+
+
+def test_output_spool(tmp_path):
+    output_spool = OutputSpool(str(tmp_path), max_age_in_seconds=60)
+    hour_10 = datetime(2026, 2, 9, 10, tzinfo=timezone.utc)
+    hour_11 = datetime(2026, 2, 9, 11, tzinfo=timezone.utc)
+    row = {
+        "country": "Germany",
+        "download_type": "pdf",
+        "archive": "cs",
+        "category": "cs.LO",
+        "primary_count": 3,
+        "cross_count": 2,
+        "start_dttm": hour_10,
+    }
+    data_by_hour = {hour_10: [row, dict(row, country="France")], hour_11: []}
+
+    assert output_spool.load(hour_10, hour_11) is None
+    output_spool.save(hour_10, hour_11, data_by_hour)
+    assert output_spool.load(hour_10, hour_11) == data_by_hour
+    assert output_spool.load(hour_10, hour_10) is None
+
+    # spools from outside the retry window are discarded
+    output_spool.max_age_in_seconds = -1
+    assert output_spool.load(hour_10, hour_11) is None
+    assert not os.path.exists(output_spool.path(hour_10, hour_11))
+
+    with open(output_spool.path(hour_10, hour_11), "wb") as f:
+        f.write(b"partial")
+    assert output_spool.load(hour_10, hour_11) is None
+
+
+def test_aggregate_hour_range_retries_write_from_spool(
+    read_session_factory, write_session_factory, tmp_path
+):
+    rows = [
+        dict(row, start_dttm=datetime(2026, 2, 9, 10, 30)) for row in fake_rows_from_bq
+    ]
+    hour = datetime(2026, 2, 9, 10, tzinfo=timezone.utc)
+    failing_write_session_factory = MagicMock(
+        side_effect=[
+            TimeoutError("write timed out"),
+            write_session_factory(),
+            write_session_factory(),
+        ]
+    )
+
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.WriteSessionFactory", failing_write_session_factory
+    ), patch("main.config.output_spool_dir", str(tmp_path)), patch(
+        "main.query_logs", return_value=rows
+    ) as mock_query_logs:
+        with pytest.raises(TimeoutError):
+            aggregate_hour_range(hour, hour)
+        assert os.listdir(tmp_path) == ["2026-02-09-10_2026-02-09-10.npz"]
+
+        result = aggregate_hour_range(hour, hour)
+
+    mock_query_logs.assert_called_once()
+    assert result.fetched_count == 0 and result.output_count > 0
+    assert os.listdir(tmp_path) == []
+
+    with write_session_factory() as session:
+        assert session.query(HourlyDownloads).count() == result.output_count
+
+
+def test_cli_splits_range_into_runs():
+    with patch("main.config.max_hours_per_run", 24), patch(
+        "main.aggregate_hour_range"
+    ) as mock_range, patch("main.initialize_sessions"):
+        results = cli.run(["2026-02-0100", "2026-02-0223"])
+
+    assert len(results) == 2
+    assert [call.args for call in mock_range.call_args_list] == [
+        (
+            datetime(2026, 2, 1, 0, tzinfo=timezone.utc),
+            datetime(2026, 2, 1, 23, tzinfo=timezone.utc),
+        ),
+        (
+            datetime(2026, 2, 2, 0, tzinfo=timezone.utc),
+            datetime(2026, 2, 2, 23, tzinfo=timezone.utc),
+        ),
+    ]
+    assert list(
+        cli.hour_windows(datetime(2026, 2, 1, 0), datetime(2026, 2, 1, 4), 2)
+    ) == [
+        (datetime(2026, 2, 1, 0), datetime(2026, 2, 1, 1)),
+        (datetime(2026, 2, 1, 2), datetime(2026, 2, 1, 3)),
+        (datetime(2026, 2, 1, 4), datetime(2026, 2, 1, 4)),
+    ]
+
+
+def test_cli_rebuild_daily():
+    with patch("main.rebuild_daily_downloads", return_value=4) as mock_rebuild, patch(
+        "main.aggregate_hour_range"
+    ) as mock_range, patch("main.initialize_sessions"):
+        assert cli.run(["--rebuild-daily", "2026-02-0105", "2026-02-0223"]) == 4
+
+    mock_rebuild.assert_called_once_with(date(2026, 2, 1), date(2026, 2, 2))
+    mock_range.assert_not_called()
+
+    with patch(
+        "main.rebuild_month_to_date_downloads", return_value=4
+    ) as mock_rebuild, patch("main.initialize_sessions"):
+        assert cli.run(["--rebuild-month-to-date", "2025-12-3100", "2026-02-0223"]) == [
+            4,
+            4,
+            4,
+        ]
+
+    assert [call.args for call in mock_rebuild.call_args_list] == [
+        (date(2025, 12, 1),),
+        (date(2026, 1, 1),),
+        (date(2026, 2, 1),),
+    ]
+
+
 def test_perform_aggregation_success(read_session_factory, write_session_factory):
     with patch("main.ReadSessionFactory", read_session_factory), patch(
         "main.WriteSessionFactory", write_session_factory
@@ -520,7 +2064,7 @@ def test_perform_aggregation_success(read_session_factory, write_session_factory
         assert result.problem_row_count == 1
 
         with write_session_factory() as session:
-            all_records = session.query(HourlyDownloads).all()
+            all_records = read_hourly_downloads(session)
 
             matching_records = [r for r in all_records if r.category == "cs.AI"]
             assert len(matching_records) > 0
@@ -553,3 +2097,172 @@ def test_perform_aggregation_no_categories_raises_no_retry(
 
         with pytest.raises(NoRetryError):
             perform_aggregation(mock_gen())
+
+
+def test_paper_categories_cache_lru_and_ttl():
+    def cats(paper_id: str) -> PaperCategories:
+        entry = PaperCategories(paper_id)
+        entry.add_primary("cs.AI")
+        return entry
+
+    cache = PaperCategoriesCache(max_entries=2, max_bytes=10**6, ttl_in_seconds=60)
+    cache.put_many({"2301.00001": cats("2301.00001"), "2301.00002": cats("2301.00002")})
+
+    # reading 2301.00001 makes 2301.00002 the least recently used
+    found, missing = cache.get_many(["2301.00001", "2301.00003"])
+    assert found == {"2301.00001": cats("2301.00001")}
+    assert missing == {"2301.00003"}
+
+    cache.put_many({"2301.00003": cats("2301.00003")})
+    found, missing = cache.get_many(["2301.00001", "2301.00002", "2301.00003"])
+    assert set(found) == {"2301.00001", "2301.00003"}
+    assert missing == {"2301.00002"}
+
+    cache.discard(["2301.00001"])
+    assert len(cache) == 1
+
+    # a byte bound smaller than one entry keeps nothing
+    cache = PaperCategoriesCache(max_entries=10, max_bytes=1, ttl_in_seconds=60)
+    cache.put_many({"2301.00001": cats("2301.00001")})
+    assert len(cache) == 0 and cache.size == 0
+
+    # expired entries are misses
+    cache = PaperCategoriesCache(max_entries=10, max_bytes=10**6, ttl_in_seconds=-1)
+    cache.put_many({"2301.00001": cats("2301.00001")})
+    assert cache.get_many(["2301.00001"]) == ({}, {"2301.00001"})
+    assert len(cache) == 0
+
+
+def test_perform_aggregation_uses_category_cache(
+    read_session_factory, write_session_factory
+):
+    cache = PaperCategoriesCache(max_entries=10, max_bytes=10**6, ttl_in_seconds=60)
+
+    with patch("main.ReadSessionFactory", read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ), patch("main.category_cache", cache):
+        result = perform_aggregation(fake_rows_from_bq)
+        assert result.cache_hit_count == 0
+        assert result.cache_miss_count == 2
+
+        with patch("main.get_paper_categories") as mock_get:
+            result = perform_aggregation(fake_rows_from_bq)
+            mock_get.assert_not_called()
+
+        assert result.cache_hit_count == 2
+        assert result.cache_miss_count == 0
+        assert "category cache hits: 2, misses: 0" in result.single_run_str()
+
+        with write_session_factory() as session:
+            [cs_ai_record] = [
+                r for r in read_hourly_downloads(session) if r.category == "cs.AI"
+            ]
+            assert cs_ai_record.primary_count == 10
+
+
+def test_aggregate_streaming_matches_staged(file_read_session_factory):
+    rows = [
+        {
+            "paper_id": paper_id,
+            "geo_country": country,
+            "download_type": download_type,
+            "start_dttm": datetime(2026, 2, 9, 10, minute),
+            "num_downloads": minute + 1,
+        }
+        for minute, (paper_id, country, download_type) in enumerate(
+            [
+                ("2301.00001", "US", "pdf"),
+                ("2301.00002", "DE", "pdf"),
+                ("2301.00001", "US", "pdf"),
+                ("2301.00003", "FR", "html"),
+                ("bad_id", "FR", "html"),
+                ("2301.00002v2", "US", "e-print"),
+                ("2301.00001", "DE", "src"),
+            ]
+        )
+    ]
+
+    with patch("main.ReadSessionFactory", file_read_session_factory), patch(
+        "main.config.pipeline_chunk_size", 2
+    ):
+        staged, staged_batch, staged_counts = aggregate_staged(rows)
+        streamed, streamed_batch, streamed_counts = aggregate_streaming(iter(rows))
+
+    assert dict(streamed.items()) == dict(staged.items())
+    assert streamed_counts["fetched"] == staged_counts["fetched"] == 6
+    assert streamed_counts["bad_id"] == 1
+    assert streamed_counts["found_papers"] == 2
+    assert streamed_counts["missing"] == 1
+    assert streamed_batch.paper_ids.values == staged_batch.paper_ids.values
+    assert len(streamed_batch) == 0
+
+
+def test_perform_aggregation_streaming(
+    file_read_session_factory, write_session_factory
+):
+    with patch("main.ReadSessionFactory", file_read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ), patch("main.config.aggregation_pipeline", "streaming"), patch(
+        "main.config.pipeline_chunk_size", 1
+    ):
+        result = perform_aggregation(fake_rows_from_bq)
+
+        assert result.fetched_count == 2
+        assert result.unique_ids_count == 2
+        assert result.bad_id_count == 1
+        assert result.problem_row_count == 1
+
+        with write_session_factory() as session:
+            [cs_ai_record] = [
+                r for r in read_hourly_downloads(session) if r.category == "cs.AI"
+            ]
+            assert cs_ai_record.primary_count == 10
+
+        with pytest.raises(NoRetryError):
+            perform_aggregation(
+                [
+                    {
+                        "paper_id": "2304.00003",
+                        "geo_country": "US",
+                        "download_type": "pdf",
+                        "start_dttm": datetime(2026, 2, 9, 10, 0, 0),
+                        "num_downloads": 1,
+                    }
+                ]
+            )
+
+
+@pytest.mark.parametrize("pipeline", ["staged", "streaming"])
+def test_perform_aggregation_arrow_ingestion(
+    file_read_session_factory, write_session_factory, tmp_path, pipeline
+):
+    rows = ArrowFileRows([write_arrow_file(tmp_path / "logs.arrow", fake_rows_from_bq)])
+
+    with patch("main.ReadSessionFactory", file_read_session_factory), patch(
+        "main.WriteSessionFactory", write_session_factory
+    ), patch("main.config.log_ingestion", "arrow"), patch(
+        "main.config.aggregation_pipeline", pipeline
+    ), patch(
+        "main.config.pipeline_chunk_size", 2
+    ):
+        result = perform_aggregation(rows.to_arrow_iterable())
+
+        assert result.fetched_count == 2
+        assert result.unique_ids_count == 2
+        assert result.bad_id_count == 1
+        assert result.problem_row_count == 1
+
+        with write_session_factory() as session:
+            records = {
+                (r.category, r.country, r.download_type): (
+                    r.primary_count,
+                    r.cross_count,
+                )
+                for r in read_hourly_downloads(session)
+            }
+
+        assert records == {
+            ("cs.AI", "US", "src"): (10, 0),
+            ("cs.CR", "DE", "pdf"): (5, 0),
+            ("cs.LO", "DE", "pdf"): (0, 5),
+        }
@@ -6,6 +6,8 @@ class Config(FunctionConfig):
     db: Optional[DatabaseConfig] = None
 
     max_event_age_in_minutes: int = 50
+    # months past the one being counted that hourly_downloads should already have partitions for
+    partition_months_ahead: int = 3
 
 
 class TestConfig(Config):
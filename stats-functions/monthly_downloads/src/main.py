@@ -6,13 +6,19 @@ from dateutil.relativedelta import relativedelta
 import functions_framework
 from cloudevents.http import CloudEvent
 
-from sqlalchemy import select
+from sqlalchemy import select, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import func
 
 from config import get_config
 
-from stats_entities.site_usage import HourlyDownloads, MonthlyDownloads
+from stats_entities.site_usage import DailyDownloads, MonthlyDownloads
+from stats_entities.running_totals import update_running_totals
+from stats_entities.partitions import (
+    HOURLY_DOWNLOADS_PARTITIONS_QUERY,
+    add_month_partitions_statement,
+)
 
 from stats_functions.exception import NoRetryError
 from stats_functions.utils import (
@@ -31,21 +37,21 @@ engine = None
 SessionFactory = None
 
 
-def get_first_and_last_hour(month: date) -> tuple[datetime, datetime]:
-    first_hour = datetime(month.year, month.month, month.day)
+def get_first_and_last_day(month: date) -> tuple[date, date]:
     last_day = (month + relativedelta(months=1)) - relativedelta(days=1)
 
-    return first_hour, datetime(last_day.year, last_day.month, last_day.day, 23)
+    return month, last_day
 
 
-def get_download_count(start: datetime, end: datetime):
+def get_download_count(start: date, end: date):
+    """sums the daily rollup of hourly_downloads, which aggregate_hourly_downloads keeps up to date"""
     with SessionFactory() as session:
         logger.info("Beginning database session")
 
         return session.execute(
-            select(func.sum(HourlyDownloads.primary_count))
-            .where(HourlyDownloads.start_dttm >= start)
-            .where(HourlyDownloads.start_dttm <= end)
+            select(func.sum(DailyDownloads.primary_count))
+            .where(DailyDownloads.day >= start)
+            .where(DailyDownloads.day <= end)
         ).scalar()
 
 
@@ -55,15 +61,37 @@ def write_to_db(month: date, count: int):
 
         session.query(MonthlyDownloads).where(MonthlyDownloads.month == month).delete()
         session.add(MonthlyDownloads(month=month, downloads=count))
+        total = update_running_totals(session, MonthlyDownloads, month)
 
-        logger.info(f"Downloads for month {month}: {count}")
+        logger.info(f"Downloads for month {month}: {count}, {total} in total")
 
-        # commit both the deletion and the insertion as a single transaction
+        # commit the deletion, the insertion and the running totals as a single transaction
         session.commit()
 
     logger.info("Write database transaction successfully committed; session closed")
 
 
+def create_future_partitions(month: date):
+    """makes sure hourly_downloads has its own partition for each of the next partition_months_ahead months
+    so hours are never written to the catch all partition; only applies to mysql
+    """
+    with SessionFactory() as session:
+        if session.get_bind().dialect.name != "mysql":
+            return
+
+        through_month = month + relativedelta(months=config.partition_months_ahead)
+        existing_partitions = session.execute(
+            HOURLY_DOWNLOADS_PARTITIONS_QUERY
+        ).scalars()
+        statement = add_month_partitions_statement(existing_partitions, through_month)
+        if statement is None:
+            logger.info(f"Partitions of hourly_downloads exist through {through_month}")
+            return
+
+        logger.info(f"Adding partitions to hourly_downloads through {through_month}")
+        session.execute(text(statement))
+
+
 def validate_cloud_event(cloud_event: CloudEvent) -> date:
     event_time = parse_cloud_event_time(cloud_event)
 
@@ -108,10 +136,16 @@ def get_monthly_downloads(cloud_event: CloudEvent):
 
     try:
         month = validate_inputs(cloud_event)
-        start, end = get_first_and_last_hour(month)
+        start, end = get_first_and_last_day(month)
         count = get_download_count(start, end)
         write_to_db(month, count)
 
+        try:
+            create_future_partitions(month)
+        except SQLAlchemyError:
+            # the monthly count is already written, partitions can be added by the next run
+            logger.exception("Failed to add partitions to hourly_downloads")
+
     except NoRetryError:
         logger.exception(
             "A NoRetry exception has been raised! Will not retry. Fix the problem and manually run the function to patch data as needed."
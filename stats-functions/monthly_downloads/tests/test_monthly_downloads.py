@@ -6,7 +6,7 @@ os.environ["ENV"] = "TEST"
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "..", "src"))
 
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from datetime import datetime, timezone, date
 
 from cloudevents.http import CloudEvent
@@ -15,14 +15,16 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from main import (
-    get_first_and_last_hour,
+    get_first_and_last_day,
     get_download_count,
     write_to_db,
+    create_future_partitions,
     validate_cloud_event,
     validate_month,
     validate_inputs,
 )
-from stats_entities.site_usage import SiteUsageBase, HourlyDownloads, MonthlyDownloads
+from stats_entities.site_usage import SiteUsageBase, DailyDownloads, MonthlyDownloads
+from stats_entities.partitions import add_month_partitions_statement
 from stats_functions.exception import NoRetryError
 
 
@@ -36,30 +38,27 @@ def session_factory():
     with SessionFactory() as session:
         session.add_all(
             [
-                HourlyDownloads(
-                    start_dttm=datetime(2025, 11, 2, 10),
-                    category="",
-                    country="",
-                    download_type="",
-                    archive="",
+                DailyDownloads(
+                    day=date(2025, 11, 2),
+                    category_id=1,
+                    country_id=1,
+                    download_type_id=1,
                     primary_count=1000,
                     cross_count=1,
                 ),
-                HourlyDownloads(
-                    start_dttm=datetime(2025, 11, 3, 12),
-                    category="",
-                    country="",
-                    download_type="",
-                    archive="",
+                DailyDownloads(
+                    day=date(2025, 11, 3),
+                    category_id=2,
+                    country_id=1,
+                    download_type_id=1,
                     primary_count=500,
                     cross_count=1,
                 ),
-                HourlyDownloads(
-                    start_dttm=datetime(2025, 11, 4, 9),
-                    category="",
-                    country="",
-                    download_type="",
-                    archive="",
+                DailyDownloads(
+                    day=date(2025, 11, 4),
+                    category_id=3,
+                    country_id=1,
+                    download_type_id=1,
                     primary_count=1500,
                     cross_count=1,
                 ),
@@ -73,16 +72,16 @@ def session_factory():
     engine.dispose()
 
 
-def test_get_first_and_last_hour_success():
-    first_hour, last_hour = get_first_and_last_hour(date(2025, 12, 1))
+def test_get_first_and_last_day_success():
+    first_day, last_day = get_first_and_last_day(date(2025, 12, 1))
 
-    assert first_hour == datetime(2025, 12, 1, 0, 0)
-    assert last_hour == datetime(2025, 12, 31, 23, 0)
+    assert first_day == date(2025, 12, 1)
+    assert last_day == date(2025, 12, 31)
 
 
 def test_get_download_count_success(session_factory):
     with patch("main.SessionFactory", session_factory):
-        count = get_download_count(datetime(2025, 11, 1), datetime(2025, 11, 30, 23))
+        count = get_download_count(date(2025, 11, 1), date(2025, 11, 30))
 
     assert count == 3000
 
@@ -184,6 +183,63 @@ def test_write_to_db_success(session_factory):
         assert results[0].downloads == mock_count
 
 
+def test_write_to_db_updates_running_totals(session_factory):
+    with patch("main.SessionFactory", session_factory):
+        write_to_db(date(2025, 12, 1), 5000)
+        # the fixture's november row was written before running totals existed
+        write_to_db(date(2025, 10, 1), 2000)
+
+    with session_factory() as session:
+        results = session.query(MonthlyDownloads).order_by(MonthlyDownloads.month)
+
+        assert [(r.month, r.downloads, r.cumulative_downloads) for r in results] == [
+            (date(2025, 10, 1), 2000, 2000),
+            (date(2025, 11, 1), 10000, 12000),
+            (date(2025, 12, 1), 5000, 17000),
+        ]
+
+
+def test_add_month_partitions_statement():
+    existing = ["p_before_2025", "p202611", "p202612", "p_future"]
+
+    assert add_month_partitions_statement(existing, date(2027, 2, 15)) == (
+        "ALTER TABLE `hourly_downloads` REORGANIZE PARTITION `p_future` INTO ("
+        "PARTITION `p202701` VALUES LESS THAN ('2027-02-01 00:00:00'), "
+        "PARTITION `p202702` VALUES LESS THAN ('2027-03-01 00:00:00'), "
+        "PARTITION `p_future` VALUES LESS THAN (MAXVALUE))"
+    )
+    assert add_month_partitions_statement(existing, date(2026, 12, 1)) is None
+    # not partitioned
+    assert add_month_partitions_statement([], date(2026, 12, 1)) is None
+
+
+def test_create_future_partitions():
+    mock_session = MagicMock()
+    mock_session.get_bind.return_value.dialect.name = "mysql"
+    mock_session.execute.return_value.scalars.return_value = [
+        "p_before_2025",
+        "p202612",
+        "p_future",
+    ]
+    mock_session_factory = MagicMock()
+    mock_session_factory.return_value.__enter__.return_value = mock_session
+
+    with patch("main.SessionFactory", mock_session_factory), patch(
+        "main.config.partition_months_ahead", 3
+    ):
+        create_future_partitions(date(2026, 11, 1))
+
+    statement = str(mock_session.execute.call_args.args[0])
+    assert "PARTITION `p202701`" in statement
+    assert "PARTITION `p202702`" in statement
+    assert "p202703" not in statement
+
+
+def test_create_future_partitions_skips_sqlite(session_factory):
+    with patch("main.SessionFactory", session_factory):
+        create_future_partitions(date(2026, 11, 1))
+
+
 def test_validate_month_valid():
     mock_attributes = {
         "type": "mock_type",
@@ -13,6 +13,7 @@ from sqlalchemy.sql import func
 from config import get_config
 
 from stats_entities.site_usage import MonthlySubmissions
+from stats_entities.running_totals import update_running_totals
 from entities import Document
 
 from stats_functions.exception import NoRetryError
@@ -56,10 +57,11 @@ def write_to_db(month: date, count: int):
             MonthlySubmissions.month == month
         ).delete()
         session.add(MonthlySubmissions(month=month, count=count))
+        total = update_running_totals(session, MonthlySubmissions, month)
 
-        logger.info(f"Submissions for month {month}: {count}")
+        logger.info(f"Submissions for month {month}: {count}, {total} in total")
 
-        # commit both the deletion and the insertion as a single transaction
+        # commit the deletion, the insertion and the running totals as a single transaction
         session.commit()
 
     logger.info("Write database transaction successfully committed; session closed")
@@ -181,6 +181,24 @@ def test_write_to_db_success(write_session_factory):
         assert results[0].count == mock_count
 
 
+def test_write_to_db_updates_running_totals(write_session_factory):
+    with patch("main.WriteSessionFactory", write_session_factory):
+        write_to_db(date(2025, 10, 1), 2)
+        write_to_db(date(2025, 12, 1), 5)
+        write_to_db(date(2025, 11, 1), 3)
+        # recomputing a past month corrects the totals of the later months
+        write_to_db(date(2025, 10, 1), 4)
+
+    with write_session_factory() as session:
+        results = session.query(MonthlySubmissions).order_by(MonthlySubmissions.month)
+
+        assert [(r.month, r.count, r.cumulative_count) for r in results] == [
+            (date(2025, 10, 1), 4, 4),
+            (date(2025, 11, 1), 3, 7),
+            (date(2025, 12, 1), 5, 12),
+        ]
+
+
 def test_validate_month_valid():
     mock_attributes = {
         "type": "mock_type",
@@ -85,6 +85,9 @@ resource "google_cloudfunctions2_function" "function" {
 
   service_config {
     min_instance_count    = 0 # cold starts to reduce costs
+    # the caches enabled below fit inside the same 6Gi: the category cache is capped at 256Mi and the output spool
+    # in /tmp (in-memory) stays under 100Mi for max_hours_per_run hours. the category snapshot is left off, its
+    # sqlite file in /tmp has no size bound
     available_memory      = "6Gi"
     available_cpu         = "2" # must be explicitly set if memory>4Gi
     timeout_seconds       = 540 # 9 minutes is the maximum allowed for pubsub triggered functions
@@ -100,6 +103,9 @@ resource "google_cloudfunctions2_function" "function" {
       WRITE_DB__USERNAME           = var.write_db_username
       WRITE_DB__DATABASE           = var.write_db_database
       WRITE_DB__QUERY__UNIX_SOCKET = var.write_db_unix_socket
+      CATEGORY_CACHE_MAX_ENTRIES   = "500000"
+      CATEGORY_CACHE_MAX_BYTES     = "268435456"
+      OUTPUT_SPOOL_DIR             = "/tmp/aggregated_downloads_spool"
     }
     secret_environment_variables {
       key        = "READ_DB__PASSWORD"